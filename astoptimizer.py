@@ -0,0 +1,481 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from .config import AST_OPTIMIZERS
+
+import operator
+import ast
+
+# Limits for folded constants, same as CPython 3.7's AST optimizer
+MAX_INT_SIZE = 128 # bits
+MAX_COLLECTION_SIZE = 256
+MAX_STR_SIZE = 4096
+
+_NOTHING = object()
+
+_BINOPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+    ast.LShift: operator.lshift,
+    ast.RShift: operator.rshift,
+    ast.BitOr: operator.or_,
+    ast.BitXor: operator.xor,
+    ast.BitAnd: operator.and_,
+}
+
+_UNARYOPS = {
+    ast.Not: operator.not_,
+    ast.Invert: operator.invert,
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+}
+
+_CMPOPS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda a, b: a in b,
+    ast.NotIn: lambda a, b: a not in b,
+}
+
+_CONSTANT_TYPES = (int, float, complex, str, bytes, bool, type(None), type(Ellipsis))
+
+
+def get_constant(node):
+    '''
+    Returns the value of a constant expression node, or _NOTHING.
+    '''
+    if isinstance(node, ast.Constant):
+        return node.value
+
+    if isinstance(node, (ast.Num, ast.Str, ast.Bytes)):
+        return getattr(node, 'n', getattr(node, 's', None))
+
+    if isinstance(node, ast.NameConstant):
+        return node.value
+
+    if isinstance(node, ast.Ellipsis):
+        return Ellipsis
+
+    return _NOTHING
+
+
+def is_constant(node):
+    return get_constant(node) is not _NOTHING
+
+
+def make_constant(value, node):
+    return ast.copy_location(ast.Constant(value=value), node)
+
+
+def _check_size(value):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value.bit_length() <= MAX_INT_SIZE
+
+    if isinstance(value, (str, bytes)):
+        return len(value) <= MAX_STR_SIZE
+
+    if isinstance(value, (tuple, frozenset)):
+        return len(value) <= MAX_COLLECTION_SIZE and all(_check_size(v) for v in value)
+
+    return isinstance(value, _CONSTANT_TYPES)
+
+
+def _safe_binop(op, left, right):
+    '''
+    Refuses operations whose result could be huge before computing them.
+    '''
+    if isinstance(op, ast.Pow) and isinstance(left, int) and isinstance(right, int):
+        return right >= 0 and left.bit_length() * right <= MAX_INT_SIZE
+
+    if isinstance(op, ast.LShift) and isinstance(left, int) and isinstance(right, int):
+        return 0 <= right <= MAX_INT_SIZE and left.bit_length() + right <= MAX_INT_SIZE
+
+    if isinstance(op, ast.Mult):
+        for seq, n in ((left, right), (right, left)):
+            if isinstance(seq, (str, bytes, tuple)) and isinstance(n, int):
+                return n * len(seq) <= MAX_STR_SIZE
+
+    if isinstance(op, ast.Mod) and isinstance(left, (str, bytes)):
+        # Formatting can produce arbitrarily large strings
+        return False
+
+    return True
+
+
+class ConstantFolder(ast.NodeTransformer):
+    '''
+    Evaluates expressions whose operands are all constants, turns constant
+    containers used by "in" tests and for loops into constant tuples and
+    frozensets, and replaces typing.TYPE_CHECKING with False.
+    '''
+    def __init__(self):
+        self.type_checking_names = set()
+        self.typing_names = set()
+
+    def visit_Module(self, node):
+        for child in ast.walk(node):
+            if isinstance(child, ast.ImportFrom) and child.module == 'typing' and not child.level:
+                for alias in child.names:
+                    if alias.name == 'TYPE_CHECKING':
+                        self.type_checking_names.add(alias.asname or alias.name)
+
+            elif isinstance(child, ast.Import):
+                for alias in child.names:
+                    if alias.name == 'typing':
+                        self.typing_names.add(alias.asname or alias.name)
+
+        return self.generic_visit(node)
+
+    def visit_Name(self, node):
+        if not isinstance(node.ctx, ast.Load):
+            return node
+
+        if node.id in self.type_checking_names:
+            return make_constant(False, node)
+
+        return node
+
+    def visit_Attribute(self, node):
+        self.generic_visit(node)
+        if isinstance(node.ctx, ast.Load) and node.attr == 'TYPE_CHECKING' and \
+           isinstance(node.value, ast.Name) and node.value.id in self.typing_names:
+            return make_constant(False, node)
+
+        return node
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        operand = get_constant(node.operand)
+        if operand is _NOTHING:
+            return node
+
+        try:
+            value = _UNARYOPS[type(node.op)](operand)
+
+        except Exception:
+            return node
+
+        return make_constant(value, node) if _check_size(value) else node
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        left = get_constant(node.left)
+        right = get_constant(node.right)
+        if left is _NOTHING or right is _NOTHING:
+            return node
+
+        if type(node.op) not in _BINOPS or not _safe_binop(node.op, left, right):
+            return node
+
+        try:
+            value = _BINOPS[type(node.op)](left, right)
+
+        except Exception:
+            return node
+
+        return make_constant(value, node) if _check_size(value) else node
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        is_and = isinstance(node.op, ast.And)
+        values = []
+        for i, value in enumerate(node.values):
+            const = get_constant(value)
+            last = (i == len(node.values) - 1)
+            if const is _NOTHING or last:
+                values.append(value)
+                continue
+
+            if bool(const) != is_and:
+                # Short-circuits here; the rest is unreachable
+                values.append(value)
+                break
+
+            # Doesn't affect the result; skip it
+
+        if len(values) == 1:
+            return values[0]
+
+        node.values = values
+        return node
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+
+        # Constant containers in "in" tests
+        comparators = []
+        for op, comparator in zip(node.ops, node.comparators):
+            if isinstance(op, (ast.In, ast.NotIn)):
+                comparator = self.__fold_container(comparator, True)
+
+            comparators.append(comparator)
+
+        node.comparators = comparators
+
+        left = get_constant(node.left)
+        if left is _NOTHING:
+            return node
+
+        for op, comparator in zip(node.ops, node.comparators):
+            right = get_constant(comparator)
+            if right is _NOTHING or type(op) not in _CMPOPS:
+                return node
+
+            try:
+                if not _CMPOPS[type(op)](left, right):
+                    return make_constant(False, node)
+
+            except Exception:
+                return node
+
+            left = right
+
+        return make_constant(True, node)
+
+    def visit_IfExp(self, node):
+        self.generic_visit(node)
+        test = get_constant(node.test)
+        if test is _NOTHING:
+            return node
+
+        return node.body if test else node.orelse
+
+    def visit_Tuple(self, node):
+        self.generic_visit(node)
+        if not isinstance(node.ctx, ast.Load):
+            return node
+
+        return self.__fold_container(node, False)
+
+    def visit_Subscript(self, node):
+        self.generic_visit(node)
+        if not isinstance(node.ctx, ast.Load):
+            return node
+
+        value = get_constant(node.value)
+        if not isinstance(value, (str, bytes, tuple)):
+            return node
+
+        if isinstance(node.slice, ast.Index):
+            index = get_constant(node.slice.value)
+
+        elif isinstance(node.slice, ast.Slice):
+            parts = [get_constant(p) if p is not None else None
+                     for p in (node.slice.lower, node.slice.upper, node.slice.step)]
+            if _NOTHING in parts:
+                return node
+
+            index = slice(*parts)
+
+        else:
+            return node
+
+        if index is _NOTHING:
+            return node
+
+        try:
+            result = value[index]
+
+        except Exception:
+            return node
+
+        return make_constant(result, node) if _check_size(result) else node
+
+    def visit_For(self, node):
+        self.generic_visit(node)
+        if isinstance(node.iter, ast.List):
+            node.iter = self.__fold_container(node.iter, False)
+
+        return node
+
+    visit_AsyncFor = visit_For
+
+    def __fold_container(self, node, allow_set):
+        if isinstance(node, (ast.List, ast.Tuple)):
+            make = tuple
+
+        elif isinstance(node, ast.Set) and allow_set:
+            make = frozenset
+
+        else:
+            return node
+
+        values = [get_constant(elt) for elt in node.elts]
+        if _NOTHING in values:
+            return node
+
+        try:
+            value = make(values)
+
+        except TypeError: # unhashable
+            return node
+
+        return make_constant(value, node) if _check_size(value) else node
+
+
+class _BindingFinder(ast.NodeVisitor):
+    '''
+    Checks if removing a list of statements could change the scope of
+    any name (or turn the enclosing function into a generator).
+    '''
+    def __init__(self):
+        self.found = False
+
+    def visit_Name(self, node):
+        if not isinstance(node.ctx, ast.Load):
+            self.found = True
+
+    def visit_FunctionDef(self, node):
+        self.found = True
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+    visit_ClassDef = visit_FunctionDef
+    visit_Import = visit_FunctionDef
+    visit_ImportFrom = visit_FunctionDef
+    visit_Global = visit_FunctionDef
+    visit_Nonlocal = visit_FunctionDef
+    visit_Yield = visit_FunctionDef
+    visit_YieldFrom = visit_FunctionDef
+    visit_Await = visit_FunctionDef
+
+    def visit_ExceptHandler(self, node):
+        if node.name:
+            self.found = True
+
+        self.generic_visit(node)
+
+    def visit_Lambda(self, node):
+        pass
+
+
+def _has_bindings(stmts):
+    finder = _BindingFinder()
+    for stmt in stmts:
+        finder.visit(stmt)
+
+    return finder.found
+
+
+class DeadCodeEliminator(ast.NodeTransformer):
+    '''
+    Removes branches of if/while statements with constant tests and
+    statements that do nothing.
+
+    Inside functions (and classes nested in them), dead branches that
+    bind names are left to the compiler (which drops their code but
+    keeps the names local).
+    '''
+    def __init__(self):
+        self.in_function = False
+
+    def visit_FunctionDef(self, node):
+        in_function, self.in_function = self.in_function, True
+        self.generic_visit(node)
+        self.in_function = in_function
+        return node
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+    visit_Lambda = visit_FunctionDef
+
+    def visit_If(self, node):
+        self.generic_visit(node)
+        test = _get_test(node.test)
+        if test is _NOTHING:
+            return node
+
+        taken, dead = (node.body, node.orelse) if test else (node.orelse, node.body)
+        if self.in_function and _has_bindings(dead):
+            return node
+
+        return [s for s in taken if not isinstance(s, ast.Pass)]
+
+    def visit_While(self, node):
+        self.generic_visit(node)
+        test = _get_test(node.test)
+        if test is _NOTHING or test:
+            return node
+
+        if self.in_function and _has_bindings(node.body):
+            return node
+
+        return node.orelse
+
+    def generic_visit(self, node):
+        # A try statement must keep its finally clause if it had one
+        has_finalbody = bool(getattr(node, 'finalbody', None))
+        ast.NodeTransformer.generic_visit(self, node)
+        has_docstring = isinstance(node, (ast.Module, ast.FunctionDef,
+                                          ast.AsyncFunctionDef, ast.ClassDef))
+        for field in ('body', 'orelse', 'finalbody'):
+            stmts = getattr(node, field, None)
+            if not isinstance(stmts, list):
+                continue
+
+            stmts = [stmt for i, stmt in enumerate(stmts)
+                     if not _is_noop(stmt, has_docstring and field == 'body' and i == 0)]
+            if not stmts and ((field == 'body' and not isinstance(node, ast.Module)) or
+                              (field == 'finalbody' and has_finalbody)):
+                stmts = [ast.copy_location(ast.Pass(), node)]
+
+            setattr(node, field, stmts)
+
+        return node
+
+
+def _get_test(node):
+    if isinstance(node, ast.Name) and node.id == '__debug__':
+        # Modules are compiled with optimize=2, so the compiler treats
+        # __debug__ as False in conditions (but not elsewhere)
+        return False
+
+    return get_constant(node)
+
+
+def _is_noop(stmt, is_docstring):
+    if isinstance(stmt, ast.Pass):
+        return True
+
+    if isinstance(stmt, ast.Expr) and is_constant(stmt.value):
+        return not (is_docstring and isinstance(stmt.value, ast.Str))
+
+    return False
+
+
+BUILTIN_OPTIMIZERS = [
+    lambda tree: ConstantFolder().visit(tree),
+    lambda tree: DeadCodeEliminator().visit(tree),
+]
+
+
+def optimize_ast(tree):
+    '''
+    Runs the builtin optimizers followed by the ones registered with
+    config.add_ast_optimizer.
+    '''
+    for optimizer in BUILTIN_OPTIMIZERS + AST_OPTIMIZERS:
+        tree = optimizer(tree)
+
+    return ast.fix_missing_locations(tree)
@@ -16,12 +16,458 @@
 # License.
 
 from . import config
+from .util import *
 
 from threading import Lock
-from opcode import HAVE_ARGUMENT, EXTENDED_ARG, opmap
+from opcode import HAVE_ARGUMENT, EXTENDED_ARG, opmap, opname, hasjrel, hasjabs
+import types
 import dis
 
 NOP = opmap['NOP']
+LOAD_ATTR = opmap['LOAD_ATTR']
+CALL_FUNCTION = opmap['CALL_FUNCTION']
+CALL_FUNCTION_KW = opmap['CALL_FUNCTION_KW']
+LOAD_CONST = opmap['LOAD_CONST']
+MAKE_FUNCTION = opmap['MAKE_FUNCTION']
+LOAD_GLOBAL = opmap['LOAD_GLOBAL']
+LOAD_NAME = opmap['LOAD_NAME']
+LOAD_FAST = opmap['LOAD_FAST']
+DELETE_FAST = opmap['DELETE_FAST']
+STORE_FAST = opmap['STORE_FAST']
+GET_ITER = opmap['GET_ITER']
+FOR_ITER = opmap['FOR_ITER']
+SETUP_LOOP = opmap['SETUP_LOOP']
+SETUP_EXCEPT = opmap['SETUP_EXCEPT']
+SETUP_FINALLY = opmap['SETUP_FINALLY']
+SETUP_WITH = opmap['SETUP_WITH']
+SETUP_ASYNC_WITH = opmap['SETUP_ASYNC_WITH']
+POP_BLOCK = opmap['POP_BLOCK']
+END_FINALLY = opmap['END_FINALLY']
+BREAK_LOOP = opmap['BREAK_LOOP']
+CONTINUE_LOOP = opmap['CONTINUE_LOOP']
+COMPARE_OP = opmap['COMPARE_OP']
+POP_JUMP_IF_FALSE = opmap['POP_JUMP_IF_FALSE']
+BUILD_TUPLE = opmap['BUILD_TUPLE']
+BUILD_LIST = opmap['BUILD_LIST']
+BUILD_SET = opmap['BUILD_SET']
+BUILD_MAP = opmap['BUILD_MAP']
+BUILD_CONST_KEY_MAP = opmap['BUILD_CONST_KEY_MAP']
+
+PyCmp_EQ = 2
+
+IDX_LABEL = 0
+IDX_OP = 1
+IDX_OPARG = 2
+
+# Builtins that can read the values of fast locals
+_INTROSPECTION_NAMES = ('locals', 'vars', 'dir', 'eval', 'exec')
+
+_COMPREHENSIONS = ('<listcomp>', '<setcomp>', '<dictcomp>')
+
+# Opcodes that may appear between a callable and the CALL_FUNCTION
+# consuming it, mapped to their (pops, pushes) stack effect.
+_EXPR_EFFECTS = {
+    opmap['LOAD_FAST']: lambda oparg: (0, 1),
+    opmap['LOAD_CONST']: lambda oparg: (0, 1),
+    opmap['LOAD_NAME']: lambda oparg: (0, 1),
+    opmap['LOAD_GLOBAL']: lambda oparg: (0, 1),
+    opmap['LOAD_DEREF']: lambda oparg: (0, 1),
+    opmap['LOAD_CLASSDEREF']: lambda oparg: (0, 1),
+    opmap['LOAD_CLOSURE']: lambda oparg: (0, 1),
+    opmap['LOAD_ATTR']: lambda oparg: (1, 1),
+    opmap['BINARY_SUBSCR']: lambda oparg: (2, 1),
+    opmap['COMPARE_OP']: lambda oparg: (2, 1),
+    opmap['GET_ITER']: lambda oparg: (1, 1),
+    opmap['GET_AWAITABLE']: lambda oparg: (1, 1),
+    opmap['YIELD_FROM']: lambda oparg: (2, 1),
+    opmap['BUILD_TUPLE']: lambda oparg: (oparg, 1),
+    opmap['BUILD_LIST']: lambda oparg: (oparg, 1),
+    opmap['BUILD_SET']: lambda oparg: (oparg, 1),
+    opmap['BUILD_STRING']: lambda oparg: (oparg, 1),
+    opmap['BUILD_SLICE']: lambda oparg: (oparg, 1),
+    opmap['BUILD_MAP']: lambda oparg: (oparg * 2, 1),
+    opmap['BUILD_CONST_KEY_MAP']: lambda oparg: (oparg + 1, 1),
+    opmap['BUILD_TUPLE_UNPACK_WITH_CALL']: lambda oparg: (oparg, 1),
+    opmap['BUILD_TUPLE_UNPACK']: lambda oparg: (oparg, 1),
+    opmap['BUILD_LIST_UNPACK']: lambda oparg: (oparg, 1),
+    opmap['BUILD_MAP_UNPACK_WITH_CALL']: lambda oparg: (oparg, 1),
+    opmap['BUILD_MAP_UNPACK']: lambda oparg: (oparg, 1),
+    opmap['FORMAT_VALUE']: lambda oparg: (2 if oparg & 0x04 else 1, 1),
+    opmap['CALL_FUNCTION']: lambda oparg: (oparg + 1, 1),
+    opmap['CALL_FUNCTION_KW']: lambda oparg: (oparg + 2, 1),
+    opmap['CALL_FUNCTION_EX']: lambda oparg: (3 if oparg & 0x01 else 2, 1),
+    opmap['MAKE_FUNCTION']: lambda oparg: (2 + bin(oparg & 0x0f).count('1'), 1),
+}
+
+for _op in range(256):
+    if opname[_op].startswith(('BINARY_', 'INPLACE_')):
+        _EXPR_EFFECTS.setdefault(_op, lambda oparg: (2, 1))
+
+    elif opname[_op].startswith('UNARY_'):
+        _EXPR_EFFECTS[_op] = lambda oparg: (1, 1)
+
+
+def get_expr_effect(op, oparg):
+    '''
+    Returns the (pops, pushes) stack effect of an opcode that can be part
+    of an expression, or None if op is not a plain expression opcode.
+    '''
+    effect = _EXPR_EFFECTS.get(op)
+    if effect is None:
+        return None
+
+    return effect(oparg)
+
+
+def find_call(buf, i):
+    '''
+    Given the index of an instruction that pushes a callable, returns the
+    index of the CALL_FUNCTION/CALL_FUNCTION_KW that consumes it, or None
+    if it can't be proven (the value is consumed by something else, or
+    there's control flow in between).
+    '''
+    depth = 1
+    for j in range(i + 1, len(buf)):
+        _, op, oparg, _ = buf[j]
+        effect = get_expr_effect(op, oparg)
+        if effect is None:
+            return None
+
+        pops, pushes = effect
+        if op in (CALL_FUNCTION, CALL_FUNCTION_KW) and depth == pops:
+            return j
+
+        depth -= pops
+        if depth < 1:
+            return None
+
+        depth += pushes
+
+    return None
+
+
+def get_jump_targets(buf):
+    '''
+    Returns the set of labels that are the target of a jump in buf.
+    '''
+    targets = set()
+    for label, op, oparg, _ in buf:
+        if op in hasjrel:
+            targets.add(label + oparg + 2)
+
+        elif op in hasjabs:
+            targets.add(oparg)
+
+    return targets
+
+
+def find_range_loops(codeobj, buf):
+    '''
+    Finds the "for ... in range(...)" loops in buf: LOAD_GLOBAL range
+    (or LOAD_NAME), up to three arguments, CALL_FUNCTION, GET_ITER and
+    FOR_ITER. Returns a list of (call, get_iter, for_iter, skip) labels,
+    where skip is the label right after the STORE_FAST binding the loop
+    variable if that variable is never read, or None.
+    '''
+    code = list(codeobj.read_code())
+    loaded = {oparg for _, op, oparg, _ in code if op in (LOAD_FAST, DELETE_FAST)}
+    introspects = any(name in codeobj.co_names for name in _INTROSPECTION_NAMES)
+
+    loops = []
+    for i, (_, op, oparg, _) in enumerate(buf):
+        if op not in (LOAD_GLOBAL, LOAD_NAME) or codeobj.co_names[oparg] != 'range':
+            continue
+
+        j = find_call(buf, i)
+        if j is None or j + 2 >= len(buf) or buf[j][IDX_OP] != CALL_FUNCTION or \
+           not 1 <= buf[j][IDX_OPARG] <= 3:
+            continue
+
+        if buf[j + 1][IDX_OP] != GET_ITER or buf[j + 2][IDX_OP] != FOR_ITER:
+            continue
+
+        skip = None
+        if j + 3 < len(buf) and buf[j + 3][IDX_OP] == STORE_FAST and \
+           buf[j + 3][IDX_OPARG] not in loaded and not introspects:
+            skip = buf[j + 3][IDX_LABEL] + 2
+
+        loops.append((buf[j][IDX_LABEL], buf[j + 1][IDX_LABEL],
+                      buf[j + 2][IDX_LABEL], skip))
+
+    return loops
+
+
+def find_builtin_calls(codeobj, buf, builtins):
+    '''
+    Finds the calls in buf to a global from builtins, a dict mapping
+    each name to the (min, max) number of positional arguments its
+    specialized version takes. Returns a dict mapping the label of each
+    such CALL_FUNCTION to the name. The global may not be the builtin
+    at runtime, so it's always checked before taking the specialized
+    path.
+    '''
+    calls = {}
+    for i, (_, op, oparg, _) in enumerate(buf):
+        if op != LOAD_GLOBAL or codeobj.co_names[oparg] not in builtins:
+            continue
+
+        name = codeobj.co_names[oparg]
+        j = find_call(buf, i)
+        if j is None or buf[j][IDX_OP] != CALL_FUNCTION:
+            continue
+
+        low, high = builtins[name]
+        if low <= buf[j][IDX_OPARG] <= high:
+            calls[buf[j][IDX_LABEL]] = name
+
+    return calls
+
+
+def find_static_loops(buf, allow_breaks=True):
+    '''
+    Finds the loops in buf that don't need a block on the frame's block
+    stack: loops with no "continue" crossing a try block (CONTINUE_LOOP)
+    and whose "break"s aren't inside a try, with or except block nested
+    in the loop. If allow_breaks is False, only loops with no "break" at
+    all are returned. Returns a dict mapping the labels of the SETUP_LOOP,
+    POP_BLOCK and BREAK_LOOPs of each such loop to a (setup_label,
+    end_label, has_breaks) tuple.
+
+    Blocks are matched by their nesting in the bytecode; if buf doesn't
+    nest the usual way (e.g. async for), no loop is returned.
+    '''
+    handlers = set()
+    stack = []
+    loops = {}
+
+    for label, op, oparg, _ in buf:
+        if label in handlers:
+            # Start of an except, finally or with cleanup block,
+            # which ends at its END_FINALLY
+            stack.append({'loop': False, 'handler': True})
+
+        if op == SETUP_LOOP:
+            stack.append({'loop': True, 'handler': False, 'labels': [label],
+                          'setup': label, 'end': label + oparg + 2,
+                          'static': True, 'breaks': False})
+
+        elif op in (SETUP_EXCEPT, SETUP_FINALLY, SETUP_WITH, SETUP_ASYNC_WITH):
+            handlers.add(label + oparg + 2)
+            stack.append({'loop': False, 'handler': False})
+
+        elif op == POP_BLOCK:
+            if not stack or stack[-1]['handler']:
+                return {}
+
+            block = stack.pop()
+            if block['loop'] and block['static']:
+                block['labels'].append(label)
+                for l in block['labels']:
+                    loops[l] = (block['setup'], block['end'], block['breaks'])
+
+        elif op == END_FINALLY:
+            if not stack or not stack[-1]['handler']:
+                return {}
+
+            stack.pop()
+
+        elif op in (BREAK_LOOP, CONTINUE_LOOP):
+            loop = None
+            for block in reversed(stack):
+                if block['loop']:
+                    loop = block
+                    break
+
+            if loop is None:
+                return {}
+
+            if op == CONTINUE_LOOP or stack[-1] is not loop or not allow_breaks:
+                loop['static'] = False
+
+            else:
+                loop['labels'].append(label)
+                loop['breaks'] = True
+
+    if stack:
+        return {}
+
+    return loops
+
+
+def find_switch_chains(codeobj, buf, key_types, min_cases=3):
+    '''
+    Finds the "if x == c1: ... elif x == c2: ..." chains in buf: at least
+    min_cases tests of the same local against a constant of key_types,
+    each one jumping to the next when false. Returns a dict mapping the
+    label of the first test to a (local, cases, miss_label) tuple, where
+    cases is a list of (constant, body_label) and miss_label is where the
+    last test jumps when false. Equal constants keep the first case.
+    '''
+    index = {label: i for i, (label, _, _, _) in enumerate(buf)}
+    targets = get_jump_targets(buf)
+
+    def get_test(i):
+        # LOAD_FAST x, LOAD_CONST c, COMPARE_OP ==, POP_JUMP_IF_FALSE
+        if i + 3 >= len(buf) or any(label in targets for label, _, _, _ in buf[i + 1:i + 4]):
+            return None
+
+        ops = [(op, oparg) for _, op, oparg, _ in buf[i:i + 4]]
+        if ops[0][0] != LOAD_FAST or ops[1][0] != LOAD_CONST or \
+           ops[2] != (COMPARE_OP, PyCmp_EQ) or ops[3][0] != POP_JUMP_IF_FALSE:
+            return None
+
+        const = codeobj.co_consts[ops[1][1]]
+        if type(const) not in key_types or ops[3][1] <= buf[i + 3][IDX_LABEL]:
+            return None
+
+        return ops[0][1], const, buf[i + 3][IDX_LABEL] + 2, ops[3][1]
+
+    chains = {}
+    chained = set()
+    for i, (label, _, _, _) in enumerate(buf):
+        test = get_test(i) if label not in chained else None
+        if test is None:
+            continue
+
+        local = test[0]
+        cases = []
+        while True:
+            cases.append((test[1], test[2]))
+            miss = test[3]
+            test = get_test(index[miss]) if miss in index else None
+            if test is None or test[0] != local:
+                break
+
+            chained.add(miss)
+
+        if len(cases) >= min_cases and miss in index:
+            chains[label] = (local, cases, miss)
+
+    return chains
+
+
+def find_const_literals(codeobj, buf):
+    '''
+    Finds the tuple, list, set and dict displays in buf whose items are
+    all constants or other such displays, with no jump into them. Returns
+    a dict mapping the label of the first LOAD_CONST of each outermost one
+    to a (build_label, value, nested) tuple, where value is the container
+    built at compile time and nested tells whether it holds mutable
+    containers (which must be copied too). Tuples holding mutable
+    containers and displays that would raise (unhashable keys) are left
+    alone.
+    '''
+    targets = get_jump_targets(buf)
+    literals = {}
+    operands = [] # (first_label, value, mutable) of each value on the stack
+
+    for label, op, oparg, _ in buf:
+        if label in targets:
+            operands = []
+
+        if op == LOAD_CONST and not isinstance(codeobj.co_consts[oparg], types.CodeType):
+            operands.append((label, codeobj.co_consts[oparg], False))
+            continue
+
+        if op in (BUILD_TUPLE, BUILD_LIST, BUILD_SET):
+            count = oparg
+
+        elif op == BUILD_MAP:
+            count = oparg * 2
+
+        elif op == BUILD_CONST_KEY_MAP:
+            count = oparg + 1
+
+        else:
+            count = 0
+
+        if not count or len(operands) < count:
+            operands = []
+            continue
+
+        items = operands[-count:]
+        values = [value for _, value, _ in items]
+        nested = any(mutable for _, _, mutable in items)
+        try:
+            if op == BUILD_TUPLE:
+                if nested:
+                    raise TypeError
+
+                value = tuple(values)
+
+            elif op == BUILD_LIST:
+                value = values
+
+            elif op == BUILD_SET:
+                value = set(values)
+
+            elif op == BUILD_MAP:
+                value = dict(zip(values[::2], values[1::2]))
+
+            else:
+                keys = values.pop()
+                if type(keys) is not tuple or len(keys) != oparg:
+                    raise TypeError
+
+                value = dict(zip(keys, values))
+
+        except TypeError:
+            operands = []
+            continue
+
+        # Items that are displays themselves are part of this one now
+        for first, _, _ in items:
+            literals.pop(first, None)
+
+        first = items[0][0]
+        literals[first] = (label, value, nested)
+        del operands[-count:]
+        operands.append((first, value, op != BUILD_TUPLE))
+
+    return literals
+
+
+def find_inline_comprehensions(codeobj, buf):
+    '''
+    Finds the list, set and dict comprehensions in buf that can run
+    inline in the enclosing function: the function is called right away
+    with its iterator and doesn't need a frame of its own (no cells,
+    yields or frame introspection). Returns a dict mapping the labels of
+    both the MAKE_FUNCTION and the CALL_FUNCTION of each one to a
+    (make_label, call_label, CodeObject) tuple.
+    '''
+    comps = {}
+    for i in range(len(buf) - 2):
+        _, op, oparg, _ = buf[i]
+        if op != LOAD_CONST:
+            continue
+
+        code = codeobj.co_consts[oparg]
+        if not isinstance(code, types.CodeType) or code.co_name not in _COMPREHENSIONS:
+            continue
+
+        if buf[i + 2][IDX_OP] != MAKE_FUNCTION or buf[i + 2][IDX_OPARG] not in (0, 0x08):
+            continue
+
+        if code.co_cellvars or code.co_flags & (CO_GENERATOR | CO_COROUTINE |
+                                                 CO_ASYNC_GENERATOR):
+            continue
+
+        if any(name in code.co_names for name in _INTROSPECTION_NAMES):
+            continue
+
+        j = find_call(buf, i + 2)
+        if j is None or buf[j][IDX_OP] != CALL_FUNCTION or buf[j][IDX_OPARG] != 1:
+            continue
+
+        # The comprehension's labels are shifted so they don't clash with
+        # the enclosing function's (or any other inlined comprehension's)
+        comp = CodeObject(code)
+        comp.label_offset = (codeobj.label_offset + buf[i + 2][IDX_LABEL] + 2) << 20
+        comps[buf[i + 2][IDX_LABEL]] = comps[buf[j][IDX_LABEL]] = \
+            (buf[i + 2][IDX_LABEL], buf[j][IDX_LABEL], comp)
+
+    return comps
 
 
 class CodeObject:
@@ -32,6 +478,15 @@ class CodeObject:
                 setattr(self, attr, v)
 
         self.co_path = ''
+        self.label_offset = 0
+        self._extra_stacksize = None
+        self._local_types = None
+        self._inline_comps = None
+
+        # Functions defined in this module that calls in this code object
+        # can jump to directly (see Module.__find_direct_calls)
+        self.direct_funcs = {}
+        self.direct_calls = {}
 
     def get_full_name(self):
         return '%s.%s' % (self.co_path, self.co_name)
@@ -41,6 +496,59 @@ class CodeObject:
         sig += '_%d_%d_%d' % (len(self.co_code), self.co_stacksize, label)
         return sig
 
+    def get_stacksize(self):
+        '''
+        Returns the value stack size required by the generated code.
+        Fused method calls (see Module.handle_op) use one extra slot
+        each while they're being evaluated, and inlined comprehensions
+        keep their locals and stack on top of the caller's stack.
+        '''
+        if self._extra_stacksize is None:
+            buf = list(self.read_code())
+            events = []
+            for i, instr in enumerate(buf):
+                if instr[1] == LOAD_ATTR:
+                    j = find_call(buf, i)
+                    if j is not None:
+                        events.append((i, 1))
+                        events.append((j, -1))
+
+            extra = cur = 0
+            for _, delta in sorted(events):
+                cur += delta
+                extra = max(extra, cur)
+
+            inline = 0
+            for _, _, comp in self.get_inline_comprehensions().values():
+                inline = max(inline, comp.co_nlocals + comp.get_stacksize())
+
+            self._extra_stacksize = extra + inline
+
+        return self.co_stacksize + self._extra_stacksize
+
+    def get_local_types(self):
+        '''
+        Returns the inferred numeric type of each fast local
+        (see typeinfer.infer_local_types).
+        '''
+        if self._local_types is None:
+            from .typeinfer import infer_local_types
+            self._local_types = infer_local_types(self, list(self.read_code()))
+
+        return self._local_types
+
+    def get_inline_comprehensions(self):
+        '''
+        Returns the comprehensions inlined in this code object
+        (see find_inline_comprehensions).
+        '''
+        if self._inline_comps is None:
+            self._inline_comps = {}
+            if config.INLINE_COMPREHENSIONS:
+                self._inline_comps = find_inline_comprehensions(self, list(self.read_code()))
+
+        return self._inline_comps
+
     def read_code(self):
         code = self.co_code
         extended_arg = 0
@@ -58,5 +566,8 @@ class CodeObject:
             else:
                 oparg = None
 
+            if op in hasjabs:
+                oparg += self.label_offset
+
             if op != EXTENDED_ARG:
-                yield (i, op, oparg, line)
+                yield (i + self.label_offset, op, oparg, line)
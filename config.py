@@ -20,5 +20,17 @@ IMPORT_ALIASES = {}
 def add_import_alias(name, alias):
     IMPORT_ALIASES[name] = alias
 
+AST_OPTIMIZERS = []
+
+def add_ast_optimizer(optimizer):
+    '''
+    Registers a callable that takes a module's AST and returns the
+    transformed tree. Optimizers run before bytecode generation, after
+    the builtin ones in astoptimizer.py.
+    '''
+    AST_OPTIMIZERS.append(optimizer)
+
 MAX_FILE_SIZE = 250000 # 250kb
 SPLIT_INTERVAL = 4000 # Split code objects every <SPLIT_INTERVAL> instructions
+REGISTER_CODEGEN = True # Keep stack values in C locals within basic blocks
+INLINE_COMPREHENSIONS = True # Run list, set and dict comprehensions in the enclosing frame
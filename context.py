@@ -33,7 +33,27 @@ class Context:
         self.__indentstr = '  '
 
         self.codeobjs = []
+        self.method_calls = set()
+        self.numeric_runs = {}
+        self.range_loops = {}
+        self.builtin_calls = {}
+        self.static_loops = {}
+        self.switch_chains = {}
+        self.const_literals = {}
+
+        # Label to jump to with the result when generating an inlined
+        # comprehension (see Module.__handle_inline_comprehension)
+        self.inline_exit = None
+
+        # Register mode: values not yet pushed to the frame's stack,
+        # bottom to top (see Module.handle_register_op)
+        self.use_registers = False
+        self.registers = []
+        self.block_starts = set()
         self.jump_table = {}
+        self.continue_targets = set()
+        self.resume_labels = []
+        self.resume_base = 0
         self._last_label = -2
 
         self.buf = []
@@ -58,8 +78,8 @@ class Context:
         self._consts = []
 
     def finish(self, encapsulated):
-        if self.jump_table:
-            max_required_label = max(self.jump_table.keys())
+        if self.jump_table or self.resume_labels:
+            max_required_label = max(list(self.jump_table) + self.resume_labels)
             if self._last_label < max_required_label:
                 self.insert_label(max_required_label)
 
@@ -73,13 +93,19 @@ class Context:
         self.begin_block()
 
         self.insert_line('PyTryBlock *b = &f->f_blockstack[f->f_iblock - 1];')
-        self.insert_line('if (b->b_type == SETUP_LOOP && *why == WHY_CONTINUE)')
-        self.begin_block()
-        self.insert_line('*why = WHY_NOT;')
-        self.insert_line('_jmpto = (void*)(PyLong_AsSsize_t(retval));')
-        self.insert_line('Py_DECREF(retval);')
-        self.insert_line('JUMP_TO_ADDR(_jmpto);')
-        self.end_block()
+        if self.continue_targets:
+            # retval is the target label of a CONTINUE_LOOP, which the
+            # constants keep alive
+            self.insert_line('if (b->b_type == SETUP_LOOP && *why == WHY_CONTINUE)')
+            self.begin_block()
+            self.insert_line('*why = WHY_NOT;')
+            self.insert_line('Py_DECREF(retval);')
+            self.insert_line('switch (PyLong_AS_LONG(retval))')
+            self.begin_block()
+            for target in sorted(self.continue_targets):
+                self.insert_line('case %d: goto label_%d;' % (target, target))
+            self.end_block()
+            self.end_block()
 
         self.insert_line('f->f_iblock--;')
         self.insert_line('if (b->b_type == EXCEPT_HANDLER)')
@@ -175,6 +201,7 @@ class Context:
 
         self.file.write('  PyThreadState *tstate = PyThreadState_GET();\n')
         self.file.write('  PyObject **stack_pointer = f->f_stacktop;\n')
+        self.file.write('  f->f_stacktop = NULL; /* restored on exit */\n')
         self.file.write('  PyObject **fastlocals = f->f_localsplus;\n')
         self.file.write('  PyObject **freevars = f->f_localsplus + %d;\n' % self.nlocals)
 
@@ -194,14 +221,14 @@ class Context:
         self.file.write('    default: goto start;\n')
         self.file.write('  }\n')
 
-        # Pre-start: for generators, jump to last instruction
+        # Pre-start: for generators, jump to the resume point
         self.file.write('  pre_start:\n')
 
         if self.flags & (CO_GENERATOR | CO_COROUTINE | CO_ASYNC_GENERATOR):
             self.file.write('  if (PyErr_Occurred()) goto error; /* generator.throw() */\n')
-            self.file.write('  f->f_lineno = 0;')
-            self.file.write('  _jmpto = (void*)f->f_lasti;')
-            self.file.write('  goto jump_table;')
+            self.file.write('  f->f_lineno = 0;\n')
+            if self.resume_labels:
+                self.__write_resume_table()
 
         else:
             self.file.write('  assert(!PyErr_Occurred());\n')
@@ -213,6 +240,27 @@ class Context:
         self.file.write(self.codebuffer.read() + '}\n\n')
         self.file.consider_next()
 
+    def __write_resume_table(self):
+        # f->f_lasti is -1 until the first yield (see insert_yield). When
+        # the code object is split, this chunk only owns a range of the
+        # resume points; a stale index left by an earlier chunk is ignored
+        first = -2 - self.resume_base
+        last = first - len(self.resume_labels) + 1
+        self.file.write('  if (f->f_lasti <= %d && f->f_lasti >= %d) {\n' % (first, last))
+        self.file.write('#ifdef HAVE_COMPUTED_GOTOS\n')
+        self.file.write('    static void* const resume_table[] = {\n')
+        for label in self.resume_labels:
+            self.file.write('      &&label_%d,\n' % label)
+        self.file.write('    };\n')
+        self.file.write('    goto *resume_table[%d - f->f_lasti];\n' % first)
+        self.file.write('#else\n')
+        self.file.write('    switch (%d - f->f_lasti) {\n' % first)
+        for idx, label in enumerate(self.resume_labels):
+            self.file.write('      case %d: goto label_%d;\n' % (idx, label))
+        self.file.write('    }\n')
+        self.file.write('#endif\n')
+        self.file.write('  }\n')
+
     def flushconsts(self):
         self.flushconsts()
 
@@ -232,16 +280,42 @@ class Context:
         self.codebuffer.write('\n')
 
     def insert_yield(self, line, label):
-        self.jump_table[label] = 'label_%d' % label
+        # Resume points are numbered densely and stored in f_lasti as
+        # -2 - index: -1 still means "not started" and CPython never
+        # mistakes the index for a bytecode offset (see _PyGen_yf)
+        idx = self.resume_base + len(self.resume_labels)
+        self.resume_labels.append(label)
         self.insert_line('*why = WHY_YIELD;')
-        self.insert_line('f->f_lasti = %d;' % label)
+        self.insert_line('f->f_lasti = %d; /* resume point %d */' % (-2 - idx, idx))
         self.insert_line('f->f_lineno = %d; /* in case of throw() */' % line)
         self.insert_line('goto end;')
 
     def insert_handle_error(self, line, label):
+        for reg in self.registers:
+            self.insert_line('PUSH(%s);' % reg)
+
         self.insert_line('f->f_lineno = %d;' % line)
         self.insert_line('goto error;')
 
+    def new_register(self):
+        '''
+        Returns a register that doesn't hold a pending value. The caller
+        must append it to self.registers once it holds a new reference.
+        '''
+        i = 0
+        while 'r%d' % i in self.registers:
+            i += 1
+
+        reg = 'r%d' % i
+        self.add_decl_once(reg, 'PyObject*', 'NULL', False)
+        return reg
+
+    def spill_registers(self):
+        for reg in self.registers:
+            self.insert_line('PUSH(%s);' % reg)
+
+        self.registers = []
+
     def insert_get_address(self, idx):
         label = 'label_%d' % idx
         self.jump_table[idx] = label
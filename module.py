@@ -15,9 +15,12 @@
 # language governing permissions and limitations under the
 # License.
 
-from .codeobj import CodeObject
-from .config import IMPORT_ALIASES, SPLIT_INTERVAL
+from .astoptimizer import optimize_ast
+from .codeobj import CodeObject, find_builtin_calls, find_call, find_const_literals, find_range_loops, \
+                     find_static_loops, find_switch_chains, get_jump_targets
+from .config import IMPORT_ALIASES, SPLIT_INTERVAL, REGISTER_CODEGEN
 from .context import Context
+from .typeinfer import INT, find_numeric_runs
 from .util import *
 
 from opcode import *
@@ -25,6 +28,7 @@ globals().update(opmap)
 
 import hashlib
 import struct
+import re
 import types
 import dis
 import ast
@@ -43,6 +47,40 @@ FVC_ASCII = 0x3
 FVS_MASK = 0x4
 FVS_HAVE_SPEC = 0x4
 
+PyCmp_EQ = 2
+PyCmp_NE = 3
+PyCmp_IN = 6
+PyCmp_NOT_IN = 7
+PyCmp_IS = 8
+PyCmp_IS_NOT = 9
+PyCmp_EXC_MATCH = 10
+
+# Constants that compare to exact str and int keys the same way through a
+# hash lookup (see __pypperoni_IMPL_in_const and find_switch_chains)
+SET_PROBE_TYPES = (str, int, float, bytes, bool, type(None))
+
+# Builtins whose calls go through __pypperoni_IMPL_builtin_<name> when
+# the global is still the original object: name -> (min, max) number of
+# positional arguments. Missing optional arguments are passed as NULL.
+BUILTIN_CALLS = {
+    'abs': (1, 1),
+    'getattr': (2, 3),
+    'hasattr': (2, 2),
+    'isinstance': (2, 2),
+    'len': (1, 1),
+    'max': (2, 2),
+    'min': (2, 2),
+    'type': (1, 1),
+}
+
+# Largest UNPACK_SEQUENCE whose items are copied inline from exact
+# tuples and lists
+MAX_INLINE_UNPACK = 8
+
+# Constant format specs handled by __pypperoni_IMPL_format_number:
+# [0][width][.precision]d|f
+NUMBER_SPEC_RE = re.compile(r'^(0?)([1-9][0-9]{0,3})?(?:\.([0-9]{1,3}))?([df])$')
+
 
 class ModuleBase:
     '''
@@ -94,9 +132,511 @@ class Module(ModuleBase):
         return None
 
     def __handle_one_instr(self, codeobj, context, label, op, oparg, line):
+        if label in context.block_starts:
+            context.spill_registers()
+
         context.insert_label(label)
+        run = context.numeric_runs.get(label)
+        if run is not None:
+            self.__handle_numeric_run(codeobj, context, label, run)
+
+        chain = context.switch_chains.get(label)
+        if chain is not None:
+            self.__handle_switch_chain(codeobj, context, chain)
+
+        literal = context.const_literals.get(label)
+        if literal is not None:
+            self.__handle_const_literal(context, literal, line, label)
+            return
+
+        if context.use_registers and self.handle_register_op(codeobj, context, label,
+                                                             op, oparg, line):
+            return
+
+        context.spill_registers()
         self.handle_op(codeobj, context, label, op, oparg, line)
 
+    def handle_register_op(self, codeobj, context, label, op, oparg, line):
+        '''
+        Handles op keeping its operands and result in C locals (registers)
+        instead of the frame's value stack. Registers are spilled at block
+        boundaries, error exits and before any op not handled here.
+        Returns False if op must go through handle_op.
+        '''
+        regs = context.registers
+
+        def pop(n):
+            values = regs[-n:]
+            del regs[-n:]
+            return values
+
+        if op == LOAD_FAST:
+            reg = context.new_register()
+            name = codeobj.co_varnames[oparg]
+            context.insert_line('%s = fastlocals[%d];' % (reg, oparg))
+            context.insert_line('if (%s == NULL) {' % reg)
+            errormsg = "local variable '%.200s' referenced before assignment" % name
+            context.insert_line('PyErr_SetString(PyExc_UnboundLocalError, %s);' % context.register_literal(errormsg))
+            context.insert_handle_error(line, label)
+            context.insert_line('}')
+            context.insert_line('Py_INCREF(%s);' % reg)
+            regs.append(reg)
+
+        elif op == LOAD_CONST:
+            value = codeobj.co_consts[oparg]
+            if isinstance(value, types.CodeType):
+                return False
+
+            if len(context.buf) > context.i + 1 and \
+               context.buf[context.i + 1][IDX_OP] == IMPORT_NAME:
+                return False
+
+            reg = context.new_register()
+            if value is None:
+                context.insert_line('%s = Py_None;' % reg)
+
+            else:
+                context.insert_line('%s = %s; /* %s */' % (reg, context.register_const(value),
+                                                            safeRepr(value)))
+
+            context.insert_line('Py_INCREF(%s);' % reg)
+            regs.append(reg)
+
+        elif op == LOAD_GLOBAL:
+            reg = context.new_register()
+            context.insert_line('%s = %s;' % (reg, self.__get_load_global_call(codeobj, context,
+                                                                              label, oparg)))
+            context.insert_line('if (%s == NULL) {' % reg)
+            context.insert_handle_error(line, label)
+            context.insert_line('}')
+            regs.append(reg)
+
+        elif op == CALL_FUNCTION and label in context.builtin_calls and len(regs) > oparg:
+            # Same as the stack version below
+            func, *args = pop(oparg + 1)
+            name = context.builtin_calls[label]
+            context.insert_line('if (%s == __pypperoni_IMPL_builtins[PYPPERONI_BUILTIN_%s])' %
+                                (func, name.upper()))
+            context.begin_block()
+            context.insert_line('err = %s;' % self.__get_builtin_call(name, args))
+            for reg in args + [func]:
+                context.insert_line('Py_DECREF(%s);' % reg)
+
+            context.end_block()
+            context.insert_line('else')
+            context.begin_block()
+            for reg in [func] + args:
+                context.insert_line('PUSH(%s);' % reg)
+
+            context.insert_line('x = __pypperoni_IMPL_call_func(&stack_pointer, %d, NULL);' % oparg)
+            context.insert_line('err = (x == NULL);')
+            context.end_block()
+            context.insert_line('if (err != 0) {')
+            context.insert_handle_error(line, label)
+            context.insert_line('}')
+            reg = context.new_register()
+            context.insert_line('%s = x;' % reg)
+            regs.append(reg)
+
+        elif op == UNPACK_SEQUENCE and regs and 0 < oparg <= MAX_INLINE_UNPACK:
+            # Items go to new registers, last item first (bottom)
+            items = []
+            for _ in range(oparg):
+                items.append(context.new_register())
+                regs.append(items[-1])
+
+            del regs[-oparg:]
+            seq, = pop(1)
+
+            for check, values in self.__get_unpack_checks(seq, oparg):
+                context.insert_line(check)
+                context.begin_block()
+                for reg, value in zip(items, values):
+                    context.insert_line('%s = %s;' % (reg, value))
+                    context.insert_line('Py_INCREF(%s);' % reg)
+
+                context.insert_line('Py_DECREF(%s);' % seq)
+                context.end_block()
+
+            context.insert_line('else')
+            context.begin_block()
+            context.insert_line('err = __pypperoni_IMPL_unpack_sequence(%s, &stack_pointer, %d);' %
+                                (seq, oparg))
+            context.insert_line('if (err != 0) {')
+            context.insert_handle_error(line, label)
+            context.insert_line('}')
+            for reg in reversed(items):
+                context.insert_line('%s = POP();' % reg)
+
+            context.end_block()
+            regs.extend(items)
+
+        elif op == STORE_FAST and regs:
+            reg, = pop(1)
+            context.insert_line('tmp = fastlocals[%d];' % oparg)
+            context.insert_line('fastlocals[%d] = %s;' % (oparg, reg))
+            context.insert_line('Py_XDECREF(tmp);')
+
+        elif op == POP_TOP and regs:
+            reg, = pop(1)
+            context.insert_line('Py_DECREF(%s);' % reg)
+
+        elif op == DUP_TOP and regs:
+            reg = context.new_register()
+            context.insert_line('%s = %s;' % (reg, regs[-1]))
+            context.insert_line('Py_INCREF(%s);' % reg)
+            regs.append(reg)
+
+        elif op == ROT_TWO and len(regs) >= 2:
+            regs[-2:] = [regs[-1], regs[-2]]
+
+        elif op == ROT_THREE and len(regs) >= 3:
+            regs[-3:] = [regs[-1], regs[-3], regs[-2]]
+
+        elif opname[op].startswith('UNARY_') and regs:
+            reg, = pop(1)
+            context.insert_line('err = __pypperoni_IMPL_%s(%s, &x);' % (opname[op].lower(), reg))
+            context.insert_line('Py_DECREF(%s);' % reg)
+            context.insert_line('if (err != 0) {')
+            context.insert_handle_error(line, label)
+            context.insert_line('}')
+            reg = context.new_register()
+            context.insert_line('%s = x;' % reg)
+            regs.append(reg)
+
+        elif op == BUILD_SLICE and oparg == 2 and len(regs) >= 3 and self.__get_fused_subscr(context):
+            # seq[a:b]
+            v, u, w = pop(3)
+            context.i += 1
+            context.insert_line('err = __pypperoni_IMPL_get_slice(%s, %s, %s, &x);' % (v, u, w))
+            context.insert_line('Py_DECREF(%s);' % v)
+            context.insert_line('Py_DECREF(%s);' % u)
+            context.insert_line('Py_DECREF(%s);' % w)
+            context.insert_line('if (err != 0) {')
+            context.insert_handle_error(line, label)
+            context.insert_line('}')
+            reg = context.new_register()
+            context.insert_line('%s = x;' % reg)
+            regs.append(reg)
+
+        elif op in (BINARY_ADD, INPLACE_ADD) and len(regs) >= 2 and self.__get_add_store(context):
+            # The reference to v is stolen
+            v, w = pop(2)
+            context.insert_line('err = %s;' % self.__get_add_call(codeobj, context, op, v, w))
+            context.insert_line('Py_DECREF(%s);' % w)
+            context.insert_line('if (err != 0) {')
+            context.insert_handle_error(line, label)
+            context.insert_line('}')
+            reg = context.new_register()
+            context.insert_line('%s = x;' % reg)
+            regs.append(reg)
+
+        elif opname[op].startswith(('BINARY_', 'INPLACE_')) and len(regs) >= 2:
+            v, w = pop(2)
+            context.insert_line('err = %s;' % self.__get_binary_call(codeobj, context, op, v, w))
+            context.insert_line('Py_DECREF(%s);' % v)
+            context.insert_line('Py_DECREF(%s);' % w)
+            context.insert_line('if (err != 0) {')
+            context.insert_handle_error(line, label)
+            context.insert_line('}')
+            reg = context.new_register()
+            context.insert_line('%s = x;' % reg)
+            regs.append(reg)
+
+        elif op == COMPARE_OP and len(regs) >= 2 and self.__get_fused_jump(context):
+            v, w = pop(2)
+            context.spill_registers()
+            self.__insert_fused_jump(context, self.__get_compare_call(codeobj, context, oparg, v, w, True),
+                                     [v, w], False, line, label)
+
+        elif op == UNARY_NOT and regs and self.__get_fused_jump(context):
+            reg, = pop(1)
+            context.spill_registers()
+            self.__insert_fused_jump(context, '__pypperoni_IMPL_check_cond(%s, &result)' % reg,
+                                     [reg], True, line, label)
+
+        elif op == COMPARE_OP and len(regs) >= 2:
+            v, w = pop(2)
+            context.insert_line('err = %s;' % self.__get_compare_call(codeobj, context, oparg, v, w))
+            context.insert_line('Py_DECREF(%s);' % v)
+            context.insert_line('Py_DECREF(%s);' % w)
+            context.insert_line('if (err != 0) {')
+            context.insert_handle_error(line, label)
+            context.insert_line('}')
+            reg = context.new_register()
+            context.insert_line('%s = x;' % reg)
+            regs.append(reg)
+
+        elif op == LOAD_ATTR and regs and find_call(context.buf, context.i - 1) is None:
+            reg, = pop(1)
+            context.insert_line('x = PyObject_GetAttr(%s, %s);' % (reg, context.register_const(
+                                                                   codeobj.co_names[oparg])))
+            context.insert_line('Py_DECREF(%s);' % reg)
+            context.insert_line('if (x == NULL) {')
+            context.insert_handle_error(line, label)
+            context.insert_line('}')
+            reg = context.new_register()
+            context.insert_line('%s = x;' % reg)
+            regs.append(reg)
+
+        elif op == STORE_ATTR and len(regs) >= 2:
+            u, v = pop(2)
+            context.insert_line('err = PyObject_SetAttr(%s, %s, %s);' % (v, context.register_const(
+                                                                         codeobj.co_names[oparg]), u))
+            context.insert_line('Py_DECREF(%s);' % u)
+            context.insert_line('Py_DECREF(%s);' % v)
+            context.insert_line('if (err != 0) {')
+            context.insert_handle_error(line, label)
+            context.insert_line('}')
+
+        elif op == STORE_SUBSCR and len(regs) >= 3:
+            u, v, w = pop(3)
+            context.insert_line('err = __pypperoni_IMPL_store_subscr(%s, %s, %s);' % (v, w, u))
+            context.insert_line('Py_DECREF(%s);' % w)
+            context.insert_line('Py_DECREF(%s);' % v)
+            context.insert_line('Py_DECREF(%s);' % u)
+            context.insert_line('if (err != 0) {')
+            context.insert_handle_error(line, label)
+            context.insert_line('}')
+
+        elif op in (BUILD_TUPLE, BUILD_LIST) and len(regs) >= oparg:
+            kind = 'Tuple' if op == BUILD_TUPLE else 'List'
+            context.insert_line('x = Py%s_New(%d);' % (kind, oparg))
+            context.insert_line('if (x == NULL) {')
+            context.insert_handle_error(line, label)
+            context.insert_line('}')
+            for i, reg in enumerate(pop(oparg) if oparg else []):
+                context.insert_line('Py%s_SET_ITEM(x, %d, %s);' % (kind, i, reg))
+
+            reg = context.new_register()
+            context.insert_line('%s = x;' % reg)
+            regs.append(reg)
+
+        elif op == FORMAT_VALUE and len(regs) >= (2 if oparg & FVS_MASK else 1):
+            spec, = pop(1) if oparg & FVS_MASK else ['NULL']
+            reg, = pop(1)
+            context.insert_line('x = %s;' % self.__get_format_call(codeobj, context, oparg, reg, spec))
+            context.insert_line('Py_DECREF(%s);' % reg)
+            if spec != 'NULL':
+                context.insert_line('Py_DECREF(%s);' % spec)
+
+            context.insert_line('if (x == NULL) {')
+            context.insert_handle_error(line, label)
+            context.insert_line('}')
+            reg = context.new_register()
+            context.insert_line('%s = x;' % reg)
+            regs.append(reg)
+
+        elif op == BUILD_STRING and oparg and len(regs) >= oparg:
+            context.insert_line('{')
+            context.insert_line('PyObject* items[] = {%s};' % ', '.join(pop(oparg)))
+            context.insert_line('x = __pypperoni_IMPL_build_string(items, %d);' % oparg)
+            context.insert_line('}')
+            context.insert_line('if (x == NULL) {')
+            context.insert_handle_error(line, label)
+            context.insert_line('}')
+            reg = context.new_register()
+            context.insert_line('%s = x;' % reg)
+            regs.append(reg)
+
+        elif op in (POP_JUMP_IF_TRUE, POP_JUMP_IF_FALSE) and regs:
+            reg, = pop(1)
+            context.spill_registers()
+            context.add_decl_once('result', 'int', None, False)
+            context.insert_line('err = __pypperoni_IMPL_check_cond(%s, &result);' % reg)
+            context.insert_line('Py_DECREF(%s);' % reg)
+            context.insert_line('if (err != 0) {')
+            context.insert_handle_error(line, label)
+            context.insert_line('}')
+            context.insert_line('if (%sresult)' %
+                                ('!' if op == POP_JUMP_IF_FALSE else ''))
+            context.begin_block()
+            context.insert_line('goto label_%d;' % oparg)
+            context.end_block()
+
+        elif op == RETURN_VALUE and regs:
+            reg, = pop(1)
+            context.spill_registers()
+            if context.inline_exit:
+                context.insert_line('x = %s;' % reg)
+                context.insert_line('goto %s;' % context.inline_exit)
+
+            else:
+                context.insert_line('retval = %s;' % reg)
+                context.insert_line('*why = WHY_RETURN; goto fast_block_end;')
+
+        else:
+            return False
+
+        return True
+
+    def __handle_const_literal(self, context, literal, line, label):
+        '''
+        Emits a display built only from constants (see find_const_literals)
+        as a copy of the container stored in the constants, skipping the
+        instructions that would build it item by item.
+        '''
+        build_label, value, nested = literal
+        while context.buf[context.i - 1][IDX_LABEL] != build_label:
+            context.i += 1
+
+        const = context.register_const(value)
+        if type(value) is tuple:
+            context.insert_line('x = %s;' % const)
+            context.insert_line('Py_INCREF(x);')
+
+        else:
+            if nested:
+                context.insert_line('x = __pypperoni_IMPL_copy_const(%s);' % const)
+
+            elif type(value) is list:
+                context.insert_line('x = PyList_GetSlice(%s, 0, %d);' % (const, len(value)))
+
+            elif type(value) is set:
+                context.insert_line('x = PySet_New(%s);' % const)
+
+            else:
+                context.insert_line('x = PyDict_Copy(%s);' % const)
+
+            context.insert_line('if (x == NULL) {')
+            context.insert_handle_error(line, label)
+            context.insert_line('}')
+
+        if context.use_registers:
+            reg = context.new_register()
+            context.insert_line('%s = x;' % reg)
+            context.registers.append(reg)
+
+        else:
+            context.insert_line('PUSH(x);')
+
+    def __handle_switch_chain(self, codeobj, context, chain):
+        '''
+        Emits a single hash lookup dispatching an if/elif chain (see
+        find_switch_chains) to the body of the matching test. Keys other
+        than exact str and int fall through to the tests.
+        '''
+        local, cases, miss = chain
+        table = {}
+        for i, (value, _) in enumerate(cases):
+            table.setdefault(value, i)
+
+        context.insert_line('/* switch on %s */' % codeobj.co_varnames[local])
+        context.begin_block()
+        context.insert_line('PyObject* key = fastlocals[%d];' % local)
+        context.insert_line('if (key != NULL && (PyUnicode_CheckExact(key) || PyLong_CheckExact(key))) {')
+        context.insert_line('switch (__pypperoni_IMPL_switch_index(%s, key)) {' %
+                            context.register_const(table))
+        for i in sorted(table.values()):
+            context.insert_line('case %d: goto label_%d;' % (i, cases[i][1]))
+
+        context.insert_line('default: goto label_%d;' % miss)
+        context.insert_line('}')
+        context.insert_line('}')
+        context.end_block()
+
+    def __handle_numeric_run(self, codeobj, context, label, run):
+        '''
+        Emits an unboxed version of a numeric run (see typeinfer.py).
+        If any guard fails it falls through to the generic code.
+        '''
+        deopt = 'goto numeric_deopt_%d;' % label
+
+        def as_double(value):
+            if value.type == INT:
+                return '(double)%s' % value.cname
+
+            return value.cname
+
+        context.insert_line('/* numeric run */')
+        context.begin_block()
+        for value in run.temps:
+            context.insert_line('%s %s;' % ('long long' if value.type == INT else 'double',
+                                            value.cname))
+
+        boxed = list(run.stores.items()) + [(None, value) for value in run.stack]
+        context.insert_line('PyObject* boxed[%d];' % len(boxed))
+
+        for local, value in run.entries:
+            unbox = 'long' if value.type == INT else 'double'
+            context.insert_line('if (!__pypperoni_IMPL_unbox_%s(fastlocals[%d], &%s)) %s' %
+                                (unbox, local, value.cname, deopt))
+
+        for kind, dst, a, b in run.steps:
+            if kind == 'neg':
+                if dst.type == INT:
+                    context.insert_line('if (%s == LLONG_MIN) %s' % (a.cname, deopt))
+
+                context.insert_line('%s = -%s;' % (dst.cname, a.cname))
+
+            elif kind in ('floordiv', 'mod'):
+                out = '&%s, NULL' if kind == 'floordiv' else 'NULL, &%s'
+                if dst.type == INT:
+                    context.insert_line('if (__pypperoni_IMPL_long_floor_divmod(%s, %s, %s)) %s' %
+                                        (a.cname, b.cname, out % dst.cname, deopt))
+
+                else:
+                    context.insert_line('if (__pypperoni_IMPL_float_floor_divmod(%s, %s, %s)) %s' %
+                                        (as_double(a), as_double(b), out % dst.cname, deopt))
+
+            elif kind == 'truediv':
+                if a.type == INT and b.type == INT:
+                    context.insert_line('if (__pypperoni_IMPL_long_true_divide(%s, %s, &%s)) %s' %
+                                        (a.cname, b.cname, dst.cname, deopt))
+
+                else:
+                    context.insert_line('if (%s == 0.0) %s' % (as_double(b), deopt))
+                    context.insert_line('%s = %s / %s;' % (dst.cname, as_double(a), as_double(b)))
+
+            elif dst.type == INT:
+                context.insert_line('if (__PYPPERONI_%s_OVERFLOW(%s, %s, &%s)) %s' %
+                                    (kind.upper(), a.cname, b.cname, dst.cname, deopt))
+
+            else:
+                opstr = {'add': '+', 'sub': '-', 'mul': '*'}[kind]
+                context.insert_line('%s = %s %s %s;' % (dst.cname, as_double(a), opstr,
+                                                        as_double(b)))
+
+        # Box everything before touching the frame so we can still bail out
+        for i, (_, value) in enumerate(boxed):
+            if value.local is not None:
+                context.insert_line('boxed[%d] = fastlocals[%d];' % (i, value.local))
+                context.insert_line('Py_INCREF(boxed[%d]);' % i)
+
+            elif value.const is not None:
+                context.insert_line('boxed[%d] = %s; /* %s */' % (i, context.register_const(value.const),
+                                                                   safeRepr(value.const)))
+                context.insert_line('Py_INCREF(boxed[%d]);' % i)
+
+            elif value.type == INT:
+                context.insert_line('boxed[%d] = PyLong_FromLongLong(%s);' % (i, value.cname))
+
+            else:
+                context.insert_line('boxed[%d] = PyFloat_FromDouble(%s);' % (i, value.cname))
+
+        if boxed:
+            context.insert_line('if (%s) {' % ' || '.join('boxed[%d] == NULL' % i
+                                                         for i in range(len(boxed))))
+            for i in range(len(boxed)):
+                context.insert_line('  Py_XDECREF(boxed[%d]);' % i)
+
+            context.insert_line('  PyErr_Clear();')
+            context.insert_line('  %s' % deopt)
+            context.insert_line('}')
+
+        for i, (local, value) in enumerate(boxed):
+            if local is None:
+                context.insert_line('PUSH(boxed[%d]);' % i)
+
+            else:
+                context.insert_line('tmp = fastlocals[%d];' % local)
+                context.insert_line('fastlocals[%d] = boxed[%d];' % (local, i))
+                context.insert_line('Py_XDECREF(tmp);')
+
+        context.insert_line('goto label_%d;' % run.get_exit_label(context.buf))
+        context.insert_line('numeric_deopt_%d: ;' % label)
+        context.end_block()
+
     def handle_op(self, codeobj, context, label, op, oparg, line):
         if op == NOP:
             context.insert_line('/* NOP */')
@@ -235,7 +775,7 @@ class Module(ModuleBase):
             context.insert_line('w = POP();')
             context.insert_line('v = POP();')
             context.insert_line('u = POP();')
-            context.insert_line('err = PyObject_SetItem(v, w, u);')
+            context.insert_line('err = __pypperoni_IMPL_store_subscr(v, w, u);')
             context.insert_line('Py_DECREF(w);')
             context.insert_line('Py_DECREF(v);')
             context.insert_line('Py_DECREF(u);')
@@ -327,12 +867,23 @@ class Module(ModuleBase):
             context.insert_line('PyCell_Set(tmp, NULL);')
             context.end_block()
 
+        elif op == COMPARE_OP and self.__get_fused_jump(context):
+            context.insert_line('w = POP(); /* right */')
+            context.insert_line('v = POP(); /* left */')
+            self.__insert_fused_jump(context, self.__get_compare_call(codeobj, context, oparg, 'v', 'w', True),
+                                     ['v', 'w'], False, line, label)
+
+        elif op == UNARY_NOT and self.__get_fused_jump(context):
+            context.insert_line('x = POP();')
+            self.__insert_fused_jump(context, '__pypperoni_IMPL_check_cond(x, &result)',
+                                     ['x'], True, line, label)
+
         elif op == COMPARE_OP:
             context.begin_block()
 
             context.insert_line('w = POP(); /* right */')
             context.insert_line('v = TOP(); /* left */')
-            context.insert_line('err = __pypperoni_IMPL_compare(v, w, %d, &x);' % oparg)
+            context.insert_line('err = %s;' % self.__get_compare_call(codeobj, context, oparg, 'v', 'w'))
             context.insert_line('Py_DECREF(w);')
             context.insert_line('Py_DECREF(v);')
             context.insert_line('if (err != 0) {')
@@ -343,20 +894,11 @@ class Module(ModuleBase):
 
         elif op == BUILD_STRING:
             context.begin_block()
-            context.insert_line('u = PyUnicode_New(0, 0); /* empty */')
-            context.insert_line('if (u == NULL) {')
-            context.insert_handle_error(line, label)
-            context.insert_line('}')
-            context.insert_line('x = _PyUnicode_JoinArray(u, stack_pointer - %d, %d);' % (oparg, oparg))
-            context.insert_line('Py_DECREF(u);')
+            context.insert_line('x = __pypperoni_IMPL_build_string(stack_pointer - %d, %d);' % (oparg, oparg))
+            context.insert_line('STACKADJ(-%d);' % oparg)
             context.insert_line('if (x == NULL) {')
             context.insert_handle_error(line, label)
             context.insert_line('}')
-
-            for i in range(oparg):
-                context.insert_line('v = POP();')
-                context.insert_line('Py_DECREF(v);')
-
             context.insert_line('PUSH(x);')
             context.end_block()
 
@@ -562,21 +1104,46 @@ class Module(ModuleBase):
             context.insert_handle_error(line, label)
             context.end_block()
 
+            # Keys are inserted in order, the values are left on the
+            # stack until the dict is complete
             for i in range(oparg):
-                context.insert_line('v = PyTuple_GET_ITEM(x, %d);' % (oparg - i - 1))
-                context.insert_line('w = POP();')
+                context.insert_line('v = PyTuple_GET_ITEM(x, %d);' % i)
+                context.insert_line('w = PEEK(%d);' % (oparg - i))
                 context.insert_line('err = PyDict_SetItem(u, v, w);')
-                context.insert_line('Py_DECREF(w);')
                 context.insert_line('if (err != 0)')
                 context.begin_block()
                 context.insert_line('Py_DECREF(u);')
+                context.insert_line('Py_DECREF(x);')
                 context.insert_handle_error(line, label)
                 context.end_block()
 
+            context.insert_line('Py_DECREF(x);')
+            for i in range(oparg):
+                context.insert_line('w = POP();')
+                context.insert_line('Py_DECREF(w);')
+
             context.insert_line('PUSH(u);')
 
             context.end_block()
 
+        elif op == BUILD_SLICE and oparg == 2 and self.__get_fused_subscr(context):
+            # seq[a:b]
+            context.i += 1
+            context.begin_block()
+            context.insert_line('w = POP();')
+            context.insert_line('u = POP();')
+            context.insert_line('v = TOP();')
+            context.insert_line('err = __pypperoni_IMPL_get_slice(v, u, w, &x);')
+            context.insert_line('Py_DECREF(v);')
+            context.insert_line('Py_DECREF(u);')
+            context.insert_line('Py_DECREF(w);')
+            context.insert_line('if (err != 0) {')
+            context.insert_line('STACKADJ(-1);')
+            context.insert_handle_error(line, label)
+            context.insert_line('}')
+            context.insert_line('SET_TOP(x);')
+            context.end_block()
+
         elif op == BUILD_SLICE:
             context.begin_block()
 
@@ -614,25 +1181,49 @@ class Module(ModuleBase):
             context.end_block()
 
         elif op == LOAD_ATTR:
-            context.begin_block()
             attr = codeobj.co_names[oparg]
-            context.insert_line('v = TOP();')
-            context.insert_line('x = PyObject_GetAttr(v, %s);' % context.register_const(attr))
-            context.insert_line('if (x == NULL) {')
-            context.insert_handle_error(line, label)
-            context.insert_line('}')
-            context.insert_line('Py_DECREF(v);')
-            context.insert_line('SET_TOP(x);')
+            calli = find_call(context.buf, context.i - 1)
+            context.begin_block()
+
+            if calli is not None:
+                # Method call: look up the function through the type and push
+                # [meth, self] instead of allocating a bound method object.
+                # Otherwise, [NULL, attr] is pushed (see CALL_FUNCTION).
+                context.add_decl_once('unbound', 'int', '0', False)
+                context.method_calls.add(context.buf[calli][IDX_LABEL])
+                context.insert_line('v = TOP();')
+                context.insert_line('x = __pypperoni_IMPL_load_method(v, %s, &unbound);' %
+                                    context.register_const(attr))
+                context.insert_line('if (x == NULL) {')
+                context.insert_handle_error(line, label)
+                context.insert_line('}')
+                context.insert_line('if (unbound) {')
+                context.insert_line('SET_TOP(x);')
+                context.insert_line('PUSH(v);')
+                context.insert_line('}')
+                context.insert_line('else {')
+                context.insert_line('Py_DECREF(v);')
+                context.insert_line('SET_TOP(NULL);')
+                context.insert_line('PUSH(x);')
+                context.insert_line('}')
+
+            else:
+                context.insert_line('v = TOP();')
+                context.insert_line('x = PyObject_GetAttr(v, %s);' % context.register_const(attr))
+                context.insert_line('if (x == NULL) {')
+                context.insert_handle_error(line, label)
+                context.insert_line('}')
+                context.insert_line('Py_DECREF(v);')
+                context.insert_line('SET_TOP(x);')
+
             context.end_block()
 
         elif op == LOAD_GLOBAL:
             context.begin_block()
-            name = codeobj.co_names[oparg]
-            context.insert_line('x = __pypperoni_IMPL_load_global(f, %s);' % context.register_const(name))
+            context.insert_line('x = %s;' % self.__get_load_global_call(codeobj, context, label, oparg))
             context.insert_line('if (x == NULL) {')
             context.insert_handle_error(line, label)
             context.insert_line('}')
-            context.insert_line('Py_INCREF(x);')
             context.insert_line('PUSH(x);')
             context.end_block()
 
@@ -845,6 +1436,10 @@ class Module(ModuleBase):
             context.end_block()
 
         elif op == GET_ITER:
+            if label in context.range_loops:
+                # Nothing to do if the range() call was lowered to a C loop
+                context.insert_line('if (!range_%d_fast)' % context.range_loops[label][0])
+
             context.begin_block()
             context.insert_line('u = TOP();')
             context.insert_line('v = PyObject_GetIter(u);')
@@ -856,9 +1451,36 @@ class Module(ModuleBase):
             context.end_block()
 
         elif op == FOR_ITER:
+            if label in context.range_loops:
+                call, _, _, skip = context.range_loops[label]
+                var = 'range_%d' % call
+                context.insert_line('if (%s_fast)' % var)
+                context.begin_block()
+                context.insert_line('if (%s_n == 0) {' % var)
+                context.insert_line('u = POP();')
+                context.insert_line('Py_DECREF(u);')
+                context.insert_line('goto label_%d;' % (label + oparg + 2))
+                context.insert_line('}')
+                context.insert_line('%s_n--;' % var)
+                if skip is not None:
+                    # The loop variable is never read, don't bind it
+                    context.insert_line('goto label_%d;' % skip)
+
+                else:
+                    context.insert_line('x = PyLong_FromSsize_t(%s_i);' % var)
+                    context.insert_line('if (x == NULL) {')
+                    context.insert_handle_error(line, label)
+                    context.insert_line('}')
+                    context.insert_line('%s_i = (Py_ssize_t)((size_t)%s_i + (size_t)%s_step);' %
+                                        (var, var, var))
+                    context.insert_line('PUSH(x);')
+
+                context.end_block()
+                context.insert_line('else')
+
             context.begin_block()
             context.insert_line('u = TOP();')
-            context.insert_line('x = (*u->ob_type->tp_iternext)(u);')
+            context.insert_line('x = __pypperoni_IMPL_for_iter(u);')
 
             context.insert_line('if (x == NULL)')
             context.begin_block()
@@ -881,6 +1503,26 @@ class Module(ModuleBase):
 
             context.end_block()
 
+        elif op == UNPACK_SEQUENCE and oparg <= MAX_INLINE_UNPACK:
+            context.begin_block()
+            context.insert_line('u = POP();')
+            for check, values in self.__get_unpack_checks('u', oparg):
+                context.insert_line(check)
+                context.begin_block()
+                for value in values:
+                    context.insert_line('x = %s;' % value)
+                    context.insert_line('Py_INCREF(x);')
+                    context.insert_line('PUSH(x);')
+
+                context.insert_line('Py_DECREF(u);')
+                context.end_block()
+
+            context.insert_line('else if (__pypperoni_IMPL_unpack_sequence(u, &stack_pointer, %d) != 0) {' %
+                                oparg)
+            context.insert_handle_error(line, label)
+            context.insert_line('}')
+            context.end_block()
+
         elif op == UNPACK_SEQUENCE:
             context.begin_block()
             context.insert_line('u = POP();')
@@ -899,6 +1541,70 @@ class Module(ModuleBase):
             context.insert_line('}')
             context.end_block()
 
+        elif op == CALL_FUNCTION and label in codeobj.get_inline_comprehensions():
+            _, _, comp = codeobj.get_inline_comprehensions()[label]
+            self.__handle_inline_comprehension(codeobj, context, comp, label)
+
+        elif op == CALL_FUNCTION and label in context.range_loops:
+            # for ... in range(...): if range is still the builtin, the
+            # loop runs on a C counter instead (see GET_ITER and FOR_ITER)
+            # and None is pushed in place of the iterator
+            var = 'range_%d' % label
+            context.add_decl_once(var + '_fast', 'int', '0', False)
+            context.add_decl_once(var + '_i', 'Py_ssize_t', '0', False)
+            context.add_decl_once(var + '_step', 'Py_ssize_t', '0', False)
+            context.add_decl_once(var + '_n', 'size_t', '0', False)
+            context.begin_block()
+            context.insert_line('x = PEEK(%d);' % (oparg + 1))
+            context.insert_line('%s_fast = (x == (PyObject*)&PyRange_Type && '
+                                '__pypperoni_IMPL_range_args(stack_pointer - %d, %d, '
+                                '&%s_i, &%s_step, &%s_n));' % (var, oparg, oparg, var, var, var))
+            context.insert_line('if (%s_fast)' % var)
+            context.begin_block()
+            for _ in range(oparg):
+                context.insert_line('w = POP();')
+                context.insert_line('Py_DECREF(w);')
+
+            context.insert_line('Py_INCREF(Py_None);')
+            context.insert_line('SET_TOP(Py_None);')
+            context.insert_line('Py_DECREF(x);')
+            context.end_block()
+            context.insert_line('else')
+            context.begin_block()
+            context.insert_line('u = __pypperoni_IMPL_call_func(&stack_pointer, %d, NULL);' % oparg)
+            context.insert_line('if (u == NULL) {')
+            context.insert_handle_error(line, label)
+            context.insert_line('}')
+            context.insert_line('PUSH(u);')
+            context.end_block()
+            context.end_block()
+
+        elif op == CALL_FUNCTION and label in context.builtin_calls:
+            # Call the specialized version if the global is still the
+            # builtin (see find_builtin_calls)
+            name = context.builtin_calls[label]
+            args = ['PEEK(%d)' % (oparg - i) for i in range(oparg)]
+            context.begin_block()
+            context.insert_line('x = PEEK(%d);' % (oparg + 1))
+            context.insert_line('if (x == __pypperoni_IMPL_builtins[PYPPERONI_BUILTIN_%s])' % name.upper())
+            context.begin_block()
+            context.insert_line('err = %s;' % self.__get_builtin_call(name, args, 'u'))
+            for _ in range(oparg + 1):
+                context.insert_line('w = POP();')
+                context.insert_line('Py_DECREF(w);')
+
+            context.end_block()
+            context.insert_line('else')
+            context.begin_block()
+            context.insert_line('u = __pypperoni_IMPL_call_func(&stack_pointer, %d, NULL);' % oparg)
+            context.insert_line('err = (u == NULL);')
+            context.end_block()
+            context.insert_line('if (err != 0) {')
+            context.insert_handle_error(line, label)
+            context.insert_line('}')
+            context.insert_line('PUSH(u);')
+            context.end_block()
+
         elif op in (CALL_FUNCTION, CALL_FUNCTION_KW):
             context.begin_block()
 
@@ -908,7 +1614,54 @@ class Module(ModuleBase):
             else:
                 context.insert_line('v = NULL;')
 
-            context.insert_line('u = __pypperoni_IMPL_call_func(&stack_pointer, %d, v);' % oparg)
+            if label in context.method_calls:
+                context.insert_line('if (PEEK(%d) != NULL) /* unbound method */' % (oparg + 2))
+                context.begin_block()
+                context.insert_line('u = __pypperoni_IMPL_call_func(&stack_pointer, %d, v);' % (oparg + 1))
+                context.end_block()
+                context.insert_line('else')
+                context.begin_block()
+                context.insert_line('u = __pypperoni_IMPL_call_func(&stack_pointer, %d, v);' % oparg)
+                context.insert_line('STACKADJ(-1);')
+                context.end_block()
+
+            elif label in codeobj.direct_calls:
+                # Call the generated C function directly if the callee is
+                # still the function we expect (see __find_direct_calls)
+                funcname, exact = codeobj.direct_calls[label]
+                context.add_decl_once('callee', 'PyFrameObject*', 'NULL', False)
+                context.insert_line('x = PEEK(%d);' % (oparg + 1))
+                context.insert_line('if (PyFunction_Check(x) && ((PyCodeObject*)'
+                                    'PyFunction_GET_CODE(x))->co_meth_ptr == &%s)' % funcname)
+                context.begin_block()
+                context.insert_line('u = NULL;')
+                if exact:
+                    context.insert_line('callee = __pypperoni_IMPL_enter_frame(&stack_pointer, %d);' % oparg)
+
+                else:
+                    context.insert_line('callee = __pypperoni_IMPL_bind_frame(&stack_pointer, %d, v, '
+                                        '&%s_bind);' % (oparg, funcname))
+
+                context.insert_line('if (callee != NULL) {')
+                context.insert_line('u = %s(callee);' % funcname)
+                context.insert_line('__pypperoni_IMPL_leave_frame(callee);')
+                context.insert_line('}')
+                if not exact:
+                    # The arguments don't match the signature, let
+                    # call_func report why
+                    context.insert_line('else if (!PyErr_Occurred())')
+                    context.begin_block()
+                    context.insert_line('u = __pypperoni_IMPL_call_func(&stack_pointer, %d, v);' % oparg)
+                    context.end_block()
+
+                context.end_block()
+                context.insert_line('else')
+                context.begin_block()
+                context.insert_line('u = __pypperoni_IMPL_call_func(&stack_pointer, %d, v);' % oparg)
+                context.end_block()
+
+            else:
+                context.insert_line('u = __pypperoni_IMPL_call_func(&stack_pointer, %d, v);' % oparg)
 
             if op == CALL_FUNCTION_KW:
                 context.insert_line('Py_DECREF(v);')
@@ -967,12 +1720,25 @@ class Module(ModuleBase):
             context.insert_line('SET_TOP(x);')
             context.end_block()
 
+        elif op in (BINARY_ADD, INPLACE_ADD) and self.__get_add_store(context):
+            # The reference to v is stolen
+            context.begin_block()
+            context.insert_line('w = POP();')
+            context.insert_line('v = TOP();')
+            context.insert_line('err = %s;' % self.__get_add_call(codeobj, context, op, 'v', 'w'))
+            context.insert_line('Py_DECREF(w);')
+            context.insert_line('if (err != 0) {')
+            context.insert_line('STACKADJ(-1);')
+            context.insert_handle_error(line, label)
+            context.insert_line('}')
+            context.insert_line('SET_TOP(x);')
+            context.end_block()
+
         elif opname[op].startswith('BINARY_'):
-            opstr = opname[op].lower()
             context.begin_block()
             context.insert_line('w = POP();')
             context.insert_line('v = TOP();')
-            context.insert_line('err = __pypperoni_IMPL_%s(v, w, &x);' % opstr)
+            context.insert_line('err = %s;' % self.__get_binary_call(codeobj, context, op, 'v', 'w'))
             context.insert_line('Py_DECREF(v);')
             context.insert_line('Py_DECREF(w);')
             context.insert_line('if (err != 0) {')
@@ -996,22 +1762,43 @@ class Module(ModuleBase):
             context.insert_line('SET_TOP(x);')
             context.end_block()
 
+        elif op == MAKE_FUNCTION and label in codeobj.get_inline_comprehensions():
+            # The comprehension runs inline (see CALL_FUNCTION), so no function
+            # is created. Its closure tuple (or None) is left in its place.
+            context.codeobjs.pop()
+            context.begin_block()
+            context.insert_line('u = POP(); /* qualname */')
+            context.insert_line('Py_DECREF(u);')
+            if not oparg & 0x08:
+                context.insert_line('Py_INCREF(Py_None);')
+                context.insert_line('PUSH(Py_None);')
+
+            context.end_block()
+
         elif op == MAKE_FUNCTION:
             context.add_decl_once('codeobj', 'PyCodeObject*', None, False)
             context.add_decl_once('func', 'PyFunctionObject*', None, False)
             context.begin_block()
 
+            context.insert_line('static PyCodeObject* sitecode = NULL;')
             context.insert_line('u = POP(); /* qualname */')
 
             funccode = context.codeobjs.pop()
-            funccode.co_path = '%s_%d' % (codeobj.get_full_name(), label)
-
+            funcname = self.__get_function_name(codeobj, funccode, label)
+            funccode.direct_funcs = {k: v for k, v in codeobj.direct_funcs.items()
+                                     if k[0] == 'global' or (k[0] == 'deref' and
+                                                              k[1] in funccode.co_freevars)}
+
+            # The code object is created the first time this def runs and
+            # kept in a static slot, so only the function object is
+            # allocated on every execution
+            context.insert_line('if (sitecode == NULL) {')
             context.insert_line('tmp = PyBytes_FromString("");')
             context.insert_line('codeobj = PyCode_New(')
             context.insert_line('  %d, /* argcount */' % funccode.co_argcount)
             context.insert_line('  %d, /* kwonlyargcount */' % funccode.co_kwonlyargcount)
             context.insert_line('  %d, /* nlocals */' % funccode.co_nlocals)
-            context.insert_line('  %d, /* stacksize */' % funccode.co_stacksize)
+            context.insert_line('  %d, /* stacksize */' % funccode.get_stacksize())
             context.insert_line('  %d, /* flags */' % funccode.co_flags)
             context.insert_line('  NULL, /* code */')
             context.insert_line('  NULL, /* consts */')
@@ -1024,12 +1811,20 @@ class Module(ModuleBase):
             context.insert_line('  %d, /* firstlineno */' % funccode.co_firstlineno)
             context.insert_line('  tmp /* lnotab */')
             context.insert_line(');')
+            context.insert_line('Py_XDECREF(tmp);')
             context.insert_line('if (codeobj == NULL) {')
             context.insert_line('Py_DECREF(u);')
             context.insert_handle_error(line, label)
             context.insert_line('}')
+            context.insert_line('codeobj->co_meth_ptr = &%s;' % funcname)
+            if not funccode.co_flags & (CO_GENERATOR | CO_COROUTINE | CO_ASYNC_GENERATOR):
+                context.insert_line('__pypperoni_IMPL_set_binder(codeobj, &%s_bind);' % funcname)
+                self.__gen_binder(context.file, funcname, funccode)
+
+            context.insert_line('sitecode = codeobj;')
+            context.insert_line('}')
             context.insert_line('func = (PyFunctionObject*) PyFunction_NewWithQualName'
-                                '((PyObject*)codeobj, f->f_globals, u);')
+                                '((PyObject*)sitecode, f->f_globals, u);')
             context.insert_line('Py_DECREF(u);')
             context.insert_line('if (func == NULL) {')
             context.insert_handle_error(line, label)
@@ -1047,18 +1842,19 @@ class Module(ModuleBase):
             if oparg & 0x01:
                 context.insert_line('func->func_defaults = POP();')
 
-            funcname = ('_%s_%s__' % (self.name, funccode.get_signature(label)))
-            funcname = funcname.replace('.', '_')
-            funcname = funcname.replace('<', '')
-            funcname = funcname.replace('>', '')
             self.__gen_code(context.file, funcname, context.modules, funccode,
                             context._consts)
 
-            context.insert_line('codeobj->co_meth_ptr = &%s;' % funcname)
-
             context.insert_line('PUSH((PyObject*)func);')
             context.end_block()
 
+        elif op == SETUP_LOOP and label in context.static_loops:
+            # No block needed (see find_static_loops); "break" unwinds
+            # the value stack to the level saved here
+            if context.static_loops[label][2]:
+                context.add_decl_once('loop_%d_sp' % label, 'PyObject**', 'NULL', False)
+                context.insert_line('loop_%d_sp = stack_pointer;' % label)
+
         elif op in (SETUP_LOOP, SETUP_EXCEPT, SETUP_FINALLY):
             context.begin_block()
             context.insert_line('void* __addr;')
@@ -1099,6 +1895,10 @@ class Module(ModuleBase):
             context.insert_yield(line, label + 2)
             context.end_block()
 
+        elif op == RETURN_VALUE and context.inline_exit:
+            context.insert_line('x = POP();')
+            context.insert_line('goto %s;' % context.inline_exit)
+
         elif op == RETURN_VALUE:
             context.begin_block()
             context.insert_line('retval = POP();')
@@ -1106,18 +1906,29 @@ class Module(ModuleBase):
             context.end_block()
 
         elif op == CONTINUE_LOOP:
-            context.begin_block()
-            context.insert_line('void* __addr;')
-            context.insert_get_address(oparg)
-            context.insert_line('retval = PyLong_FromSsize_t((Py_ssize_t)__addr);')
+            # The target label travels as an int from the constants, so
+            # nothing is allocated (see Context.finish)
+            context.continue_targets.add(oparg)
+            context.insert_line('retval = %s;' % context.register_const(oparg))
+            context.insert_line('Py_INCREF(retval);')
             context.insert_line('*why = WHY_CONTINUE; goto fast_block_end;')
-            context.end_block()
+
+        elif op == BREAK_LOOP and label in context.static_loops:
+            setup, end, _ = context.static_loops[label]
+            context.insert_line('while (stack_pointer > loop_%d_sp) {' % setup)
+            context.insert_line('u = POP();')
+            context.insert_line('Py_DECREF(u);')
+            context.insert_line('}')
+            context.insert_line('goto label_%d;' % end)
 
         elif op == BREAK_LOOP:
             context.begin_block()
             context.insert_line('*why = WHY_BREAK; goto fast_block_end;')
             context.end_block()
 
+        elif op == POP_BLOCK and label in context.static_loops:
+            pass
+
         elif op == POP_BLOCK:
             context.add_decl_once('block', 'PyTryBlock*', None, False)
             context.begin_block()
@@ -1330,31 +2141,12 @@ class Module(ModuleBase):
                 context.insert_line('x = NULL; /* fmt_spec */')
 
             context.insert_line('v = POP();')
-
-            conv_fn = {
-                FVC_STR: 'PyObject_Str',
-                FVC_REPR: 'PyObject_Repr',
-                FVC_ASCII: 'PyObject_ASCII'
-            }.get(oparg & FVC_MASK)
-            if conv_fn:
-                context.insert_line('u = %s(v);' % conv_fn)
-                context.insert_line('Py_DECREF(v);')
-                context.insert_line('if (u == NULL) {')
-                context.insert_line('Py_XDECREF(x);')
-                context.insert_handle_error(line, label)
-                context.insert_line('}')
-                context.insert_line('v = u;')
-
-            context.insert_line('if (PyUnicode_CheckExact(v) && x == NULL) u = v;')
-            context.insert_line('else')
-            context.begin_block()
-            context.insert_line('u = PyObject_Format(v, x);')
+            context.insert_line('u = %s;' % self.__get_format_call(codeobj, context, oparg, 'v', 'x'))
             context.insert_line('Py_DECREF(v);')
             context.insert_line('Py_XDECREF(x);')
             context.insert_line('if (u == NULL) {')
             context.insert_handle_error(line, label)
             context.insert_line('}')
-            context.end_block()
             context.insert_line('PUSH(u);')
             context.end_block()
 
@@ -1367,8 +2159,460 @@ class Module(ModuleBase):
                                                      codeobj.get_full_name(),
                                                      label))
 
+    def __get_load_global_call(self, codeobj, context, label, oparg):
+        '''
+        Returns the C call loading global oparg (a new reference), with
+        its own cache at each site.
+        '''
+        cache = 'global_cache_%d' % label
+        context.add_decl_once(cache, 'static __pypperoni_global_cache', '{0, 0, NULL}', False)
+        return '__pypperoni_IMPL_load_global_cached(f, %s, &%s)' % (
+            context.register_const(codeobj.co_names[oparg]), cache)
+
+    def __get_builtin_call(self, name, args, result='x'):
+        '''
+        Returns the C call to the specialized version of builtin name
+        (see BUILTIN_CALLS) with args, setting result.
+        '''
+        args = list(args) + ['NULL'] * (BUILTIN_CALLS[name][1] - len(args))
+        return '__pypperoni_IMPL_builtin_%s(%s, &%s)' % (name, ', '.join(args), result)
+
+    def __get_const_operand(self, codeobj, context):
+        '''
+        Returns (True, value) if the top of the stack is the constant
+        loaded by the instruction preceding the current one, which isn't
+        a jump target. Returns (False, None) otherwise.
+        '''
+        if context.i >= 2 and context.buf[context.i - 1][IDX_LABEL] not in context.block_starts:
+            _, prev, prevarg, _ = context.buf[context.i - 2]
+            if prev == LOAD_CONST:
+                return True, codeobj.co_consts[prevarg]
+
+        return False, None
+
+    def __get_add_store(self, context):
+        '''
+        Returns the STORE_FAST, STORE_DEREF or STORE_NAME following a
+        BINARY_ADD or INPLACE_ADD (as in s += t) if it isn't a block
+        start, or None.
+        '''
+        if context.i < len(context.buf):
+            store = context.buf[context.i]
+            if store[IDX_OP] in (STORE_FAST, STORE_DEREF, STORE_NAME) and \
+               store[IDX_LABEL] not in context.block_starts:
+                return store
+
+        return None
+
+    def __get_add_call(self, codeobj, context, op, v, w):
+        '''
+        Returns the C call implementing op (BINARY_ADD or INPLACE_ADD)
+        on v and w followed by a store (see __get_add_store), setting x.
+        The call steals the reference to v so that a str only held by
+        the stored slot can be resized in place.
+        '''
+        _, store_op, store_arg, _ = self.__get_add_store(context)
+        if store_op == STORE_NAME:
+            return '__pypperoni_IMPL_add_to_name(%s, %s, %s, f->f_locals, %s, &x)' % (
+                v, w, opname[op], context.register_const(codeobj.co_names[store_arg]))
+
+        if store_op == STORE_DEREF:
+            slot = '&PyCell_GET(freevars[%d])' % store_arg
+
+        else:
+            slot = '&fastlocals[%d]' % store_arg
+
+        return '__pypperoni_IMPL_add_to_slot(%s, %s, %s, %s, &x)' % (v, w, opname[op], slot)
+
+    def __get_binary_call(self, codeobj, context, op, v, w):
+        '''
+        Returns the C call implementing BINARY_* or INPLACE_* op on v and
+        w, setting x.
+        '''
+        if op == BINARY_SUBSCR:
+            # Constant index, e.g. t[0] or t[-1]
+            has_const, index = self.__get_const_operand(codeobj, context)
+            if has_const and type(index) is int and -2 ** 30 < index < 2 ** 30:
+                return '__pypperoni_IMPL_subscr_const(%s, %s, %d, &x)' % (v, w, index)
+
+        return '__pypperoni_IMPL_%s(%s, %s, &x)' % (opname[op].lower(), v, w)
+
+    def __get_fused_subscr(self, context):
+        '''
+        Returns True if BUILD_SLICE is followed by a BINARY_SUBSCR that
+        can be generated along with it (it isn't a block start).
+        '''
+        if context.i < len(context.buf):
+            subscr = context.buf[context.i]
+            return subscr[IDX_OP] == BINARY_SUBSCR and subscr[IDX_LABEL] not in context.block_starts
+
+        return False
+
+    def __get_unpack_checks(self, seq, n):
+        '''
+        Yields (condition, items) for the cases in which UNPACK_SEQUENCE n
+        can copy the items of seq directly: an exact tuple or list of size
+        n. items are the C expressions of the items, last item first.
+        '''
+        for kind, cond in (('Tuple', 'if'), ('List', 'else if')):
+            yield ('%s (Py%s_CheckExact(%s) && Py%s_GET_SIZE(%s) == %d)' % (cond, kind, seq, kind, seq, n),
+                   ['Py%s_GET_ITEM(%s, %d)' % (kind, seq, i) for i in reversed(range(n))])
+
+    def __get_fused_jump(self, context):
+        '''
+        Returns the POP_JUMP_IF_TRUE or POP_JUMP_IF_FALSE following the
+        current instruction if both can be generated as a single branch
+        (the jump isn't a block start), or None.
+        '''
+        if context.i < len(context.buf):
+            jump = context.buf[context.i]
+            if jump[IDX_OP] in (POP_JUMP_IF_TRUE, POP_JUMP_IF_FALSE) and \
+               jump[IDX_LABEL] not in context.block_starts:
+                return jump
+
+        return None
+
+    def __insert_fused_jump(self, context, call, operands, negate, line, label):
+        '''
+        Generates the conditional jump following the current instruction,
+        branching on the int set by call (negated if negate is True).
+        operands are released after the call. Consumes the jump.
+        '''
+        _, jump_op, jump_target, _ = self.__get_fused_jump(context)
+        context.i += 1
+
+        context.add_decl_once('result', 'int', None, False)
+        context.insert_line('err = %s;' % call)
+        for operand in operands:
+            context.insert_line('Py_DECREF(%s);' % operand)
+
+        context.insert_line('if (err != 0) {')
+        context.insert_handle_error(line, label)
+        context.insert_line('}')
+        context.insert_line('if (%sresult)' % ('!' if (jump_op == POP_JUMP_IF_FALSE) != negate else ''))
+        context.begin_block()
+        context.insert_line('goto label_%d;' % jump_target)
+        context.end_block()
+
+    def __get_compare_call(self, codeobj, context, oparg, v, w, fused=False):
+        '''
+        Returns the C call implementing COMPARE_OP oparg on v and w for
+        the operands at hand. If fused is True, the call sets result
+        instead of x (see __insert_fused_jump).
+        '''
+        func = '__pypperoni_IMPL_compare'
+        args = [v, w]
+
+        # Right operand, if it's a constant
+        has_const, const = self.__get_const_operand(codeobj, context)
+
+        if oparg in (PyCmp_IS, PyCmp_IS_NOT):
+            func = '__pypperoni_IMPL_compare_is'
+
+        elif oparg == PyCmp_EXC_MATCH:
+            func = '__pypperoni_IMPL_exc_match'
+
+        elif oparg in (PyCmp_EQ, PyCmp_NE):
+            if has_const and any(const is c for c in (None, True, False)):
+                func = '__pypperoni_IMPL_compare_singleton'
+
+        elif oparg in (PyCmp_IN, PyCmp_NOT_IN) and has_const:
+            if isinstance(const, frozenset):
+                func = '__pypperoni_IMPL_in_const'
+                args.append(w)
+
+            elif isinstance(const, tuple) and len(const) > 1 and \
+                 all(type(item) in SET_PROBE_TYPES for item in const):
+                # Precomputed set of the items, loaded with the other consts
+                func = '__pypperoni_IMPL_in_const'
+                args.append(context.register_const(frozenset(const)))
+
+        if fused:
+            return '%s_bool(%s, %d, &result)' % (func, ', '.join(args), oparg)
+
+        return '%s(%s, %d, &x)' % (func, ', '.join(args), oparg)
+
+    def __get_format_call(self, codeobj, context, oparg, value, spec):
+        '''
+        Returns the C call formatting value for FORMAT_VALUE. Constant
+        number specs are parsed here instead of on every call.
+        '''
+        conv = oparg & FVC_MASK
+        if (oparg & FVS_MASK) != FVS_HAVE_SPEC:
+            return '__pypperoni_IMPL_format_value(%s, %d, NULL)' % (value, conv)
+
+        has_const, const = self.__get_const_operand(codeobj, context)
+        if conv == FVC_NONE and has_const and isinstance(const, str):
+            match = NUMBER_SPEC_RE.match(const)
+            if match:
+                zero, width, prec, type = match.groups()
+                if type == 'f' or prec is None:
+                    return '__pypperoni_IMPL_format_number(%s, %s, \'%s\', %d, %d, %d)' % (
+                        value, spec, type, int(width or 0), int(prec or 6), bool(zero))
+
+        return '__pypperoni_IMPL_format_value(%s, %d, %s)' % (value, conv, spec)
+
+    def __handle_inline_comprehension(self, codeobj, context, comp, label):
+        '''
+        Generates the code of a comprehension called at label inline,
+        running it on the current frame. The comprehension's locals live
+        on the value stack, starting with its iterator argument (already
+        on top of the stack); its free variables are read from the
+        closure tuple left by MAKE_FUNCTION.
+        '''
+        make_label = codeobj.get_inline_comprehensions()[label][0]
+        self.__get_function_name(codeobj, comp, make_label)
+        comp.direct_funcs = {k: v for k, v in codeobj.direct_funcs.items()
+                             if k[0] == 'global' or (k[0] == 'deref' and
+                                                      k[1] in comp.co_freevars)}
+
+        buf = tuple(comp.read_code())
+        comp.direct_calls = self.__find_direct_calls(comp, buf)
+        exit = 'inline_%d_end' % label
+
+        context.begin_block()
+        context.insert_line('PyObject** fastlocals = stack_pointer - 1;')
+        if comp.co_freevars:
+            context.insert_line('PyObject** freevars = &PyTuple_GET_ITEM(SECOND(), 0);')
+
+        for _ in range(1, comp.co_nlocals):
+            context.insert_line('PUSH(NULL);')
+
+        state = (context.buf, context.i, context.numeric_runs, context.range_loops,
+                 context.static_loops, context.switch_chains, context.const_literals,
+                 context.builtin_calls, context.block_starts, context._last_label,
+                 context.inline_exit)
+        context.buf = buf
+        context.i = 0
+        context._last_label = -2
+        context.inline_exit = exit
+        self.__prepare_context(comp, context)
+
+        while context.i < len(context.buf):
+            _label, _op, _oparg, _line = context.buf[context.i]
+            context.i += 1
+
+            self.__handle_one_instr(comp, context, _label, _op, _oparg, _line)
+
+        context.spill_registers()
+        (context.buf, context.i, context.numeric_runs, context.range_loops,
+         context.static_loops, context.switch_chains, context.const_literals,
+         context.builtin_calls, context.block_starts, context._last_label,
+         context.inline_exit) = state
+
+        # Drop the comprehension's locals and replace the closure tuple
+        # (or None) with the result
+        context.insert_line('%s:' % exit)
+        context.insert_line('while (stack_pointer > fastlocals) {')
+        context.insert_line('u = POP();')
+        context.insert_line('Py_XDECREF(u);')
+        context.insert_line('}')
+        context.insert_line('u = TOP();')
+        context.insert_line('SET_TOP(x);')
+        context.insert_line('Py_DECREF(u);')
+        context.end_block()
+
+    def __get_function_name(self, codeobj, funccode, label):
+        '''
+        Returns the name of the C function generated for funccode,
+        which is created by the MAKE_FUNCTION at label in codeobj.
+        '''
+        funccode.co_path = '%s_%d' % (codeobj.get_full_name(), label)
+        funcname = ('_%s_%s__' % (self.name, funccode.get_signature(label)))
+        funcname = funcname.replace('.', '_')
+        funcname = funcname.replace('<', '')
+        funcname = funcname.replace('>', '')
+        return funcname
+
+    def __find_direct_calls(self, codeobj, buf):
+        '''
+        Finds the functions defined by codeobj (or inherited from the
+        enclosing code) that are bound to a name right away, and the calls
+        in buf that load one of these names. Returns a dict mapping the
+        label of each such CALL_FUNCTION(_KW) to the C function it's
+        expected to call and whether it passes exactly the positional
+        arguments the function takes (otherwise they go through its
+        binder, see __gen_binder). The binding may change at runtime, so
+        the callee is always checked before calling it directly.
+        '''
+        derefs = codeobj.co_cellvars + codeobj.co_freevars
+        funcs = dict(codeobj.direct_funcs)
+        bound = set()
+
+        for i in range(2, len(buf) - 1):
+            label, op, oparg, _ = buf[i]
+            if op != MAKE_FUNCTION or buf[i - 2][IDX_OP] != LOAD_CONST:
+                continue
+
+            _, storeop, storearg, _ = buf[i + 1]
+            if storeop == STORE_FAST:
+                key = ('fast', storearg)
+
+            elif storeop == STORE_DEREF:
+                key = ('deref', derefs[storearg])
+
+            elif storeop == STORE_GLOBAL or (storeop == STORE_NAME and
+                                             codeobj.co_name == '<module>'):
+                key = ('global', codeobj.co_names[storearg])
+
+            else:
+                continue
+
+            if key in bound:
+                # Bound more than once, we can't tell which one is called
+                funcs.pop(key, None)
+                continue
+
+            bound.add(key)
+            funccode = CodeObject(codeobj.co_consts[buf[i - 2][IDX_OPARG]])
+            if funccode.co_flags & (CO_GENERATOR | CO_COROUTINE | CO_ASYNC_GENERATOR):
+                funcs.pop(key, None)
+                continue
+
+            simple = not (funccode.co_kwonlyargcount or
+                          funccode.co_flags & (CO_VARARGS | CO_VARKEYWORDS))
+            funcs[key] = (self.__get_function_name(codeobj, funccode, label),
+                          funccode.co_argcount, simple)
+
+        codeobj.direct_funcs = funcs
+
+        calls = {}
+        for i, (_, op, oparg, _) in enumerate(buf):
+            if op == LOAD_FAST:
+                key = ('fast', oparg)
+
+            elif op == LOAD_DEREF:
+                key = ('deref', derefs[oparg])
+
+            elif op in (LOAD_GLOBAL, LOAD_NAME):
+                key = ('global', codeobj.co_names[oparg])
+
+            else:
+                continue
+
+            if key not in funcs:
+                continue
+
+            j = find_call(buf, i)
+            if j is None:
+                continue
+
+            funcname, argcount, simple = funcs[key]
+            exact = (simple and buf[j][IDX_OP] == CALL_FUNCTION and
+                     buf[j][IDX_OPARG] == argcount)
+            calls[buf[j][IDX_LABEL]] = (funcname, exact)
+
+        return calls
+
+    def __gen_binder(self, f, name, funccode):
+        '''
+        Writes the argument binder (see __pypperoni_binder) of the C
+        function name generated for funccode. Keywords are matched
+        against the interned parameter names by pointer first.
+        '''
+        argcount = funccode.co_argcount
+        kwcount = argcount + funccode.co_kwonlyargcount
+        varargs = funccode.co_flags & CO_VARARGS
+        varkw = funccode.co_flags & CO_VARKEYWORDS
+        kwdict = kwcount + bool(varargs)
+
+        f.add_common_header('int %s_bind(PyObject* func, PyObject** fastlocals, PyObject** args, '
+                            'Py_ssize_t nargs, PyObject* kwnames);' % name)
+        f.write('int %s_bind(PyObject* func, PyObject** fastlocals, PyObject** args,\n' % name)
+        f.write('    Py_ssize_t nargs, PyObject* kwnames) {\n')
+        f.write('  PyObject** names = &PyTuple_GET_ITEM(((PyCodeObject*)'
+                'PyFunction_GET_CODE(func))->co_varnames, 0);\n')
+        f.write('  PyObject *key, *value, *defs;\n')
+        f.write('  Py_ssize_t i, j, n;\n')
+        f.write('  (void)names; (void)key; (void)defs; (void)j;\n\n')
+
+        # Positional arguments
+        if not varargs:
+            f.write('  if (nargs > %d) return 1;\n' % argcount)
+
+        f.write('  n = (nargs < %d) ? nargs : %d;\n' % (argcount, argcount))
+        f.write('  for (i = 0; i < n; i++) {\n')
+        f.write('    Py_INCREF(args[i]);\n')
+        f.write('    fastlocals[i] = args[i];\n')
+        f.write('  }\n')
+
+        if varargs:
+            f.write('  value = PyTuple_New(nargs - n);\n')
+            f.write('  if (value == NULL) return -1;\n')
+            f.write('  for (i = n; i < nargs; i++) {\n')
+            f.write('    Py_INCREF(args[i]);\n')
+            f.write('    PyTuple_SET_ITEM(value, i - n, args[i]);\n')
+            f.write('  }\n')
+            f.write('  fastlocals[%d] = value;\n' % kwcount)
+
+        if varkw:
+            f.write('  value = PyDict_New();\n')
+            f.write('  if (value == NULL) return -1;\n')
+            f.write('  fastlocals[%d] = value;\n' % kwdict)
+
+        # Keyword arguments
+        f.write('  if (kwnames != NULL) {\n')
+        if not kwcount and not varkw:
+            f.write('    return 1;\n')
+
+        else:
+            f.write('    for (i = 0; i < PyTuple_GET_SIZE(kwnames); i++) {\n')
+            f.write('      key = PyTuple_GET_ITEM(kwnames, i);\n')
+            f.write('      value = args[nargs + i];\n')
+            for j in range(kwcount):
+                f.write('      %sif (key == names[%d]) j = %d;\n' % ('else ' if j else '', j, j))
+
+            f.write('      %sj = __pypperoni_IMPL_find_keyword(key, names, %d);\n' %
+                    ('else ' if kwcount else '', kwcount))
+            f.write('      if (j == -2) return -1;\n')
+            if varkw:
+                f.write('      if (j == -1) {\n')
+                f.write('        if (PyDict_SetItem(fastlocals[%d], key, value) != 0) return -1;\n' % kwdict)
+                f.write('        continue;\n')
+                f.write('      }\n')
+
+            else:
+                f.write('      if (j == -1) return 1;\n')
+
+            f.write('      if (fastlocals[j] != NULL) return 1;\n')
+            f.write('      Py_INCREF(value);\n')
+            f.write('      fastlocals[j] = value;\n')
+            f.write('    }\n')
+
+        f.write('  }\n')
+
+        # Defaults are read from the function, they can be reassigned
+        if argcount:
+            f.write('  if (nargs < %d) {\n' % argcount)
+            f.write('    defs = PyFunction_GET_DEFAULTS(func);\n')
+            f.write('    n = %d - ((defs == NULL) ? 0 : PyTuple_GET_SIZE(defs));\n' % argcount)
+            f.write('    for (i = nargs; i < %d; i++) {\n' % argcount)
+            f.write('      if (fastlocals[i] == NULL) {\n')
+            f.write('        if (i < n) return 1;\n')
+            f.write('        value = PyTuple_GET_ITEM(defs, i - n);\n')
+            f.write('        Py_INCREF(value);\n')
+            f.write('        fastlocals[i] = value;\n')
+            f.write('      }\n')
+            f.write('    }\n')
+            f.write('  }\n')
+
+        if kwcount > argcount:
+            f.write('  for (i = %d; i < %d; i++) {\n' % (argcount, kwcount))
+            f.write('    if (fastlocals[i] == NULL) {\n')
+            f.write('      defs = PyFunction_GET_KW_DEFAULTS(func);\n')
+            f.write('      value = (defs == NULL) ? NULL : PyDict_GetItem(defs, names[i]);\n')
+            f.write('      if (value == NULL) return 1;\n')
+            f.write('      Py_INCREF(value);\n')
+            f.write('      fastlocals[i] = value;\n')
+            f.write('    }\n')
+            f.write('  }\n')
+
+        f.write('  return 0;\n')
+        f.write('}\n\n')
+
     def __gen_code(self, f, name, modules, codeobj, consts, flushconsts=False):
         buf = list(codeobj.read_code())
+        codeobj.direct_calls = self.__find_direct_calls(codeobj, buf)
         chunki = 0
         chunks = list(self.__split_buf(buf, codeobj))
 
@@ -1384,7 +2628,70 @@ class Module(ModuleBase):
         if flushconsts:
             context.flushconsts()
 
-    def __handle_chunk(self, chunk, f, chunkname, modules, codeobj, consts, codeobjs):
+    def __prepare_context(self, codeobj, context):
+        '''
+        Analyzes context.buf and sets up the state handle_op and
+        handle_register_op rely on.
+        '''
+        context.numeric_runs = find_numeric_runs(codeobj, context.buf,
+                                                 codeobj.get_local_types())
+        context.use_registers = REGISTER_CODEGEN
+        context.range_loops = {}
+        is_gen = codeobj.co_flags & (CO_GENERATOR | CO_COROUTINE | CO_ASYNC_GENERATOR)
+        if not is_gen:
+            # The loop counters are C locals, so they can't be used
+            # across yields
+            for loop in find_range_loops(codeobj, context.buf):
+                for label in loop[:3]:
+                    context.range_loops[label] = loop
+
+        # Same goes for the stack level saved for "break"
+        context.static_loops = find_static_loops(context.buf, allow_breaks=not is_gen)
+        context.block_starts = get_jump_targets(context.buf)
+        for label, op, _, _ in context.buf:
+            # Generators resume here (see insert_yield calls)
+            if op == YIELD_FROM:
+                context.block_starts.add(label)
+
+            elif op == YIELD_VALUE:
+                context.block_starts.add(label + 2)
+
+        for label, run in context.numeric_runs.items():
+            context.block_starts.add(label)
+            context.block_starts.add(run.get_exit_label(context.buf))
+
+        for _, _, _, skip in context.range_loops.values():
+            if skip is not None:
+                context.block_starts.add(skip)
+
+        context.builtin_calls = {label: name for label, name in
+                                 find_builtin_calls(codeobj, context.buf, BUILTIN_CALLS).items()
+                                 if label not in codeobj.direct_calls}
+
+        context.switch_chains = {}
+        for label, chain in find_switch_chains(codeobj, context.buf, SET_PROBE_TYPES).items():
+            if label in context.numeric_runs:
+                continue
+
+            # The dispatch jumps straight into the bodies
+            context.switch_chains[label] = chain
+            context.block_starts.add(label)
+            for _, body in chain[1]:
+                context.block_starts.add(body)
+
+        context.const_literals = {}
+        index = {label: i for i, (label, _, _, _) in enumerate(context.buf)}
+        for label, literal in find_const_literals(codeobj, context.buf).items():
+            if label in context.numeric_runs or label in context.switch_chains:
+                continue
+
+            # The instructions after the first one are skipped
+            inner = context.buf[index[label] + 1:index[literal[0]] + 1]
+            if not any(instr[IDX_LABEL] in context.block_starts for instr in inner):
+                context.const_literals[label] = literal
+
+    def __handle_chunk(self, chunk, f, chunkname, modules, codeobj, consts, codeobjs,
+                       resume_base=0):
         '''
         Handles a single chunk of code and returns a Context object.
         '''
@@ -1393,15 +2700,18 @@ class Module(ModuleBase):
                                    codeobj.co_nlocals)
         context._consts = consts
         context.codeobjs = codeobjs
+        context.resume_base = resume_base
 
         context.buf = tuple(chunk)
         context.i = 0
+        self.__prepare_context(codeobj, context)
         while context.i < len(context.buf):
             label, op, oparg, line = context.buf[context.i]
             context.i += 1
 
             self.__handle_one_instr(codeobj, context, label, op, oparg, line)
 
+        context.spill_registers()
         return context
 
     def __handle_chunks(self, chunks, f, name, modules, codeobj, consts):
@@ -1410,25 +2720,44 @@ class Module(ModuleBase):
         '''
         codeobjs = []
         chunki = 0
+        resume_chunks = []
         for chunk in chunks:
             chunki += 1
             chunkname = '%s_%d' % (name, chunki)
             context = self.__handle_chunk(chunk, f, chunkname, modules,
-                                          codeobj, consts, codeobjs)
+                                          codeobj, consts, codeobjs,
+                                          len(resume_chunks))
             context.finish(True)
             codeobjs = context.codeobjs
+            resume_chunks.extend([chunki] * len(context.resume_labels))
 
         f.write('\nPyObject* %s(PyFrameObject* f) {\n' % name)
         f.write('  PyObject* retval = NULL;\n')
         f.write('  int why;\n\n')
         f.write('  __%s_load_consts();\n' % f.uid)
+
+        # Generators: resume in the chunk that yielded (see Context.insert_yield)
+        resumed = sorted(set(resume_chunks) - {1})
+        if resumed:
+            f.write('  if (f->f_lasti != -1) {\n')
+            f.write('    static const int resume_chunks[] = {%s};\n' %
+                    ', '.join(map(str, resume_chunks)))
+            f.write('    switch (resume_chunks[-2 - f->f_lasti]) {\n')
+            for i in resumed:
+                f.write('      case %d: goto chunk_%d;\n' % (i, i))
+            f.write('    }\n')
+            f.write('  }\n')
+
         for i in range(1, chunki + 1):
             chunkname = '%s_%d' % (name, i)
+            if i in resumed:
+                f.write('  chunk_%d:\n' % i)
+
             f.write('  {\n')
             f.write('    retval = %s(f, &why);\n' % chunkname)
             f.write('    if (why == WHY_EXCEPTION) goto error;\n')
             f.write('    else if (why == WHY_YIELD) goto end;\n')
-            f.write('    else if (retval != NULL) goto clear_stack;\n')
+            f.write('    else if (why == WHY_RETURN) goto clear_stack;\n')
             f.write('  }\n')
         f.write('  goto clear_stack;\n')
         f.write('  error:\n')
@@ -1452,13 +2781,9 @@ class Module(ModuleBase):
         return Context(f, name, modules, flags, nlocals)
 
     def __split_buf(self, buf, codeobj):
-        if codeobj.co_flags & CO_GENERATOR:
-            # No splitting generators
-            yield buf
-            return
-
         split_interval = SPLIT_INTERVAL
         yield_at = split_interval
+        literals = find_const_literals(codeobj, buf)
         _cur = []
 
         for i, instr in enumerate(buf):
@@ -1468,6 +2793,10 @@ class Module(ModuleBase):
                 yield_at = instr[IDX_LABEL] + split_interval
 
             _cur.append(instr)
+            if instr[IDX_LABEL] in literals:
+                # Keep constant displays whole so they can be folded
+                yield_at = max(yield_at, literals[instr[IDX_LABEL]][0] + 2)
+
             if instr[IDX_OP] in hasjrel:
                 yield_at = max(yield_at, instr[IDX_LABEL] + instr[IDX_OPARG] + 4)
 
@@ -1495,7 +2824,7 @@ class Module(ModuleBase):
         self.__gen_code(f, modname, modules, self.code, [], True)
 
     def get_code(self):
-        return CodeObject(compile(self.astmod, self.name, 'exec', optimize=2))
+        return CodeObject(compile(optimize_ast(self.astmod), self.name, 'exec', optimize=2))
 
     def __handle_import(self, codeobj, context, level):
         # Get fromlist
@@ -1781,7 +3110,7 @@ def write_modules_file(f, modules):
             modname = '_%s_MODULE__' % module.name.replace('.', '_')
             f.write('PyObject* %s(PyFrameObject* f); /* fwd decl */\n' % modname)
             s += '  m->ptr = %s;\n' % modname
-            s += '  m->stacksize = %d;\n' % module.code.co_stacksize
+            s += '  m->stacksize = %d;\n' % module.code.get_stacksize()
             s += '  m->nlocals = %d;\n' % module.code.co_nlocals
 
         s += '  m->obj = NULL;\n'
@@ -61,6 +61,25 @@ PyObject* __pypperoni_IMPL_load_name(PyFrameObject* f, PyObject* name)
     return x;
 }
 
+PyObject* __pypperoni_IMPL_builtins[PYPPERONI_BUILTIN_COUNT];
+
+void __pypperoni_IMPL_init_builtins(void)
+{
+    /* Same order as the PYPPERONI_BUILTIN_* constants */
+    static const char* names[PYPPERONI_BUILTIN_COUNT] = {
+        "abs", "getattr", "hasattr", "isinstance", "len", "max", "min", "type"
+    };
+    PyObject* builtins = PyEval_GetBuiltins();
+    int i;
+
+    for (i = 0; i < PYPPERONI_BUILTIN_COUNT; i++)
+    {
+        /* Left NULL if missing, so calls are never specialized */
+        __pypperoni_IMPL_builtins[i] = PyDict_GetItemString(builtins, names[i]);
+        Py_XINCREF(__pypperoni_IMPL_builtins[i]);
+    }
+}
+
 PyObject* __pypperoni_IMPL_load_global(PyFrameObject* f, PyObject* name)
 {
     PyObject *v;
@@ -106,7 +125,7 @@ PyObject* __pypperoni_IMPL_load_global(PyFrameObject* f, PyObject* name)
 #define CANNOT_CATCH_MSG "catching classes that do not inherit from "\
                          "BaseException is not allowed"
 
-int __pypperoni_IMPL_compare(PyObject* v, PyObject* w, int op, PyObject** result)
+int __pypperoni_IMPL_compare_generic(PyObject* v, PyObject* w, int op, PyObject** result)
 {
     int res = 0;
     switch (op) {
@@ -277,7 +296,6 @@ int __pypperoni_IMPL_unpack_sequence(PyObject* seq, PyObject*** sp, int num)
     else
     {
         /* unpack_iterable() raised an exception */
-        Py_DECREF(seq);
         res = 1;
     }
 
@@ -552,6 +570,255 @@ too_many_positional(PyCodeObject *co, Py_ssize_t given, Py_ssize_t defcount,
     Py_DECREF(kwonly_sig);
 }
 
+/* Frame cache: frames of optimized code objects that didn't escape
+   (no traceback, generator or sys._getframe() reference left) are kept
+   in a small per-code free-list stored in co_extra, so that hot and
+   recursive functions don't allocate a new frame on every call.
+   Cached frames are untracked and hold no references; the cache owns
+   their only reference. */
+#define FRAME_CACHE_SIZE 16
+
+typedef struct {
+    int numfree;
+    PyFrameObject* frames[FRAME_CACHE_SIZE];
+} frame_cache;
+
+static Py_ssize_t frame_cache_index = -2;
+
+static void
+frame_cache_free(void* ptr)
+{
+    frame_cache* cache = (frame_cache*)ptr;
+    while (cache->numfree > 0)
+        PyObject_GC_Del(cache->frames[--cache->numfree]);
+
+    PyMem_Free(cache);
+}
+
+static frame_cache*
+get_frame_cache(PyCodeObject* co, int create)
+{
+    void* cache = NULL;
+
+    if (frame_cache_index == -2) {
+        frame_cache_index = _PyEval_RequestCodeExtraIndex(frame_cache_free);
+        if (frame_cache_index < 0)
+            PyErr_Clear();
+    }
+
+    if (frame_cache_index < 0)
+        return NULL;
+
+    if (_PyCode_GetExtra((PyObject*)co, frame_cache_index, &cache) < 0) {
+        PyErr_Clear();
+        return NULL;
+    }
+
+    if (cache == NULL && create) {
+        cache = PyMem_Malloc(sizeof(frame_cache));
+        if (cache == NULL)
+            return NULL;
+
+        ((frame_cache*)cache)->numfree = 0;
+        if (_PyCode_SetExtra((PyObject*)co, frame_cache_index, cache) < 0) {
+            PyErr_Clear();
+            PyMem_Free(cache);
+            return NULL;
+        }
+    }
+
+    return (frame_cache*)cache;
+}
+
+/* Argument binders (see __pypperoni_binder) are stored in co_extra
+   too, set once when the code object of a compiled function is created */
+static Py_ssize_t binder_index = -2;
+
+static __pypperoni_binder
+get_binder(PyCodeObject* co)
+{
+    void* bind = NULL;
+
+    if (binder_index < 0)
+        return NULL;
+
+    if (_PyCode_GetExtra((PyObject*)co, binder_index, &bind) < 0) {
+        PyErr_Clear();
+        return NULL;
+    }
+
+    return (__pypperoni_binder)bind;
+}
+
+void __pypperoni_IMPL_set_binder(PyCodeObject* co, __pypperoni_binder bind)
+{
+    /* If this fails, calls to co just use the generic argument parsing */
+    if (binder_index == -2) {
+        binder_index = _PyEval_RequestCodeExtraIndex(NULL);
+        if (binder_index < 0)
+            PyErr_Clear();
+    }
+
+    if (binder_index < 0)
+        return;
+
+    if (_PyCode_SetExtra((PyObject*)co, binder_index, (void*)bind) < 0)
+        PyErr_Clear();
+}
+
+Py_ssize_t __pypperoni_IMPL_find_keyword(PyObject* key, PyObject** names, Py_ssize_t count)
+{
+    /* Slow path of the keyword lookup in binders, for keys that aren't
+       the interned parameter names. Returns the index of key in names,
+       -1 if it's not there or -2 on error. */
+    Py_ssize_t i;
+    int cmp;
+
+    for (i = 0; i < count; i++) {
+        cmp = PyObject_RichCompareBool(key, names[i], Py_EQ);
+        if (cmp > 0)
+            return i;
+
+        else if (cmp < 0)
+            return -2;
+    }
+
+    return -1;
+}
+
+static PyFrameObject*
+new_frame(PyThreadState* tstate, PyCodeObject* co, PyObject* globals,
+          PyObject* locals)
+{
+    /* Like PyFrame_New, but reuses a cached frame if possible */
+    PyFrameObject* back = tstate->frame;
+    PyFrameObject* f;
+    frame_cache* cache;
+
+    if (locals != NULL || back == NULL || back->f_globals != globals ||
+        (co->co_flags & (CO_NEWLOCALS | CO_OPTIMIZED)) != (CO_NEWLOCALS | CO_OPTIMIZED))
+        return PyFrame_New(tstate, co, globals, locals);
+
+    cache = get_frame_cache(co, 0);
+    if (cache == NULL || cache->numfree == 0)
+        return PyFrame_New(tstate, co, globals, locals);
+
+    f = cache->frames[--cache->numfree];
+    assert(f->f_code == co);
+
+    Py_INCREF(back);
+    f->f_back = back;
+    Py_INCREF(co);
+    Py_INCREF(back->f_builtins);
+    f->f_builtins = back->f_builtins;
+    Py_INCREF(globals);
+    f->f_globals = globals;
+    f->f_stacktop = f->f_valuestack;
+    f->f_lasti = -1;
+    f->f_lineno = co->co_firstlineno;
+    f->f_iblock = 0;
+    f->f_executing = 0;
+    f->f_gen = NULL;
+
+    PyObject_GC_Track(f);
+    return f;
+}
+
+static void
+release_frame(PyThreadState* tstate, PyFrameObject* f)
+{
+    /* Releases the caller's reference to f, caching it if unused */
+    PyCodeObject* co = f->f_code;
+    frame_cache* cache;
+    PyObject** p;
+
+    ++tstate->recursion_depth;
+
+    if (Py_REFCNT(f) != 1 || f->f_gen != NULL || f->f_locals != NULL ||
+        (co->co_flags & (CO_NEWLOCALS | CO_OPTIMIZED)) != (CO_NEWLOCALS | CO_OPTIMIZED) ||
+        (cache = get_frame_cache(co, 1)) == NULL || cache->numfree == FRAME_CACHE_SIZE) {
+        Py_DECREF(f);
+        --tstate->recursion_depth;
+        return;
+    }
+
+    /* Clear the frame the same way frame_dealloc does */
+    PyObject_GC_UnTrack(f);
+    for (p = f->f_localsplus; p < f->f_valuestack; p++)
+        Py_CLEAR(*p);
+
+    if (f->f_stacktop != NULL) {
+        for (p = f->f_valuestack; p < f->f_stacktop; p++)
+            Py_XDECREF(*p);
+
+        f->f_stacktop = NULL;
+    }
+
+    Py_CLEAR(f->f_back);
+    Py_CLEAR(f->f_builtins);
+    Py_CLEAR(f->f_globals);
+    Py_CLEAR(f->f_trace);
+    Py_CLEAR(f->f_exc_type);
+    Py_CLEAR(f->f_exc_value);
+    Py_CLEAR(f->f_exc_traceback);
+
+    /* The cache may have been filled by a __del__ method called
+       while clearing the frame */
+    cache = get_frame_cache(co, 0);
+    if (cache != NULL && cache->numfree < FRAME_CACHE_SIZE)
+        cache->frames[cache->numfree++] = f;
+
+    else
+        PyObject_GC_Del(f);
+
+    Py_DECREF(co);
+    --tstate->recursion_depth;
+}
+
+void __pypperoni_IMPL_free_frame(PyFrameObject* f)
+{
+    release_frame(PyThreadState_GET(), f);
+}
+
+static int
+init_cells(PyFrameObject* f, PyCodeObject* co, PyObject* closure)
+{
+    /* Allocates the cell vars of f and copies its free vars from closure
+       once the arguments are bound (see _PyEval_EvalCodeWithName) */
+    PyObject **fastlocals = f->f_localsplus;
+    PyObject **freevars = fastlocals + co->co_nlocals;
+    Py_ssize_t i, ncells, nfrees;
+
+    ncells = PyTuple_GET_SIZE(co->co_cellvars);
+    nfrees = PyTuple_GET_SIZE(co->co_freevars);
+    for (i = 0; i < ncells; i++) {
+        PyObject *c;
+        Py_ssize_t arg;
+
+        if (co->co_cell2arg != NULL &&
+            (arg = co->co_cell2arg[i]) != CO_CELL_NOT_AN_ARG) {
+            c = PyCell_New(fastlocals[arg]);
+            Py_CLEAR(fastlocals[arg]);
+        }
+        else {
+            c = PyCell_New(NULL);
+        }
+
+        if (c == NULL)
+            return -1;
+
+        freevars[i] = c;
+    }
+
+    for (i = 0; i < nfrees; i++) {
+        PyObject *o = PyTuple_GET_ITEM(closure, i);
+        Py_INCREF(o);
+        freevars[ncells + i] = o;
+    }
+
+    return 0;
+}
+
 static PyObject*
 _PyFunction_FastCall(PyCodeObject *co, PyObject **args, Py_ssize_t nargs,
                      PyObject *globals)
@@ -568,7 +835,7 @@ _PyFunction_FastCall(PyCodeObject *co, PyObject **args, Py_ssize_t nargs,
        take builtins without sanity checking them.
        */
     assert(tstate != NULL);
-    f = PyFrame_New(tstate, co, globals, NULL);
+    f = new_frame(tstate, co, globals, NULL);
     if (f == NULL) {
         return NULL;
     }
@@ -581,9 +848,7 @@ _PyFunction_FastCall(PyCodeObject *co, PyObject **args, Py_ssize_t nargs,
     }
     result = PyEval_EvalFrameEx(f,0);
 
-    ++tstate->recursion_depth;
-    Py_DECREF(f);
-    --tstate->recursion_depth;
+    release_frame(tstate, f);
 
     return result;
 }
@@ -616,7 +881,7 @@ _PyEval_EvalCodeWithName(PyObject *_co, PyObject *globals, PyObject *locals,
     /* Create the frame */
     tstate = PyThreadState_GET();
     assert(tstate != NULL);
-    f = PyFrame_New(tstate, co, globals, locals);
+    f = new_frame(tstate, co, globals, locals);
     if (f == NULL) {
         return NULL;
     }
@@ -861,9 +1126,7 @@ fail: /* Jump here from prelude on failure */
        so recursion_depth must be boosted for the duration.
     */
     assert(tstate != NULL);
-    ++tstate->recursion_depth;
-    Py_DECREF(f);
-    --tstate->recursion_depth;
+    release_frame(tstate, f);
     return retval;
 }
 
@@ -878,6 +1141,7 @@ fast_function(PyObject *func, PyObject **stack,
     PyObject **d;
     Py_ssize_t nkwargs = (kwnames == NULL) ? 0 : PyTuple_GET_SIZE(kwnames);
     Py_ssize_t nd;
+    __pypperoni_binder bind;
 
     assert(PyFunction_Check(func));
     assert(nargs >= 0);
@@ -901,6 +1165,34 @@ fast_function(PyObject *func, PyObject **stack,
         }
     }
 
+    bind = get_binder(co);
+    if (bind != NULL) {
+        /* Compiled function: bind the arguments with its own binder */
+        PyThreadState *tstate = PyThreadState_GET();
+        PyFrameObject *f = new_frame(tstate, co, globals, NULL);
+        PyObject *result;
+        int err;
+
+        if (f == NULL)
+            return NULL;
+
+        err = bind(func, f->f_localsplus, stack, nargs, kwnames);
+        if (err == 0)
+            err = init_cells(f, co, PyFunction_GET_CLOSURE(func));
+
+        if (err == 0) {
+            result = PyEval_EvalFrameEx(f, 0);
+            release_frame(tstate, f);
+            return result;
+        }
+
+        release_frame(tstate, f);
+        if (err < 0)
+            return NULL;
+
+        /* The arguments don't match, let the code below report why */
+    }
+
     kwdefs = PyFunction_GET_KW_DEFAULTS(func);
     closure = PyFunction_GET_CLOSURE(func);
     name = ((PyFunctionObject *)func) -> func_name;
@@ -979,6 +1271,383 @@ PyObject* __pypperoni_IMPL_call_func(PyObject*** sp, int oparg, PyObject* kwargs
     return x;
 }
 
+PyFrameObject* __pypperoni_IMPL_enter_frame(PyObject*** sp, int oparg)
+{
+    /* Sets up the frame for a direct call to the generated code of a
+       function that takes exactly oparg positional arguments and isn't
+       a generator (see Module.handle_op), and makes it the current frame.
+       Pops the function and its arguments. Returns NULL on error;
+       otherwise the caller must pass the frame to
+       __pypperoni_IMPL_leave_frame after calling the function. */
+    PyObject **pfunc = (*sp) - oparg - 1;
+    PyObject *func = *pfunc;
+    PyCodeObject *co = (PyCodeObject *)PyFunction_GET_CODE(func);
+    PyThreadState *tstate = PyThreadState_GET();
+    PyObject **fastlocals;
+    PyFrameObject *f;
+    Py_ssize_t i;
+    PyObject *w;
+
+    f = new_frame(tstate, co, PyFunction_GET_GLOBALS(func), NULL);
+    if (f == NULL)
+        goto end;
+
+    /* Steal the arguments from the stack */
+    fastlocals = f->f_localsplus;
+    for (i = 0; i < oparg; i++)
+        fastlocals[i] = pfunc[i + 1];
+
+    *sp = pfunc + 1;
+
+    if (init_cells(f, co, PyFunction_GET_CLOSURE(func)) != 0 ||
+        Py_EnterRecursiveCall("")) {
+        release_frame(tstate, f);
+        f = NULL;
+        goto end;
+    }
+
+    tstate->frame = f;
+
+end:
+    while ((*sp) > pfunc) {
+        w = *--(*sp);
+        Py_DECREF(w);
+    }
+
+    return f;
+}
+
+PyFrameObject* __pypperoni_IMPL_bind_frame(PyObject*** sp, int oparg, PyObject* kwnames,
+                                           __pypperoni_binder bind)
+{
+    /* Same as __pypperoni_IMPL_enter_frame, but for any call to the
+       function: the arguments (oparg including the kwnames ones) are
+       bound by bind. If they don't match its signature, returns NULL
+       without an exception set and leaves the stack alone, so the caller
+       can fall back to __pypperoni_IMPL_call_func. */
+    PyObject **pfunc = (*sp) - oparg - 1;
+    PyObject *func = *pfunc;
+    PyCodeObject *co = (PyCodeObject *)PyFunction_GET_CODE(func);
+    PyThreadState *tstate = PyThreadState_GET();
+    Py_ssize_t nkwargs = (kwnames == NULL) ? 0 : PyTuple_GET_SIZE(kwnames);
+    PyFrameObject *f;
+    PyObject *w;
+    int err;
+
+    f = new_frame(tstate, co, PyFunction_GET_GLOBALS(func), NULL);
+    if (f == NULL)
+        goto end;
+
+    err = bind(func, f->f_localsplus, pfunc + 1, oparg - nkwargs, kwnames);
+    if (err == 0 && init_cells(f, co, PyFunction_GET_CLOSURE(func)) == 0 &&
+        !Py_EnterRecursiveCall("")) {
+        tstate->frame = f;
+        goto end;
+    }
+
+    release_frame(tstate, f);
+    f = NULL;
+    if (err > 0)
+        return NULL;
+
+end:
+    while ((*sp) > pfunc) {
+        w = *--(*sp);
+        Py_DECREF(w);
+    }
+
+    return f;
+}
+
+/* See dictiterobject in Objects/dictobject.c */
+typedef struct {
+    PyObject_HEAD
+    PyDictObject *di_dict; /* Set to NULL when iterator is exhausted */
+    Py_ssize_t di_used;
+    Py_ssize_t di_pos;
+    PyObject* di_result; /* reusable result tuple for iteritems */
+    Py_ssize_t len;
+} dictiterobject;
+
+PyObject* __pypperoni_IMPL_dict_iter_next(PyObject* it)
+{
+    /* tp_iternext of the dict keys, values and items iterators */
+    dictiterobject *di = (dictiterobject *)it;
+    PyDictObject *d = di->di_dict;
+    PyObject *key, *value, *result;
+
+    if (d == NULL)
+        return NULL;
+
+    if (di->di_used != d->ma_used) {
+        PyErr_SetString(PyExc_RuntimeError,
+                        "dictionary changed size during iteration");
+        di->di_used = -1; /* Make this state sticky */
+        return NULL;
+    }
+
+    if (!PyDict_Next((PyObject *)d, &di->di_pos, &key, &value)) {
+        di->di_dict = NULL;
+        Py_DECREF(d);
+        return NULL;
+    }
+
+    di->len--;
+
+    if (Py_TYPE(it) == &PyDictIterKey_Type) {
+        Py_INCREF(key);
+        return key;
+    }
+
+    if (Py_TYPE(it) == &PyDictIterValue_Type) {
+        Py_INCREF(value);
+        return value;
+    }
+
+    Py_INCREF(key);
+    Py_INCREF(value);
+    result = di->di_result;
+    if (result != NULL && Py_REFCNT(result) == 1) {
+        /* Reuse the result tuple, like dictiter_iternextitem */
+        Py_INCREF(result);
+        Py_DECREF(PyTuple_GET_ITEM(result, 0));
+        Py_DECREF(PyTuple_GET_ITEM(result, 1));
+    }
+    else {
+        result = PyTuple_New(2);
+        if (result == NULL) {
+            Py_DECREF(key);
+            Py_DECREF(value);
+            return NULL;
+        }
+    }
+
+    PyTuple_SET_ITEM(result, 0, key);
+    PyTuple_SET_ITEM(result, 1, value);
+    return result;
+}
+
+static PyObject* pad_number(const char* digits, Py_ssize_t len, int width, int zero)
+{
+    /* Right-aligns the ASCII number digits to width, padding with
+       zeros after the sign if zero is set, with spaces otherwise */
+    Py_ssize_t pad = (width > len) ? width - len : 0;
+    PyObject* result = PyUnicode_New(len + pad, 127);
+    char* out;
+
+    if (result == NULL)
+        return NULL;
+
+    out = (char*)PyUnicode_1BYTE_DATA(result);
+    if (zero && pad && digits[0] == '-') {
+        *out++ = '-';
+        digits++;
+        len--;
+    }
+
+    memset(out, zero ? '0' : ' ', pad);
+    memcpy(out + pad, digits, len);
+    return result;
+}
+
+PyObject* __pypperoni_IMPL_format_number(PyObject* v, PyObject* spec, char type,
+                                         int width, int prec, int zero)
+{
+    /* format(v, spec) for a constant spec like "05d" or ".2f", already
+       parsed into type, width, prec and the zero flag. Values other
+       than exact ints (for "d") and exact floats (for "f") go through
+       PyObject_Format. */
+    PyObject* result;
+    char* buf;
+    Py_ssize_t len;
+
+    if (type == 'f' && PyFloat_CheckExact(v)) {
+        buf = PyOS_double_to_string(PyFloat_AS_DOUBLE(v), 'f', prec, 0, NULL);
+        if (buf == NULL)
+            return PyErr_NoMemory();
+
+        result = pad_number(buf, strlen(buf), width, zero);
+        PyMem_Free(buf);
+        return result;
+    }
+
+    if (type == 'd' && PyLong_CheckExact(v)) {
+        PyObject* str = PyLong_Type.tp_str(v);
+        if (str == NULL)
+            return NULL;
+
+        if (PyUnicode_GET_LENGTH(str) >= width)
+            return str;
+
+        buf = PyUnicode_AsUTF8AndSize(str, &len);
+        result = (buf == NULL) ? NULL : pad_number(buf, len, width, zero);
+        Py_DECREF(str);
+        return result;
+    }
+
+    return PyObject_Format(v, spec);
+}
+
+PyObject* __pypperoni_IMPL_build_string(PyObject** items, int n)
+{
+    /* Concatenates the n strings at items (BUILD_STRING), computing the
+       size of the result first. Steals the references to items. */
+    PyObject* result = NULL;
+    Py_ssize_t len = 0, pos = 0;
+    Py_UCS4 maxchar = 0;
+    int i;
+
+    for (i = 0; i < n; i++) {
+        if (PyUnicode_READY(items[i]) < 0)
+            goto end;
+
+        if (PyUnicode_GET_LENGTH(items[i]) > PY_SSIZE_T_MAX - len) {
+            PyErr_SetString(PyExc_OverflowError,
+                            "join() result is too long for a Python string");
+            goto end;
+        }
+
+        len += PyUnicode_GET_LENGTH(items[i]);
+        maxchar = Py_MAX(maxchar, PyUnicode_MAX_CHAR_VALUE(items[i]));
+    }
+
+    result = PyUnicode_New(len, maxchar);
+    if (result == NULL)
+        goto end;
+
+    for (i = 0; i < n; i++) {
+        _PyUnicode_FastCopyCharacters(result, pos, items[i], 0,
+                                      PyUnicode_GET_LENGTH(items[i]));
+        pos += PyUnicode_GET_LENGTH(items[i]);
+    }
+
+end:
+    for (i = 0; i < n; i++)
+        Py_DECREF(items[i]);
+
+    return result;
+}
+
+PyObject* __pypperoni_IMPL_copy_const(PyObject* v)
+{
+    /* Returns a new copy of a constant display folded at compile time
+       (see find_const_literals). Lists, sets and dicts inside it are
+       copied as well; everything else is immutable and shared. */
+    PyObject *x, *key, *value, *item;
+    Py_ssize_t i, n;
+
+    if (PyList_CheckExact(v)) {
+        n = PyList_GET_SIZE(v);
+        x = PyList_New(n);
+        if (x == NULL)
+            return NULL;
+
+        for (i = 0; i < n; i++) {
+            item = __pypperoni_IMPL_copy_const(PyList_GET_ITEM(v, i));
+            if (item == NULL) {
+                Py_DECREF(x);
+                return NULL;
+            }
+
+            PyList_SET_ITEM(x, i, item);
+        }
+
+        return x;
+    }
+
+    else if (PyDict_CheckExact(v)) {
+        x = _PyDict_NewPresized(PyDict_Size(v));
+        if (x == NULL)
+            return NULL;
+
+        i = 0;
+        while (PyDict_Next(v, &i, &key, &value)) {
+            item = __pypperoni_IMPL_copy_const(value);
+            if (item == NULL || PyDict_SetItem(x, key, item) != 0) {
+                Py_XDECREF(item);
+                Py_DECREF(x);
+                return NULL;
+            }
+
+            Py_DECREF(item);
+        }
+
+        return x;
+    }
+
+    else if (Py_TYPE(v) == &PySet_Type) {
+        return PySet_New(v);
+    }
+
+    Py_INCREF(v);
+    return v;
+}
+
+PyObject* __pypperoni_IMPL_load_method(PyObject* obj, PyObject* name, int* unbound)
+{
+    /* Like PyObject_GetAttr, but if the attribute is a plain function
+       found through the type, return it unbound (and set *unbound)
+       so that the caller can pass obj as the first argument without
+       allocating a bound method object. */
+    PyTypeObject *tp = Py_TYPE(obj);
+    PyObject *descr, *dict, *attr;
+    PyObject **dictptr;
+    descrgetfunc getter = NULL;
+
+    *unbound = 0;
+
+    if (tp->tp_getattro != PyObject_GenericGetAttr || !PyUnicode_Check(name))
+        return PyObject_GetAttr(obj, name);
+
+    if (tp->tp_dict == NULL && PyType_Ready(tp) < 0)
+        return NULL;
+
+    descr = _PyType_Lookup(tp, name);
+    if (descr != NULL) {
+        Py_INCREF(descr);
+        if (!PyFunction_Check(descr)) {
+            getter = descr->ob_type->tp_descr_get;
+            if (getter != NULL && PyDescr_IsData(descr)) {
+                attr = getter(descr, obj, (PyObject *)tp);
+                Py_DECREF(descr);
+                return attr;
+            }
+        }
+    }
+
+    dictptr = _PyObject_GetDictPtr(obj);
+    if (dictptr != NULL && (dict = *dictptr) != NULL) {
+        Py_INCREF(dict);
+        attr = PyDict_GetItem(dict, name);
+        if (attr != NULL) {
+            Py_INCREF(attr);
+            Py_DECREF(dict);
+            Py_XDECREF(descr);
+            return attr;
+        }
+        Py_DECREF(dict);
+    }
+
+    if (descr != NULL && PyFunction_Check(descr)) {
+        *unbound = 1;
+        return descr;
+    }
+
+    if (getter != NULL) {
+        attr = getter(descr, obj, (PyObject *)tp);
+        Py_DECREF(descr);
+        return attr;
+    }
+
+    if (descr != NULL)
+        return descr;
+
+    PyErr_Format(PyExc_AttributeError,
+                 "'%.50s' object has no attribute '%U'",
+                 tp->tp_name, name);
+    return NULL;
+}
+
 int __pypperoni_IMPL_load_build_class(PyFrameObject* f, PyObject** result)
 {
     _Py_IDENTIFIER(__build_class__);
@@ -1482,6 +2151,7 @@ void setup_pypperoni()
 
     Py_Initialize();
     PyEval_InitThreads();
+    __pypperoni_IMPL_init_builtins();
 
     /* Setup __pypperoni__ */
     PyObject* pypperonimod = PyImport_AddModule("__pypperoni__");
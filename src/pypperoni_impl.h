@@ -22,6 +22,7 @@
 #include <frameobject.h>
 #include <opcode.h>
 #include <marshal.h>
+#include <longintrepr.h>
 
 #ifdef __cplusplus
 extern "C" {
@@ -38,7 +39,7 @@ typedef struct _pypperoni_module {
     PyObject* obj;
 } PypperoniModule;
 
-#define STACK_LEVEL()     ((int)(stack_pointer - f->f_stacktop))
+#define STACK_LEVEL()     ((int)(stack_pointer - f->f_valuestack))
 #define TOP()             (stack_pointer[-1])
 #define SECOND()          (stack_pointer[-2])
 #define THIRD()           (stack_pointer[-3])
@@ -97,15 +98,60 @@ typedef struct _pypperoni_module {
     } while (0)
 #endif
 
+/* Result of a LOAD_GLOBAL, valid while neither globals nor builtins
+   change (see __pypperoni_IMPL_load_global_cached) */
+typedef struct {
+    uint64_t globals_version;
+    uint64_t builtins_version;
+    PyObject* value; /* borrowed */
+} __pypperoni_global_cache;
+
+/* Argument binder generated for each compiled function (see
+   Module.__gen_binder). Stores the nargs positional arguments in args,
+   followed by the keyword arguments named in kwnames, into fastlocals.
+   Returns 0 on success, -1 on error, or 1 if the arguments don't match
+   the signature, so the generic code can report it. */
+typedef int (*__pypperoni_binder)(PyObject* func, PyObject** fastlocals, PyObject** args,
+                                  Py_ssize_t nargs, PyObject* kwnames);
+
+/* Builtins whose calls are specialized (see BUILTIN_CALLS in module.py) */
+enum {
+    PYPPERONI_BUILTIN_ABS,
+    PYPPERONI_BUILTIN_GETATTR,
+    PYPPERONI_BUILTIN_HASATTR,
+    PYPPERONI_BUILTIN_ISINSTANCE,
+    PYPPERONI_BUILTIN_LEN,
+    PYPPERONI_BUILTIN_MAX,
+    PYPPERONI_BUILTIN_MIN,
+    PYPPERONI_BUILTIN_TYPE,
+    PYPPERONI_BUILTIN_COUNT
+};
+
+/* The original objects, set by __pypperoni_IMPL_init_builtins */
+extern PyObject* __pypperoni_IMPL_builtins[PYPPERONI_BUILTIN_COUNT];
+
+void __pypperoni_IMPL_init_builtins(void);
 PyObject* __pypperoni_IMPL_load_name(PyFrameObject* f, PyObject* name);
 PyObject* __pypperoni_IMPL_load_global(PyFrameObject* f, PyObject* name);
-int __pypperoni_IMPL_compare(PyObject* w, PyObject* v, int op, PyObject** result);
+int __pypperoni_IMPL_compare_generic(PyObject* v, PyObject* w, int op, PyObject** result);
 int __pypperoni_IMPL_unpack_sequence(PyObject* seq, PyObject*** sp, int num);
 int __pypperoni_IMPL_unpack_ex(PyObject* seq, PyObject*** sp, int num);
 void __pypperoni_IMPL_handle_bmuwc_error(PyObject* arg, PyObject* func);
 PyObject* __pypperoni_IMPL_ensure_args_iterable(PyObject* args, PyObject* func);
 PyObject* __pypperoni_IMPL_ensure_kwdict(PyObject* kwdict, PyObject* func);
 PyObject* __pypperoni_IMPL_call_func(PyObject*** sp, int oparg, PyObject* kwargs);
+PyObject* __pypperoni_IMPL_load_method(PyObject* obj, PyObject* name, int* unbound);
+PyFrameObject* __pypperoni_IMPL_enter_frame(PyObject*** sp, int oparg);
+PyFrameObject* __pypperoni_IMPL_bind_frame(PyObject*** sp, int oparg, PyObject* kwnames,
+                                           __pypperoni_binder bind);
+void __pypperoni_IMPL_set_binder(PyCodeObject* co, __pypperoni_binder bind);
+Py_ssize_t __pypperoni_IMPL_find_keyword(PyObject* key, PyObject** names, Py_ssize_t count);
+PyObject* __pypperoni_IMPL_dict_iter_next(PyObject* it);
+PyObject* __pypperoni_IMPL_format_number(PyObject* v, PyObject* spec, char type,
+                                         int width, int prec, int zero);
+PyObject* __pypperoni_IMPL_build_string(PyObject** items, int n);
+PyObject* __pypperoni_IMPL_copy_const(PyObject* v);
+void __pypperoni_IMPL_free_frame(PyFrameObject* f);
 int __pypperoni_IMPL_load_build_class(PyFrameObject* f, PyObject** result);
 int __pypperoni_IMPL_setup_with(PyObject* v, PyObject** exitptr, PyObject** result);
 int __pypperoni_IMPL_do_raise(PyObject* exc, PyObject* cause);
@@ -117,6 +163,506 @@ PyObject* __pypperoni_IMPL_import_from(PyObject* mod, const char* name);
 PyObject* __pypperoni_IMPL_import_from_or_module(PyObject* mod, PyObject* name, int64_t index);
 int __pypperoni_IMPL_import_star(PyFrameObject* f, PyObject* mod);
 
+static inline int __pypperoni_IMPL_is_small_long(PyObject* o)
+{
+    /* Exact int with at most one digit */
+    return PyLong_CheckExact(o) && (size_t)(Py_SIZE(o) + 1) < 3;
+}
+
+static inline long long __pypperoni_IMPL_small_long_value(PyObject* o)
+{
+    Py_ssize_t size = Py_SIZE(o);
+    if (size == 0)
+        return 0;
+
+    return size < 0 ? -(long long)((PyLongObject*)o)->ob_digit[0] :
+                      (long long)((PyLongObject*)o)->ob_digit[0];
+}
+
+static inline int __pypperoni_IMPL_as_fast_double(PyObject* o, double* d)
+{
+    if (PyFloat_CheckExact(o))
+        *d = PyFloat_AS_DOUBLE(o);
+
+    else if (__pypperoni_IMPL_is_small_long(o))
+        *d = (double)__pypperoni_IMPL_small_long_value(o);
+
+    else
+        return 0;
+
+    return 1;
+}
+
+/* Python's floor division and modulo on C numbers. Either output may be
+   NULL. Return nonzero on division by zero or overflow. */
+static inline int __pypperoni_IMPL_long_floor_divmod(long long a, long long b, long long* div, long long* mod)
+{
+    long long q, m;
+
+    if (b == 0 || (b == -1 && a == LLONG_MIN))
+        return 1;
+
+    q = a / b;
+    m = a % b;
+    if (m != 0 && ((m < 0) != (b < 0))) {
+        m += b;
+        q -= 1;
+    }
+
+    if (div != NULL)
+        *div = q;
+
+    if (mod != NULL)
+        *mod = m;
+
+    return 0;
+}
+
+static inline int __pypperoni_IMPL_float_floor_divmod(double a, double b, double* div, double* mod)
+{
+    /* Same as float_divmod */
+    double m, d, q;
+
+    if (b == 0.0)
+        return 1;
+
+    m = fmod(a, b);
+    d = (a - m) / b;
+    if (m) {
+        if ((b < 0) != (m < 0)) {
+            m += b;
+            d -= 1.0;
+        }
+    }
+    else
+        m = copysign(0.0, b);
+
+    if (d) {
+        q = floor(d);
+        if (d - q > 0.5)
+            q += 1.0;
+    }
+    else
+        q = copysign(0.0, a / b);
+
+    if (div != NULL)
+        *div = q;
+
+    if (mod != NULL)
+        *mod = m;
+
+    return 0;
+}
+
+/* Exact small int and float arithmetic. Returns 1 if handled (*x is set,
+   NULL on error) or 0 if the caller must use the generic number protocol.
+   Division by zero is never handled here so the usual error is raised. */
+static inline int __pypperoni_IMPL_fast_arith(PyObject* v, PyObject* w, int op, PyObject** x)
+{
+    double a, b, r;
+
+    if (__pypperoni_IMPL_is_small_long(v) && __pypperoni_IMPL_is_small_long(w))
+    {
+        long long i = __pypperoni_IMPL_small_long_value(v);
+        long long j = __pypperoni_IMPL_small_long_value(w);
+
+        switch (op) {
+        case BINARY_ADD:
+            *x = PyLong_FromLongLong(i + j);
+            return 1;
+        case BINARY_SUBTRACT:
+            *x = PyLong_FromLongLong(i - j);
+            return 1;
+        case BINARY_MULTIPLY:
+            *x = PyLong_FromLongLong(i * j);
+            return 1;
+        case BINARY_FLOOR_DIVIDE:
+            if (__pypperoni_IMPL_long_floor_divmod(i, j, &i, NULL))
+                return 0;
+
+            *x = PyLong_FromLongLong(i);
+            return 1;
+        case BINARY_MODULO:
+            if (__pypperoni_IMPL_long_floor_divmod(i, j, NULL, &i))
+                return 0;
+
+            *x = PyLong_FromLongLong(i);
+            return 1;
+        default:
+            return 0;
+        }
+    }
+
+    if (!PyFloat_CheckExact(v) && !PyFloat_CheckExact(w))
+        return 0;
+
+    if (!__pypperoni_IMPL_as_fast_double(v, &a) || !__pypperoni_IMPL_as_fast_double(w, &b))
+        return 0;
+
+    switch (op) {
+    case BINARY_ADD:
+        r = a + b;
+        break;
+    case BINARY_SUBTRACT:
+        r = a - b;
+        break;
+    case BINARY_MULTIPLY:
+        r = a * b;
+        break;
+    case BINARY_FLOOR_DIVIDE:
+        if (__pypperoni_IMPL_float_floor_divmod(a, b, &r, NULL))
+            return 0;
+        break;
+    case BINARY_MODULO:
+        if (__pypperoni_IMPL_float_floor_divmod(a, b, NULL, &r))
+            return 0;
+        break;
+    default:
+        return 0;
+    }
+
+    *x = PyFloat_FromDouble(r);
+    return 1;
+}
+
+/* Rich comparison of exact small ints and floats. Returns 1 if handled
+   (*res is the result) or 0 otherwise. */
+static inline int __pypperoni_IMPL_fast_compare_bool(PyObject* v, PyObject* w, int op, int* res)
+{
+    double a, b;
+
+    if (__pypperoni_IMPL_is_small_long(v) && __pypperoni_IMPL_is_small_long(w))
+    {
+        a = (double)__pypperoni_IMPL_small_long_value(v);
+        b = (double)__pypperoni_IMPL_small_long_value(w);
+    }
+
+    else if (!PyFloat_CheckExact(v) && !PyFloat_CheckExact(w))
+        return 0;
+
+    else if (!__pypperoni_IMPL_as_fast_double(v, &a) || !__pypperoni_IMPL_as_fast_double(w, &b))
+        return 0;
+
+    switch (op) {
+    case Py_LT: *res = a < b; break;
+    case Py_LE: *res = a <= b; break;
+    case Py_EQ: *res = a == b; break;
+    case Py_NE: *res = a != b; break;
+    case Py_GT: *res = a > b; break;
+    case Py_GE: *res = a >= b; break;
+    default: return 0;
+    }
+
+    return 1;
+}
+
+/* Same as above, but *x is set to a new reference to Py_True or Py_False */
+static inline int __pypperoni_IMPL_fast_compare(PyObject* v, PyObject* w, int op, PyObject** x)
+{
+    int res;
+
+    if (!__pypperoni_IMPL_fast_compare_bool(v, w, op, &res))
+        return 0;
+
+    *x = res ? Py_True : Py_False;
+    Py_INCREF(*x);
+    return 1;
+}
+
+static inline int __pypperoni_IMPL_compare(PyObject* v, PyObject* w, int op, PyObject** result)
+{
+    if (__pypperoni_IMPL_fast_compare(v, w, op, result))
+        return 0;
+
+    return __pypperoni_IMPL_compare_generic(v, w, op, result);
+}
+
+static inline int __pypperoni_IMPL_compare_is(PyObject* v, PyObject* w, int op, PyObject** result)
+{
+    /* "is" and "is not" */
+    *result = ((v == w) ^ (op == PyCmp_IS_NOT)) ? Py_True : Py_False;
+    Py_INCREF(*result);
+    return 0;
+}
+
+static inline int __pypperoni_IMPL_is_identity_eq(PyObject* v, PyObject* w)
+{
+    /* Returns 1 if v == w is known to be v is w, w being None, True or
+       False: v is of a builtin type that doesn't define equality with w */
+    return (v == w || v == Py_None || PyBool_Check(v) || PyUnicode_CheckExact(v) ||
+            PyTuple_CheckExact(v) || PyList_CheckExact(v) || PyDict_CheckExact(v) ||
+            (w == Py_None && (PyLong_CheckExact(v) || PyFloat_CheckExact(v))));
+}
+
+static inline int __pypperoni_IMPL_compare_singleton(PyObject* v, PyObject* w, int op, PyObject** result)
+{
+    /* v == w or v != w, w being None, True or False */
+    if (__pypperoni_IMPL_is_identity_eq(v, w))
+    {
+        *result = ((v == w) ^ (op == Py_NE)) ? Py_True : Py_False;
+        Py_INCREF(*result);
+        return 0;
+    }
+
+    return __pypperoni_IMPL_compare_generic(v, w, op, result);
+}
+
+static inline int __pypperoni_IMPL_is_exc_class_match(PyObject* v, PyObject* w)
+{
+    /* Returns 1 if the exception type v can be matched against w without
+       __pypperoni_IMPL_compare_generic (w is a single exception class) */
+    return (v == w || (PyExceptionClass_Check(v) && PyExceptionClass_Check(w)));
+}
+
+static inline int __pypperoni_IMPL_exc_match(PyObject* v, PyObject* w, int op, PyObject** result)
+{
+    /* Exception matching (op is PyCmp_EXC_MATCH), like
+       PyErr_GivenExceptionMatches */
+    if (__pypperoni_IMPL_is_exc_class_match(v, w))
+    {
+        *result = (v == w || PyType_IsSubtype((PyTypeObject*)v, (PyTypeObject*)w)) ? Py_True : Py_False;
+        Py_INCREF(*result);
+        return 0;
+    }
+
+    return __pypperoni_IMPL_compare_generic(v, w, op, result);
+}
+
+/* Helpers for numeric runs (see typeinfer.py). Values are unboxed into C
+   long long/double; any check failing makes the generated code fall back
+   to the generic path. */
+static inline int __pypperoni_IMPL_unbox_long(PyObject* o, long long* r)
+{
+    int overflow;
+
+    if (o == NULL || !PyLong_CheckExact(o))
+        return 0;
+
+    if (__pypperoni_IMPL_is_small_long(o)) {
+        *r = __pypperoni_IMPL_small_long_value(o);
+        return 1;
+    }
+
+    *r = PyLong_AsLongLongAndOverflow(o, &overflow);
+    return !overflow;
+}
+
+static inline int __pypperoni_IMPL_unbox_double(PyObject* o, double* r)
+{
+    if (o == NULL || !PyFloat_CheckExact(o))
+        return 0;
+
+    *r = PyFloat_AS_DOUBLE(o);
+    return 1;
+}
+
+#if defined(__GNUC__) || defined(__clang__)
+    #define __PYPPERONI_ADD_OVERFLOW(a, b, r) __builtin_add_overflow(a, b, r)
+    #define __PYPPERONI_SUB_OVERFLOW(a, b, r) __builtin_sub_overflow(a, b, r)
+    #define __PYPPERONI_MUL_OVERFLOW(a, b, r) __builtin_mul_overflow(a, b, r)
+#else
+    static inline int __pypperoni_IMPL_add_overflow(long long a, long long b, long long* r)
+    {
+        if ((b > 0 && a > LLONG_MAX - b) || (b < 0 && a < LLONG_MIN - b))
+            return 1;
+
+        *r = a + b;
+        return 0;
+    }
+
+    static inline int __pypperoni_IMPL_sub_overflow(long long a, long long b, long long* r)
+    {
+        if ((b < 0 && a > LLONG_MAX + b) || (b > 0 && a < LLONG_MIN + b))
+            return 1;
+
+        *r = a - b;
+        return 0;
+    }
+
+    static inline int __pypperoni_IMPL_mul_overflow(long long a, long long b, long long* r)
+    {
+        if (a != 0 && b != 0) {
+            if ((a == -1 && b == LLONG_MIN) || (b == -1 && a == LLONG_MIN))
+                return 1;
+
+            if (a != -1 && b != -1 && (a > 0 ? (b > 0 ? a > LLONG_MAX / b : b < LLONG_MIN / a)
+                                             : (b > 0 ? a < LLONG_MIN / b : a < LLONG_MAX / b)))
+                return 1;
+        }
+
+        *r = a * b;
+        return 0;
+    }
+
+    #define __PYPPERONI_ADD_OVERFLOW(a, b, r) __pypperoni_IMPL_add_overflow(a, b, r)
+    #define __PYPPERONI_SUB_OVERFLOW(a, b, r) __pypperoni_IMPL_sub_overflow(a, b, r)
+    #define __PYPPERONI_MUL_OVERFLOW(a, b, r) __pypperoni_IMPL_mul_overflow(a, b, r)
+#endif
+
+static inline int __pypperoni_IMPL_long_true_divide(long long a, long long b, double* r)
+{
+    /* Only exact when both operands fit in a double's mantissa */
+    const long long limit = 1LL << 53;
+
+    if (b == 0 || a > limit || a < -limit || b > limit || b < -limit)
+        return 1;
+
+    *r = (double)a / (double)b;
+    return 0;
+}
+
+/* Layout shared by the builtin list, tuple and str iterators
+   (see listiterobject in Objects/listobject.c) */
+typedef struct {
+    PyObject_HEAD
+    Py_ssize_t it_index;
+    PyObject* it_seq; /* Set to NULL when iterator is exhausted */
+} __pypperoni_seqiterobject;
+
+static inline PyObject* __pypperoni_IMPL_for_iter(PyObject* it)
+{
+    /* Returns the next item of it, or NULL when it's exhausted or on
+       error (like tp_iternext). The builtin iterators are advanced
+       here directly; the bounds are checked against the current size
+       of the sequence, so it's safe if it's mutated while iterating. */
+    PyTypeObject* tp = Py_TYPE(it);
+    __pypperoni_seqiterobject* si = (__pypperoni_seqiterobject*)it;
+    PyObject* seq;
+    PyObject* item;
+
+    if (tp == &PyListIter_Type) {
+        seq = si->it_seq;
+        if (seq == NULL)
+            return NULL;
+
+        if (si->it_index < PyList_GET_SIZE(seq)) {
+            item = PyList_GET_ITEM(seq, si->it_index++);
+            Py_INCREF(item);
+            return item;
+        }
+    }
+
+    else if (tp == &PyTupleIter_Type) {
+        seq = si->it_seq;
+        if (seq == NULL)
+            return NULL;
+
+        if (si->it_index < PyTuple_GET_SIZE(seq)) {
+            item = PyTuple_GET_ITEM(seq, si->it_index++);
+            Py_INCREF(item);
+            return item;
+        }
+    }
+
+    else if (tp == &PyUnicodeIter_Type) {
+        seq = si->it_seq;
+        if (seq == NULL)
+            return NULL;
+
+        if (si->it_index < PyUnicode_GET_LENGTH(seq)) {
+            item = PyUnicode_FromOrdinal(PyUnicode_READ_CHAR(seq, si->it_index));
+            if (item != NULL)
+                si->it_index++;
+
+            return item;
+        }
+    }
+
+    else if (tp == &PyDictIterKey_Type || tp == &PyDictIterValue_Type ||
+             tp == &PyDictIterItem_Type) {
+        return __pypperoni_IMPL_dict_iter_next(it);
+    }
+
+    else {
+        return (*tp->tp_iternext)(it);
+    }
+
+    /* Exhausted */
+    si->it_seq = NULL;
+    Py_DECREF(seq);
+    return NULL;
+}
+
+static inline PyObject* __pypperoni_IMPL_format_value(PyObject* v, int conv, PyObject* spec)
+{
+    /* FORMAT_VALUE: applies the FVC_* conversion conv to v, then formats
+       it with spec (may be NULL). Exact ints and floats without a spec
+       are converted with their tp_str directly. */
+    PyObject* result;
+
+    if (conv == FVC_NONE) {
+        if (spec == NULL) {
+            if (PyUnicode_CheckExact(v)) {
+                Py_INCREF(v);
+                return v;
+            }
+
+            if (PyLong_CheckExact(v) || PyFloat_CheckExact(v))
+                return Py_TYPE(v)->tp_str(v);
+        }
+
+        return PyObject_Format(v, spec);
+    }
+
+    if (conv == FVC_STR)
+        v = PyObject_Str(v);
+
+    else if (conv == FVC_REPR)
+        v = PyObject_Repr(v);
+
+    else
+        v = PyObject_ASCII(v);
+
+    if (v == NULL || (spec == NULL && PyUnicode_CheckExact(v)))
+        return v;
+
+    result = PyObject_Format(v, spec);
+    Py_DECREF(v);
+    return result;
+}
+
+static inline int __pypperoni_IMPL_range_args(PyObject** args, int nargs, Py_ssize_t* start,
+                                              Py_ssize_t* step, size_t* len)
+{
+    /* Reads the arguments of a range() call lowered to a C loop.
+       Returns 0 if the generic range object must be used instead
+       (arguments that aren't ints fitting in a Py_ssize_t, or step 0). */
+    long long v[3] = {0, 0, 1};
+    int i, overflow;
+
+    for (i = 0; i < nargs; i++) {
+        if (!PyLong_CheckExact(args[i]))
+            return 0;
+
+        v[i] = PyLong_AsLongLongAndOverflow(args[i], &overflow);
+        if (overflow || v[i] > PY_SSIZE_T_MAX || v[i] < PY_SSIZE_T_MIN)
+            return 0;
+    }
+
+    if (nargs == 1) {
+        v[1] = v[0];
+        v[0] = 0;
+    }
+
+    if (v[2] == 0)
+        return 0;
+
+    *start = (Py_ssize_t)v[0];
+    *step = (Py_ssize_t)v[2];
+
+    /* See get_len_of_range in Objects/rangeobject.c */
+    if (v[2] > 0 && v[0] < v[1])
+        *len = 1 + ((size_t)v[1] - 1 - (size_t)v[0]) / (size_t)v[2];
+
+    else if (v[2] < 0 && v[0] > v[1])
+        *len = 1 + ((size_t)v[0] - 1 - (size_t)v[1]) / (0 - (size_t)v[2]);
+
+    else
+        *len = 0;
+
+    return 1;
+}
+
 static inline int __pypperoni_IMPL_check_cond(PyObject* obj, int* result)
 {
     int err;
@@ -126,11 +672,26 @@ static inline int __pypperoni_IMPL_check_cond(PyObject* obj, int* result)
         return 0;
     }
 
-    if (obj == Py_False) {
+    if (obj == Py_False || obj == Py_None) {
         *result = 0;
         return 0;
     }
 
+    if (PyLong_CheckExact(obj) || PyList_CheckExact(obj) || PyTuple_CheckExact(obj)) {
+        *result = Py_SIZE(obj) != 0;
+        return 0;
+    }
+
+    if (PyDict_CheckExact(obj)) {
+        *result = ((PyDictObject*)obj)->ma_used != 0;
+        return 0;
+    }
+
+    if (PyUnicode_CheckExact(obj) && PyUnicode_IS_READY(obj)) {
+        *result = PyUnicode_GET_LENGTH(obj) != 0;
+        return 0;
+    }
+
     *result = PyObject_IsTrue(obj);
     if (*result < 0)
         return 1;
@@ -138,6 +699,106 @@ static inline int __pypperoni_IMPL_check_cond(PyObject* obj, int* result)
     return 0;
 }
 
+/* Comparisons followed by a conditional jump: like the functions above
+   (see __pypperoni_IMPL_compare), but *result is the truth value of the
+   comparison and no bool object is created. */
+static inline int __pypperoni_IMPL_compare_bool(PyObject* v, PyObject* w, int op, int* result)
+{
+    PyObject* x;
+    int err;
+
+    if (__pypperoni_IMPL_fast_compare_bool(v, w, op, result))
+        return 0;
+
+    if (op == PyCmp_IS || op == PyCmp_IS_NOT) {
+        *result = (v == w) ^ (op == PyCmp_IS_NOT);
+        return 0;
+    }
+
+    if (op == PyCmp_IN || op == PyCmp_NOT_IN) {
+        err = PySequence_Contains(w, v);
+        if (err < 0)
+            return 1;
+
+        *result = err ^ (op == PyCmp_NOT_IN);
+        return 0;
+    }
+
+    /* Not PyObject_RichCompareBool: x == x must still call __eq__ */
+    if (__pypperoni_IMPL_compare_generic(v, w, op, &x))
+        return 1;
+
+    err = __pypperoni_IMPL_check_cond(x, result);
+    Py_DECREF(x);
+    return err;
+}
+
+static inline int __pypperoni_IMPL_compare_is_bool(PyObject* v, PyObject* w, int op, int* result)
+{
+    *result = (v == w) ^ (op == PyCmp_IS_NOT);
+    return 0;
+}
+
+static inline int __pypperoni_IMPL_compare_singleton_bool(PyObject* v, PyObject* w, int op, int* result)
+{
+    if (__pypperoni_IMPL_is_identity_eq(v, w)) {
+        *result = (v == w) ^ (op == Py_NE);
+        return 0;
+    }
+
+    return __pypperoni_IMPL_compare_bool(v, w, op, result);
+}
+
+static inline int __pypperoni_IMPL_in_const_bool(PyObject* v, PyObject* w, PyObject* set, int op, int* result)
+{
+    /* v in w or v not in w, w being a constant tuple or frozenset and set
+       a frozenset of its items. Exact str and int keys compare to the
+       items the same way through set as through a scan of w. */
+    int res;
+
+    if (PyUnicode_CheckExact(v) || PyLong_CheckExact(v))
+        res = PySet_Contains(set, v);
+
+    else
+        res = PySequence_Contains(w, v);
+
+    if (res < 0)
+        return 1;
+
+    *result = res ^ (op == PyCmp_NOT_IN);
+    return 0;
+}
+
+static inline int __pypperoni_IMPL_in_const(PyObject* v, PyObject* w, PyObject* set, int op, PyObject** result)
+{
+    int res;
+
+    if (__pypperoni_IMPL_in_const_bool(v, w, set, op, &res))
+        return 1;
+
+    *result = res ? Py_True : Py_False;
+    Py_INCREF(*result);
+    return 0;
+}
+
+static inline Py_ssize_t __pypperoni_IMPL_switch_index(PyObject* table, PyObject* key)
+{
+    /* Case of an if/elif chain matching key (an exact str or int),
+       -1 if none */
+    PyObject* index = PyDict_GetItem(table, key);
+    return (index == NULL) ? -1 : PyLong_AS_LONG(index);
+}
+
+static inline int __pypperoni_IMPL_exc_match_bool(PyObject* v, PyObject* w, int op, int* result)
+{
+    if (__pypperoni_IMPL_is_exc_class_match(v, w)) {
+        *result = (v == w || PyType_IsSubtype((PyTypeObject*)v, (PyTypeObject*)w));
+        return 0;
+    }
+
+    return __pypperoni_IMPL_compare_bool(v, w, op, result);
+}
+
 static inline int __pypperoni_IMPL_binary_power(PyObject* v, PyObject* w, PyObject** x)
 {
     *x = PyNumber_Power(v, w, Py_None);
@@ -146,6 +807,9 @@ static inline int __pypperoni_IMPL_binary_power(PyObject* v, PyObject* w, PyObje
 
 static inline int __pypperoni_IMPL_binary_multiply(PyObject* v, PyObject* w, PyObject** x)
 {
+    if (__pypperoni_IMPL_fast_arith(v, w, BINARY_MULTIPLY, x))
+        return (*x == NULL) ? 1 : 0;
+
     *x = PyNumber_Multiply(v, w);
     return (*x == NULL) ? 1 : 0;
 }
@@ -158,6 +822,9 @@ static inline int __pypperoni_IMPL_binary_matrix_multiply(PyObject* v, PyObject*
 
 static inline int __pypperoni_IMPL_binary_modulo(PyObject* v, PyObject* w, PyObject** x)
 {
+    if (__pypperoni_IMPL_fast_arith(v, w, BINARY_MODULO, x))
+        return (*x == NULL) ? 1 : 0;
+
     if (PyUnicode_CheckExact(v) && (!PyUnicode_Check(w) || PyUnicode_CheckExact(w)))
         *x = PyUnicode_Format(v, w);
     else
@@ -167,6 +834,9 @@ static inline int __pypperoni_IMPL_binary_modulo(PyObject* v, PyObject* w, PyObj
 
 static inline int __pypperoni_IMPL_binary_add(PyObject* v, PyObject* w, PyObject** x)
 {
+    if (__pypperoni_IMPL_fast_arith(v, w, BINARY_ADD, x))
+        return (*x == NULL) ? 1 : 0;
+
     if (PyUnicode_CheckExact(v) && PyUnicode_CheckExact(w))
     {
         Py_INCREF(v); // PyUnicode_Append steals a ref
@@ -182,18 +852,178 @@ static inline int __pypperoni_IMPL_binary_add(PyObject* v, PyObject* w, PyObject
 
 static inline int __pypperoni_IMPL_binary_subtract(PyObject* v, PyObject* w, PyObject** x)
 {
+    if (__pypperoni_IMPL_fast_arith(v, w, BINARY_SUBTRACT, x))
+        return (*x == NULL) ? 1 : 0;
+
     *x = PyNumber_Subtract(v, w);
     return (*x == NULL) ? 1 : 0;
 }
 
+static inline int __pypperoni_IMPL_small_index(PyObject* w, Py_ssize_t size, Py_ssize_t* i)
+{
+    /* If w is an exact int of at most one digit that is a valid index
+       (negative or not) into a sequence of the given size, sets *i to the
+       item it refers to and returns 1. Returns 0 otherwise. */
+    Py_ssize_t index;
+
+    if (!PyLong_CheckExact(w) || Py_SIZE(w) < -1 || Py_SIZE(w) > 1)
+        return 0;
+
+    index = Py_SIZE(w) * (Py_ssize_t)((PyLongObject*)w)->ob_digit[0];
+    if (index < 0)
+        index += size;
+
+    if (index < 0 || index >= size)
+        return 0;
+
+    *i = index;
+    return 1;
+}
+
 static inline int __pypperoni_IMPL_binary_subscr(PyObject* v, PyObject* w, PyObject** x)
 {
+    Py_ssize_t i;
+
+    if (PyList_CheckExact(v) && __pypperoni_IMPL_small_index(w, PyList_GET_SIZE(v), &i))
+    {
+        *x = PyList_GET_ITEM(v, i);
+        Py_INCREF(*x);
+        return 0;
+    }
+
+    if (PyTuple_CheckExact(v) && __pypperoni_IMPL_small_index(w, PyTuple_GET_SIZE(v), &i))
+    {
+        *x = PyTuple_GET_ITEM(v, i);
+        Py_INCREF(*x);
+        return 0;
+    }
+
+    if (PyDict_CheckExact(v) && PyUnicode_CheckExact(w) && ((PyASCIIObject*)w)->hash != -1)
+    {
+        *x = _PyDict_GetItem_KnownHash(v, w, ((PyASCIIObject*)w)->hash);
+        if (*x != NULL)
+        {
+            Py_INCREF(*x);
+            return 0;
+        }
+
+        if (PyErr_Occurred())
+            return 1;
+
+        /* Missing key, let PyObject_GetItem raise KeyError */
+    }
+
     *x = PyObject_GetItem(v, w);
     return (*x == NULL) ? 1 : 0;
 }
 
+static inline int __pypperoni_IMPL_subscr_const(PyObject* v, PyObject* w, Py_ssize_t index, PyObject** x)
+{
+    /* v[w], w being the int constant index */
+    Py_ssize_t size;
+
+    if (PyList_CheckExact(v) || PyTuple_CheckExact(v))
+    {
+        size = Py_SIZE(v);
+        if (index < 0)
+            index += size;
+
+        if (index >= 0 && index < size)
+        {
+            *x = PyList_CheckExact(v) ? PyList_GET_ITEM(v, index) : PyTuple_GET_ITEM(v, index);
+            Py_INCREF(*x);
+            return 0;
+        }
+    }
+
+    return __pypperoni_IMPL_binary_subscr(v, w, x);
+}
+
+static inline int __pypperoni_IMPL_get_slice(PyObject* v, PyObject* start, PyObject* stop, PyObject** x)
+{
+    /* v[start:stop] */
+    Py_ssize_t size, i = 0, j = PY_SSIZE_T_MAX;
+    PyObject* slice;
+
+    if ((PyList_CheckExact(v) || PyTuple_CheckExact(v) ||
+         (PyUnicode_CheckExact(v) && PyUnicode_IS_READY(v))) &&
+        (start == Py_None || PyLong_CheckExact(start)) &&
+        (stop == Py_None || PyLong_CheckExact(stop)))
+    {
+        if (!_PyEval_SliceIndex(start, &i) || !_PyEval_SliceIndex(stop, &j))
+            return 1;
+
+        size = PyUnicode_CheckExact(v) ? PyUnicode_GET_LENGTH(v) : Py_SIZE(v);
+        if (i < 0)
+        {
+            i += size;
+            if (i < 0)
+                i = 0;
+        }
+
+        if (j < 0)
+        {
+            j += size;
+            if (j < 0)
+                j = 0;
+        }
+
+        if (i > size)
+            i = size;
+
+        if (j < i)
+            j = i;
+
+        else if (j > size)
+            j = size;
+
+        if (PyList_CheckExact(v))
+            *x = PyList_GetSlice(v, i, j);
+
+        else if (PyTuple_CheckExact(v))
+            *x = PyTuple_GetSlice(v, i, j);
+
+        else
+            *x = PyUnicode_Substring(v, i, j);
+
+        return (*x == NULL) ? 1 : 0;
+    }
+
+    slice = PySlice_New(start, stop, NULL);
+    if (slice == NULL)
+        return 1;
+
+    *x = PyObject_GetItem(v, slice);
+    Py_DECREF(slice);
+    return (*x == NULL) ? 1 : 0;
+}
+
+static inline int __pypperoni_IMPL_store_subscr(PyObject* v, PyObject* w, PyObject* u)
+{
+    /* v[w] = u */
+    Py_ssize_t i;
+    PyObject* old;
+
+    if (PyList_CheckExact(v) && __pypperoni_IMPL_small_index(w, PyList_GET_SIZE(v), &i))
+    {
+        old = PyList_GET_ITEM(v, i);
+        Py_INCREF(u);
+        PyList_SET_ITEM(v, i, u);
+        Py_DECREF(old);
+        return 0;
+    }
+
+    if (PyDict_CheckExact(v) && PyUnicode_CheckExact(w) && ((PyASCIIObject*)w)->hash != -1)
+        return _PyDict_SetItem_KnownHash(v, w, u, ((PyASCIIObject*)w)->hash);
+
+    return PyObject_SetItem(v, w, u);
+}
+
 static inline int __pypperoni_IMPL_binary_floor_divide(PyObject* v, PyObject* w, PyObject** x)
 {
+    if (__pypperoni_IMPL_fast_arith(v, w, BINARY_FLOOR_DIVIDE, x))
+        return (*x == NULL) ? 1 : 0;
+
     *x = PyNumber_FloorDivide(v, w);
     return (*x == NULL) ? 1 : 0;
 }
@@ -236,6 +1066,9 @@ static inline int __pypperoni_IMPL_binary_or(PyObject* v, PyObject* w, PyObject*
 
 static inline int __pypperoni_IMPL_inplace_floor_divide(PyObject* v, PyObject* w, PyObject** x)
 {
+    if (__pypperoni_IMPL_fast_arith(v, w, BINARY_FLOOR_DIVIDE, x))
+        return (*x == NULL) ? 1 : 0;
+
     *x = PyNumber_InPlaceFloorDivide(v, w);
     return (*x == NULL) ? 1 : 0;
 }
@@ -248,6 +1081,9 @@ static inline int __pypperoni_IMPL_inplace_true_divide(PyObject* v, PyObject* w,
 
 static inline int __pypperoni_IMPL_inplace_add(PyObject* v, PyObject* w, PyObject** x)
 {
+    if (__pypperoni_IMPL_fast_arith(v, w, BINARY_ADD, x))
+        return (*x == NULL) ? 1 : 0;
+
     if (PyUnicode_CheckExact(v) && PyUnicode_CheckExact(w))
     {
         Py_INCREF(v); // PyUnicode_Append steals a ref
@@ -261,14 +1097,69 @@ static inline int __pypperoni_IMPL_inplace_add(PyObject* v, PyObject* w, PyObjec
     return (*x == NULL) ? 1 : 0;
 }
 
+static inline int __pypperoni_IMPL_add_stolen(PyObject* v, PyObject* w, int op, PyObject** x)
+{
+    /* v + w or v += w (op), stealing the reference to v. Strs only
+       referenced here are resized in place by PyUnicode_Append. */
+    int err;
+
+    if (PyUnicode_CheckExact(v) && PyUnicode_CheckExact(w))
+    {
+        PyUnicode_Append(&v, w);
+        *x = v;
+        return (*x == NULL) ? 1 : 0;
+    }
+
+    err = (op == INPLACE_ADD) ? __pypperoni_IMPL_inplace_add(v, w, x) :
+                                __pypperoni_IMPL_binary_add(v, w, x);
+    Py_DECREF(v);
+    return err;
+}
+
+static inline int __pypperoni_IMPL_add_to_slot(PyObject* v, PyObject* w, int op, PyObject** slot, PyObject** x)
+{
+    /* v + w or v += w (op) whose result is stored to *slot (a fast local or
+       a cell), stealing the reference to v. Like CPython's
+       unicode_concatenate, *slot is cleared if it's the only other
+       reference to the str v. */
+    if (PyUnicode_CheckExact(v) && Py_REFCNT(v) == 2 && *slot == v)
+    {
+        *slot = NULL;
+        Py_DECREF(v);
+    }
+
+    return __pypperoni_IMPL_add_stolen(v, w, op, x);
+}
+
+static inline int __pypperoni_IMPL_add_to_name(PyObject* v, PyObject* w, int op, PyObject* locals, PyObject* name,
+                                               PyObject** x)
+{
+    /* Same as __pypperoni_IMPL_add_to_slot for a result stored to the
+       name in locals */
+    if (PyUnicode_CheckExact(v) && Py_REFCNT(v) == 2 && locals != NULL &&
+        PyDict_CheckExact(locals) && PyDict_GetItem(locals, name) == v)
+    {
+        if (PyDict_DelItem(locals, name) != 0)
+            PyErr_Clear();
+    }
+
+    return __pypperoni_IMPL_add_stolen(v, w, op, x);
+}
+
 static inline int __pypperoni_IMPL_inplace_subtract(PyObject* v, PyObject* w, PyObject** x)
 {
+    if (__pypperoni_IMPL_fast_arith(v, w, BINARY_SUBTRACT, x))
+        return (*x == NULL) ? 1 : 0;
+
     *x = PyNumber_InPlaceSubtract(v, w);
     return (*x == NULL) ? 1 : 0;
 }
 
 static inline int __pypperoni_IMPL_inplace_multiply(PyObject* v, PyObject* w, PyObject** x)
 {
+    if (__pypperoni_IMPL_fast_arith(v, w, BINARY_MULTIPLY, x))
+        return (*x == NULL) ? 1 : 0;
+
     *x = PyNumber_InPlaceMultiply(v, w);
     return (*x == NULL) ? 1 : 0;
 }
@@ -281,6 +1172,9 @@ static inline int __pypperoni_IMPL_inplace_matrix_multiply(PyObject* v, PyObject
 
 static inline int __pypperoni_IMPL_inplace_modulo(PyObject* v, PyObject* w, PyObject** x)
 {
+    if (__pypperoni_IMPL_fast_arith(v, w, BINARY_MODULO, x))
+        return (*x == NULL) ? 1 : 0;
+
     *x = PyNumber_InPlaceRemainder(v, w);
     return (*x == NULL) ? 1 : 0;
 }
@@ -361,6 +1255,158 @@ static inline int __pypperoni_IMPL_unary_not(PyObject* v, PyObject** x)
     return err;
 }
 
+static inline void __pypperoni_IMPL_leave_frame(PyFrameObject* f)
+{
+    /* Undoes __pypperoni_IMPL_enter_frame (or __pypperoni_IMPL_bind_frame)
+       once the callee returns */
+    PyThreadState* tstate = PyThreadState_GET();
+
+    tstate->frame = f->f_back;
+    Py_LeaveRecursiveCall();
+    __pypperoni_IMPL_free_frame(f);
+}
+
+static inline PyObject* __pypperoni_IMPL_load_global_cached(PyFrameObject* f, PyObject* name,
+                                                            __pypperoni_global_cache* cache)
+{
+    /* Same as __pypperoni_IMPL_load_global, but the lookup is skipped if
+       neither globals nor builtins changed since the last one at this
+       site (their version tags match, see PEP 509) */
+    PyDictObject* globals = (PyDictObject*)f->f_globals;
+    PyDictObject* builtins = (PyDictObject*)f->f_builtins;
+    PyObject* v;
+
+    if (!PyDict_CheckExact(globals) || !PyDict_CheckExact(builtins))
+        return __pypperoni_IMPL_load_global(f, name);
+
+    if (cache->value != NULL && cache->globals_version == globals->ma_version_tag &&
+        cache->builtins_version == builtins->ma_version_tag)
+    {
+        Py_INCREF(cache->value);
+        return cache->value;
+    }
+
+    v = __pypperoni_IMPL_load_global(f, name);
+    if (v != NULL)
+    {
+        cache->globals_version = globals->ma_version_tag;
+        cache->builtins_version = builtins->ma_version_tag;
+        cache->value = v;
+    }
+
+    return v;
+}
+
+static inline int __pypperoni_IMPL_builtin_abs(PyObject* v, PyObject** x)
+{
+    *x = PyNumber_Absolute(v);
+    return (*x == NULL) ? 1 : 0;
+}
+
+static inline int __pypperoni_IMPL_builtin_getattr(PyObject* v, PyObject* name, PyObject* dflt, PyObject** x)
+{
+    /* getattr(v, name) or getattr(v, name, dflt) if dflt isn't NULL */
+    if (!PyUnicode_Check(name))
+    {
+        PyErr_SetString(PyExc_TypeError, "getattr(): attribute name must be string");
+        return 1;
+    }
+
+    *x = PyObject_GetAttr(v, name);
+    if (*x == NULL && dflt != NULL && PyErr_ExceptionMatches(PyExc_AttributeError))
+    {
+        PyErr_Clear();
+        Py_INCREF(dflt);
+        *x = dflt;
+    }
+
+    return (*x == NULL) ? 1 : 0;
+}
+
+static inline int __pypperoni_IMPL_builtin_hasattr(PyObject* v, PyObject* name, PyObject** x)
+{
+    PyObject* attr;
+
+    if (!PyUnicode_Check(name))
+    {
+        PyErr_SetString(PyExc_TypeError, "hasattr(): attribute name must be string");
+        return 1;
+    }
+
+    attr = PyObject_GetAttr(v, name);
+    if (attr == NULL)
+    {
+        if (!PyErr_ExceptionMatches(PyExc_AttributeError))
+            return 1;
+
+        PyErr_Clear();
+        *x = Py_False;
+    }
+
+    else
+    {
+        Py_DECREF(attr);
+        *x = Py_True;
+    }
+
+    Py_INCREF(*x);
+    return 0;
+}
+
+static inline int __pypperoni_IMPL_builtin_isinstance(PyObject* v, PyObject* cls, PyObject** x)
+{
+    int res = (Py_TYPE(v) == (PyTypeObject*)cls) ? 1 : PyObject_IsInstance(v, cls);
+
+    if (res < 0)
+        return 1;
+
+    *x = res ? Py_True : Py_False;
+    Py_INCREF(*x);
+    return 0;
+}
+
+static inline int __pypperoni_IMPL_builtin_len(PyObject* v, PyObject** x)
+{
+    Py_ssize_t len = PyObject_Size(v);
+
+    if (len < 0)
+        return 1;
+
+    *x = PyLong_FromSsize_t(len);
+    return (*x == NULL) ? 1 : 0;
+}
+
+static inline int __pypperoni_IMPL_builtin_minmax(PyObject* v, PyObject* w, int op, PyObject** x)
+{
+    /* min(v, w) (op is Py_LT) or max(v, w) (op is Py_GT): w is only
+       picked if it compares strictly better than v */
+    int res = PyObject_RichCompareBool(w, v, op);
+
+    if (res < 0)
+        return 1;
+
+    *x = res ? w : v;
+    Py_INCREF(*x);
+    return 0;
+}
+
+static inline int __pypperoni_IMPL_builtin_max(PyObject* v, PyObject* w, PyObject** x)
+{
+    return __pypperoni_IMPL_builtin_minmax(v, w, Py_GT, x);
+}
+
+static inline int __pypperoni_IMPL_builtin_min(PyObject* v, PyObject* w, PyObject** x)
+{
+    return __pypperoni_IMPL_builtin_minmax(v, w, Py_LT, x);
+}
+
+static inline int __pypperoni_IMPL_builtin_type(PyObject* v, PyObject** x)
+{
+    *x = (PyObject*)Py_TYPE(v);
+    Py_INCREF(*x);
+    return 0;
+}
+
 void setup_pypperoni();
 int __pypperoni_IMPL_main(int argc, char* argv[]);
 
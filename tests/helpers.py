@@ -0,0 +1,219 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+'''
+Compiles Python snippets through Pypperoni for the tests and, if a C
+compiler and Python 3.6 headers and library are available, runs them
+and compares their output with CPython's.
+
+Pypperoni reads CPython 3.6 bytecode, so the code generator runs under
+the interpreter given by the PYPPERONI_TEST_PYTHON environment variable
+(or python3.6 from PATH). Tests are skipped if there's none.
+'''
+
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import textwrap
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SUPPORT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'support')
+
+# Configurations every program is run under: the default one, and the
+# stack-only code generator splitting code into tiny chunks
+CONFIGS = (
+    {},
+    {'REGISTER_CODEGEN': False, 'SPLIT_INTERVAL': 12},
+)
+
+TIMEOUT = 600
+
+
+def find_python():
+    for python in (os.environ.get('PYPPERONI_TEST_PYTHON'), shutil.which('python3.6')):
+        if not python:
+            continue
+
+        try:
+            out = subprocess.check_output([python, '-c', 'import sys; print(sys.version_info[:2])'],
+                                          stderr=subprocess.DEVNULL, universal_newlines=True)
+
+        except (OSError, subprocess.CalledProcessError):
+            continue
+
+        if out.strip() == '(3, 6)':
+            return python
+
+    return None
+
+
+PYTHON = find_python()
+
+_build_info = None
+
+
+def get_build_info():
+    '''
+    Returns the paths needed to build and run programs against PYTHON,
+    or None if it has no headers or library to link with or there's no
+    C compiler.
+    '''
+    global _build_info
+    if _build_info is None:
+        _build_info = {}
+        cc = os.environ.get('CC') or shutil.which('gcc') or shutil.which('cc')
+        if PYTHON and cc:
+            script = ('import json, sys, sysconfig; v = sysconfig.get_config_var; '
+                      'print(json.dumps([v("INCLUDEPY"), v("LIBDIR"), v("LDVERSION"), '
+                      'v("LIBS"), v("SYSLIBS"), sys.prefix]))')
+            info = json.loads(subprocess.check_output([PYTHON, '-c', script],
+                                                      universal_newlines=True))
+            include, libdir, ldversion, libs, syslibs, prefix = info
+            if os.path.isfile(os.path.join(include, 'Python.h')) and libdir:
+                _build_info = {'cc': cc, 'include': include, 'libdir': libdir,
+                               'lib': 'python' + ldversion, 'prefix': prefix,
+                               'libs': ('%s %s' % (libs or '', syslibs or '')).split()}
+
+    return _build_info or None
+
+
+# A stock CPython 3.6 has no co_meth_ptr (see support/harness.h)
+_METH_PTR_CHECK = re.compile(r'\(\(PyCodeObject\*\)PyFunction_GET_CODE\((\w+)\)\)->co_meth_ptr == &(\w+)')
+_METH_PTR_STORE = re.compile(r'([\w>-]+)->co_meth_ptr = (&?\w+);')
+
+
+def _patch_meth_ptr(code):
+    code = _METH_PTR_CHECK.sub(r'__harness_lookup((PyCodeObject*)PyFunction_GET_CODE(\1)) == '
+                               r'(__harness_methptr)\2', code)
+    return _METH_PTR_STORE.sub(r'__harness_register((PyCodeObject*)\1, (void*)\2);', code)
+
+
+class CodegenTestCase(unittest.TestCase):
+    '''
+    Base class of the tests. generate() returns the C code generated for
+    a snippet; assertSameOutput() also builds and runs it under every
+    configuration in CONFIGS and compares its output with CPython's.
+    '''
+
+    def setUp(self):
+        if PYTHON is None:
+            self.skipTest('no Python 3.6 interpreter (set PYPPERONI_TEST_PYTHON)')
+
+        self.tmpdir = tempfile.mkdtemp(prefix='pypperoni-test-')
+        self.addCleanup(shutil.rmtree, self.tmpdir, True)
+        self.__count = 0
+
+    def __generate(self, source, config):
+        self.__count += 1
+        outdir = os.path.join(self.tmpdir, str(self.__count))
+        os.makedirs(outdir)
+        filename = os.path.join(outdir, 'testmod.py')
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(textwrap.dedent(source))
+
+        proc = subprocess.run([PYTHON, os.path.join(SUPPORT, 'generate.py'), filename, outdir,
+                               json.dumps(config)],
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              universal_newlines=True, timeout=TIMEOUT)
+        if proc.returncode != 0:
+            self.fail('code generation failed:\n' + proc.stderr)
+
+        return outdir, filename, proc.stdout.split()
+
+    def generate(self, source, **config):
+        '''
+        Generates the C code of source (with the given config.py
+        overrides) and returns it.
+        '''
+        _, _, cfiles = self.__generate(source, config)
+        code = []
+        for cfile in cfiles:
+            with open(cfile, encoding='utf-8') as f:
+                code.append(f.read())
+
+        return '\n'.join(code)
+
+    def __build(self, outdir, cfiles, info):
+        srcdir = os.path.join(outdir, 'src')
+        os.makedirs(srcdir)
+        shutil.copy(os.path.join(ROOT, 'src', 'pypperoni_impl.h'), srcdir)
+        with open(os.path.join(ROOT, 'src', 'pypperoni_impl.c'), encoding='utf-8') as f:
+            impl = f.read().replace('co->co_meth_ptr = mod->ptr;',
+                                    '__harness_register(co, (void*)mod->ptr);')
+
+        sources = [os.path.join(srcdir, 'pypperoni_impl.c'), os.path.join(SUPPORT, 'harness.c')]
+        with open(sources[0], 'w', encoding='utf-8') as f:
+            f.write(impl)
+
+        for cfile in cfiles:
+            with open(cfile, encoding='utf-8') as f:
+                code = f.read()
+
+            with open(cfile, 'w', encoding='utf-8') as f:
+                f.write(_patch_meth_ptr(code))
+
+            sources.append(cfile)
+
+        binary = os.path.join(outdir, 'testmod')
+        command = [info['cc'], '-O1', '-w', '-fcommon', '-DPy_BUILD_CORE', '-DNDEBUG',
+                   '-include', os.path.join(SUPPORT, 'harness.h'),
+                   '-I' + os.path.join(outdir, 'gen'), '-I' + srcdir, '-I' + info['include'],
+                   '-o', binary] + sources + ['-L' + info['libdir'], '-l' + info['lib'],
+                                              '-lm'] + info['libs']
+        proc = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                              universal_newlines=True, timeout=TIMEOUT)
+        if proc.returncode != 0:
+            self.fail('C compilation failed:\n' + proc.stdout)
+
+        return binary
+
+    def __run(self, command, env=None):
+        environ = dict(os.environ, PYTHONIOENCODING='utf-8', **(env or {}))
+        proc = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              universal_newlines=True, timeout=TIMEOUT, env=environ)
+        return proc.returncode, proc.stdout, proc.stderr
+
+    def assertSameOutput(self, source):
+        '''
+        Compiles and runs source under every configuration in CONFIGS and
+        checks that it prints the same as CPython. The snippet must not
+        raise (print caught exceptions instead).
+        '''
+        info = get_build_info()
+        if info is None:
+            self.skipTest('no C compiler or Python 3.6 headers and library')
+
+        expected = None
+        for config in CONFIGS:
+            with self.subTest(config=config):
+                outdir, filename, cfiles = self.__generate(source, config)
+                if expected is None:
+                    # Pypperoni compiles modules with optimize=2
+                    code, expected, err = self.__run([PYTHON, '-OO', filename])
+                    self.assertEqual(code, 0, 'CPython failed:\n' + err)
+
+                binary = self.__build(outdir, cfiles, info)
+                env = {'PYTHONHOME': info['prefix'],
+                       'LD_LIBRARY_PATH': os.pathsep.join(filter(None, [
+                           info['libdir'], os.environ.get('LD_LIBRARY_PATH')]))}
+                code, out, err = self.__run([binary], env)
+                self.assertEqual(code, 0, 'compiled program failed:\n' + err)
+                self.assertEqual(out, expected)
@@ -0,0 +1,75 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+'''
+Generates the C code of a single module for the tests (see helpers.py).
+Runs under Python 3.6, since Pypperoni reads its bytecode.
+
+usage: generate.py <source.py> <outdir> <config overrides as JSON>
+'''
+
+import importlib.util
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def load_pypperoni():
+    # The checkout isn't necessarily named "pypperoni"
+    spec = importlib.util.spec_from_file_location('pypperoni', os.path.join(ROOT, '__init__.py'),
+                                                  submodule_search_locations=[ROOT])
+    package = importlib.util.module_from_spec(spec)
+    sys.modules['pypperoni'] = package
+    spec.loader.exec_module(package)
+
+
+def main(source, outdir, overrides):
+    load_pypperoni()
+
+    # module.py copies these at import time
+    from pypperoni import config
+    for name, value in json.loads(overrides).items():
+        setattr(config, name, value)
+
+    from pypperoni.module import Module, BuiltinModule, write_modules_file
+    from pypperoni.files import FileContainer, ConditionalFile
+    from pypperoni.cmake import CMakeFileGenerator
+
+    os.makedirs(os.path.join(outdir, 'gen', 'modules'), exist_ok=True)
+    with open(source, encoding='utf-8') as f:
+        module = Module('testmod', f.read())
+
+    module.set_as_main()
+    modules = {'testmod': module}
+    for name in ('encodings', 'codecs_index'):
+        modules[name] = BuiltinModule(name)
+
+    f = FileContainer(os.path.join(outdir, 'gen', 'modules', 'testmod'), CMakeFileGenerator.hash_file)
+    module.generate_c_code(f, modules)
+    filenames = [result[0] for result in f.close()]
+
+    f = ConditionalFile(os.path.join(outdir, 'gen', 'modules.I'), CMakeFileGenerator.hash_file)
+    write_modules_file(f, modules)
+    f.close()
+
+    print('\n'.join(filename for filename in filenames if filename.endswith('.c')))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
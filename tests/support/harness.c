@@ -0,0 +1,102 @@
+/* Entry point of the test programs (see helpers.py): runs the compiled
+   "testmod" module on a stock CPython 3.6, dispatching frames of
+   compiled code objects to their generated functions through the
+   interpreter's eval_frame hook. */
+
+#include "pypperoni_impl.h"
+
+static PyObject** codes;
+static __harness_methptr* funcs;
+static int numcodes, capacity;
+
+void __harness_register(PyCodeObject* co, void* fn)
+{
+    int i;
+
+    for (i = 0; i < numcodes; i++) {
+        if (codes[i] == (PyObject*)co) {
+            funcs[i] = (__harness_methptr)fn;
+            return;
+        }
+    }
+
+    if (numcodes == capacity) {
+        capacity = capacity ? capacity * 2 : 64;
+        codes = realloc(codes, capacity * sizeof(PyObject*));
+        funcs = realloc(funcs, capacity * sizeof(__harness_methptr));
+    }
+
+    /* Keep the code object alive so its address is never reused */
+    Py_INCREF(co);
+    codes[numcodes] = (PyObject*)co;
+    funcs[numcodes++] = (__harness_methptr)fn;
+}
+
+__harness_methptr __harness_lookup(PyCodeObject* co)
+{
+    int i;
+
+    for (i = numcodes - 1; i >= 0; i--) {
+        if (codes[i] == (PyObject*)co)
+            return funcs[i];
+    }
+
+    return NULL;
+}
+
+static PyObject* eval_frame(PyFrameObject* f, int throwflag)
+{
+    __harness_methptr fn = __harness_lookup(f->f_code);
+    PyThreadState* tstate = PyThreadState_GET();
+    PyObject* result;
+
+    if (fn == NULL)
+        return _PyEval_EvalFrameDefault(f, throwflag);
+
+    if (Py_EnterRecursiveCall(""))
+        return NULL;
+
+    tstate->frame = f;
+    result = fn(f);
+    tstate->frame = f->f_back;
+    Py_LeaveRecursiveCall();
+    return result;
+}
+
+#undef PyCode_New
+PyCodeObject* __harness_PyCode_New(int argcount, int kwonlyargcount, int nlocals,
+                                   int stacksize, int flags, PyObject* code,
+                                   PyObject* consts, PyObject* names,
+                                   PyObject* varnames, PyObject* freevars,
+                                   PyObject* cellvars, PyObject* filename,
+                                   PyObject* name, int firstlineno,
+                                   PyObject* lnotab)
+{
+    PyCodeObject* co;
+    PyObject* empty_bytes = PyBytes_FromString("");
+    PyObject* empty_tuple = PyTuple_New(0);
+
+    co = PyCode_New(argcount, kwonlyargcount, nlocals, stacksize, flags,
+                    code ? code : empty_bytes, consts ? consts : empty_tuple,
+                    names ? names : empty_tuple, varnames, freevars, cellvars,
+                    filename, name, firstlineno, lnotab);
+    Py_DECREF(empty_bytes);
+    Py_DECREF(empty_tuple);
+    return co;
+}
+
+int main(int argc, char** argv)
+{
+    int ret = 0;
+
+    Py_Initialize();
+    __pypperoni_IMPL_init_builtins();
+    PyThreadState_GET()->interp->eval_frame = eval_frame;
+    if (__pypperoni_IMPL_import(0) == NULL) {
+        PyErr_Print();
+        ret = 1;
+    }
+
+    PyRun_SimpleString("import sys; sys.stdout.flush(); sys.stderr.flush()");
+    return ret;
+}
@@ -0,0 +1,26 @@
+/* Included before everything else when building the tests (see
+   helpers.py). A stock CPython 3.6 has no co_meth_ptr in its code
+   objects, so the tests map code objects to their generated functions
+   through a table instead. */
+
+#include <Python.h>
+#include <frameobject.h>
+
+typedef PyObject* (*__harness_methptr)(PyFrameObject*);
+
+void __harness_register(PyCodeObject* co, void* fn);
+__harness_methptr __harness_lookup(PyCodeObject* co);
+
+/* Stock PyCode_New rejects NULL code, consts and names */
+PyCodeObject* __harness_PyCode_New(int argcount, int kwonlyargcount, int nlocals,
+                                   int stacksize, int flags, PyObject* code,
+                                   PyObject* consts, PyObject* names,
+                                   PyObject* varnames, PyObject* freevars,
+                                   PyObject* cellvars, PyObject* filename,
+                                   PyObject* name, int firstlineno,
+                                   PyObject* lnotab);
+#define PyCode_New __harness_PyCode_New
+
+/* Stock frames keep block handlers in an int, too small for a label
+   address, so jump through the generated jump tables instead */
+#undef HAVE_COMPUTED_GOTOS
@@ -0,0 +1,67 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from helpers import CodegenTestCase
+
+
+class ArithmeticTests(CodegenTestCase):
+    def test_codegen(self):
+        code = self.generate('''
+            def f(a, b):
+                return a + b, a - b, a * b, a // b, a % b, a < b, a >= b
+        ''')
+        self.assertIn('__pypperoni_IMPL_binary_add', code)
+        self.assertIn('__pypperoni_IMPL_binary_multiply', code)
+        self.assertIn('__pypperoni_IMPL_binary_floor_divide', code)
+        self.assertIn('__pypperoni_IMPL_compare(', code)
+
+    def test_output(self):
+        self.assertSameOutput('''
+        import math
+        def run():
+            vals = [0, 1, -1, 7, -7, 3, -3, 2**30 - 1, -(2**30 - 1), 2**30, 2**40, -2**62,
+                    0.0, -0.0, 1.5, -1.5, 2.25, -7.0, 1e300, float('inf'), float('-inf'), float('nan'), True, False]
+            out = []
+            for a in vals:
+                for b in vals:
+                    row = []
+                    for name, fn in (('add', lambda a, b: a + b), ('sub', lambda a, b: a - b),
+                                     ('mul', lambda a, b: a * b), ('fd', lambda a, b: a // b),
+                                     ('mod', lambda a, b: a % b)):
+                        try:
+                            r = fn(a, b)
+                            row.append(repr(r) + type(r).__name__)
+                        except Exception as e:
+                            row.append(type(e).__name__)
+                    row.append((a < b, a <= b, a == b, a != b, a > b, a >= b))
+                    x = a
+                    try:
+                        x += b; x -= b; x *= b; x //= b; x %= b
+                    except Exception as e:
+                        x = type(e).__name__
+                    row.append(repr(x))
+                    out.append(row)
+            for r in out:
+                print(r)
+            s = 0
+            f = 0.0
+            for i in range(1000):
+                s = (s + i * 3) % 1009
+                f = f * 0.5 + i
+            print(s, f, '%s-%d' % ('a', 3), 'x' + 'y')
+        run()
+        ''')
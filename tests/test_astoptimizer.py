@@ -0,0 +1,152 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from helpers import CodegenTestCase
+
+
+class ASTOptimizerTests(CodegenTestCase):
+    def test_codegen(self):
+        code = self.generate('''
+            X = 2 * (3 + 4) - 1
+            def f(x):
+                if False:
+                    print('dead')
+                return x in [1, 2, 3]
+        ''')
+        self.assertNotIn("'dead'", code)
+
+    def test_empty_finalbody(self):
+        code = self.generate('''
+            def f():
+                try:
+                    print('body')
+                finally:
+                    pass
+                try:
+                    print('body')
+                finally:
+                    if False:
+                        print('dead')
+        ''')
+
+    def test_output(self):
+        self.assertSameOutput('''
+        import typing
+        from typing import TYPE_CHECKING
+        if TYPE_CHECKING:
+            import nonexistent_module
+        if typing.TYPE_CHECKING:
+            import other_nonexistent
+        """not a docstring position"""
+        X = 2 * (3 + 4) - 1
+        Y = ('a' + 'b') * 3, 'xyz'[1], 'hello'[1:4], (1, 2) + (3,)
+        Z = not 0, -(-5), ~7, 1 < 2 < 3, 1 < 2 > 5, 'a' in 'abc', 2 ** 10, 1 << 3
+        B = True and 5, False or 'x', 0 and 7, None or 0 or 4
+        def f(x):
+            """doc"""
+            if __debug__:
+                print('debug')
+            if False:
+                y = 1
+            if 0:
+                pass
+            else:
+                print('else taken')
+            while 0:
+                print('never')
+            else:
+                print('while else')
+            1
+            ...
+            'str'
+            return x in [1, 2, 3], x in {4, 5}, x not in (6, 7), [x in [[1]]], 3 if True else 4
+        def g():
+            if False:
+                z = 1
+            try:
+                return z
+            except UnboundLocalError:
+                return 'UBE'
+        def h(x):
+            for i in [1, 2, x]:
+                pass
+            for i in [1, 2, 3]:
+                x += i
+            return x, [1] in [[1], 2], 2 ** 1000 > 0, 'ab' * 3
+        class C:
+            'cdoc'
+            if False:
+                attr = 1
+            pass
+        print(X, Y, Z, B)
+        print(f(1), f(5), f(9), f.__doc__, g(), h(1), C.__doc__, hasattr(C, 'attr'))
+        print(__debug__)
+        ''')
+
+    def test_empty_finalbody_output(self):
+        self.assertSameOutput('''
+        def f():
+            try:
+                print('body')
+            finally:
+                pass
+            try:
+                print('body 2')
+            finally:
+                if False:
+                    print('dead')
+            try:
+                return 'ret'
+            finally:
+                while 0:
+                    pass
+
+        try:
+            pass
+        finally:
+            pass
+        print(f())
+        ''')
+
+    def test_nested_class_output(self):
+        self.assertSameOutput('''
+        def outer():
+            x = 'outer'
+            class Inner:
+                if False:
+                    x = 1
+                try:
+                    y = x
+                except NameError as e:
+                    y = 'NameError'
+            return Inner.y
+
+        def outer2():
+            x = 'outer'
+            class Inner:
+                if True:
+                    pass
+                else:
+                    x = 1
+                try:
+                    y = x
+                except NameError:
+                    y = 'NameError'
+            return Inner.y
+
+        print(outer(), outer2())
+        ''')
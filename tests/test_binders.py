@@ -0,0 +1,151 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from helpers import CodegenTestCase
+
+
+class BinderTests(CodegenTestCase):
+    def test_codegen(self):
+        code = self.generate('''
+            def kw(a, b=2, *, c=3):
+                return a, b, c
+
+            def f():
+                return kw(1, c=4)
+        ''')
+        self.assertIn('__pypperoni_IMPL_set_binder(', code)
+        self.assertIn('__pypperoni_IMPL_bind_frame(', code)
+        self.assertIn('_bind(PyObject* func', code)
+
+    def test_output(self):
+        self.assertSameOutput('''
+        def f(a, b=2, *, c, d=4):
+            return (a, b, c, d)
+
+        def g(*args, **kw):
+            return (args, sorted(kw.items()))
+
+        def h(a, b, *rest, key=None, **extra):
+            return (a, b, rest, key, sorted(extra.items()))
+
+        def simple(a, b):
+            return a + b
+
+        def defs(a, b=10, c=20):
+            return a + b + c
+
+        def outer(x):
+            def inner(y, z=1, *, w=x):
+                return x + y + z + w
+            r = [inner(1), inner(1, 2), inner(y=3), inner(1, w=100), inner(z=5, y=6)]
+            def cellarg(p, q=2):
+                def get():
+                    return p * q
+                return get()
+            r.append(cellarg(3))
+            r.append(cellarg(q=5, p=7))
+            return r
+
+        def err(fn, *a, **k):
+            try:
+                fn(*a, **k)
+            except TypeError as e:
+                return str(e)
+
+        print(f(1, c=3))
+        print(f(1, 5, c=3, d=9))
+        print(f(a=1, c=2))
+        print(f(c=1, a=2, b=3))
+        print(g())
+        print(g(1, 2, x=3))
+        print(g(x=1, y=2))
+        print(h(1, 2))
+        print(h(1, 2, 3, 4, key=5, z=6))
+        print(h(b=1, a=2, q=3))
+        print(simple(1, 2), simple(b=1, a=2), simple(1, b=5))
+        print(defs(1), defs(1, 2), defs(1, c=5), defs(c=1, a=2))
+        defs.__defaults__ = (100, 200)
+        print(defs(1), defs(1, c=5))
+        defs.__defaults__ = None
+        try:
+            defs(1)
+        except TypeError as e:
+            print(e)
+        print(outer(10))
+        for i in range(3):
+            print(f(i, c=i * 2))
+
+        try:
+            f(1)
+        except TypeError as e:
+            print(e)
+        try:
+            f(1, c=2, e=3)
+        except TypeError as e:
+            print(e)
+        try:
+            f(1, 2, 3, c=4)
+        except TypeError as e:
+            print(e)
+        try:
+            f(1, a=2, c=3)
+        except TypeError as e:
+            print(e)
+        try:
+            simple(1, 2, 3)
+        except TypeError as e:
+            print(e)
+        try:
+            simple(1, c=2)
+        except TypeError as e:
+            print(e)
+        try:
+            h(1)
+        except TypeError as e:
+            print(e)
+
+        name = ''.join(['c'])
+        print(f(1, **{name: 7}))
+        print(h(1, 2, **{''.join(['k', 'ey']): 9}))
+
+        fs = [f, g, h, simple]
+        print(fs[0](1, c=2), fs[1](3, z=1), fs[3](b=2, a=1))
+
+        class K:
+            def m(self, a, b=3, **kw):
+                return (a, b, sorted(kw))
+        k = K()
+        print(k.m(1), k.m(1, b=2, c=3), K.m(k, a=4))
+
+        def rec(n, acc=0):
+            if n == 0:
+                return acc
+            return rec(n - 1, acc=acc + n)
+        print(rec(50))
+
+        def kwonly(*, x):
+            return x
+        print(kwonly(x=1))
+        try:
+            kwonly()
+        except TypeError as e:
+            print(e)
+        try:
+            kwonly(1)
+        except TypeError as e:
+            print(e)
+        ''')
@@ -0,0 +1,113 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from helpers import CodegenTestCase
+
+
+class BuiltinCallTests(CodegenTestCase):
+    def test_codegen(self):
+        code = self.generate('''
+            counter = 0
+
+            def f(xs):
+                return len(xs), isinstance(xs, list), counter
+        ''')
+        self.assertIn('__pypperoni_IMPL_builtin_len(', code)
+        self.assertIn('global_cache_', code)
+
+    def test_output(self):
+        self.assertSameOutput('''
+        import sys, builtins
+
+        class A:
+            x = 1
+            def __len__(self):
+                return 7
+
+        class B(A):
+            pass
+
+        class Meta(type):
+            def __instancecheck__(cls, inst):
+                return inst == 'magic'
+
+        class M(metaclass=Meta):
+            pass
+
+        class Cmp:
+            def __init__(self, v): self.v = v
+            def __lt__(self, o): return self.v < o.v
+            def __gt__(self, o): return self.v > o.v
+            def __repr__(self): return 'Cmp(%d)' % self.v
+
+        def f(x, o):
+            return (len(x), isinstance(x, list), isinstance(o, A), isinstance(o, (int, B)),
+                    getattr(o, 'x'), getattr(o, 'y', 'dflt'), hasattr(o, 'x'), hasattr(o, 'nope'),
+                    abs(-3), abs(-2.5), min(3, 1), max(3, 1), type(x).__name__, type(o).__name__)
+
+        print(f([1, 2], A()))
+        print(f('abc', B()))
+        print(f({1: 2}, B))
+        print(isinstance('magic', M), isinstance('x', M))
+        a, b = Cmp(1), Cmp(1)
+        print(min(a, b) is a, max(a, b) is a, min(Cmp(2), Cmp(1)), max(Cmp(2), Cmp(5)))
+        print(min(1, 1.0), max(1, 1.0), min(1.0, 1), type(min(True, 1)))
+
+        def errs():
+            out = []
+            for call in (lambda: len(5), lambda: getattr(1, 2), lambda: hasattr(1, 2), lambda: abs('x'),
+                         lambda: min(1, 'a'), lambda: isinstance(1, 2), lambda: getattr(1, 'zz')):
+                try:
+                    out.append(call())
+                except Exception as e:
+                    out.append((type(e).__name__, str(e)))
+            return out
+        for e in errs():
+            print(e)
+
+        def uses_len(x):
+            return len(x)
+
+        print(uses_len([1]))
+        _len = builtins.len
+        builtins.len = lambda x: 'patched'
+        print(uses_len([1]))
+        del builtins.len
+        builtins.len = _len
+        print(uses_len([1, 2]))
+
+        def glob():
+            return counter
+        counter = 1
+        print(glob())
+        counter = 2
+        print(glob())
+        def shadow(x):
+            return abs(x)
+        print(shadow(-1))
+        abs = lambda x: 'mine'
+        print(shadow(-1))
+        del abs
+        print(shadow(-1))
+
+        def leak():
+            return A
+        before = sys.getrefcount(A)
+        for i in range(1000):
+            leak()
+        print(sys.getrefcount(A) - before)
+        ''')
@@ -0,0 +1,185 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from helpers import CodegenTestCase
+
+
+class CodeObjectTests(CodegenTestCase):
+    def test_codegen(self):
+        code = self.generate('''
+            def make_adder(n):
+                def add(x):
+                    return x + n
+                return add
+        ''')
+        self.assertIn('static PyCodeObject* sitecode = NULL;', code)
+        self.assertIn('if (sitecode == NULL) {', code)
+
+    def test_output(self):
+        self.assertSameOutput('''
+        import sys
+
+        class Vec:
+            def __init__(self, x, y):
+                self.x = x
+                self.y = y
+            def add(self, other):
+                return Vec(self.x + other.x, self.y + other.y)
+            def __repr__(self):
+                return 'Vec(%r, %r)' % (self.x, self.y)
+            @staticmethod
+            def zero():
+                return Vec(0, 0)
+            @classmethod
+            def unit(cls):
+                return cls(1, 1)
+
+        def kw(a, b=2, *args, c=3, **kw):
+            return (a, b, args, c, sorted(kw.items()))
+
+        def fib(n):
+            if n < 2:
+                return n
+            return fib(n - 1) + fib(n - 2)
+
+        def make_adder(n):
+            def add(x):
+                return x + n
+            return add
+
+        def gen(n):
+            for i in range(n):
+                yield i * i
+            return 'done'
+
+        def outer():
+            total = 0
+            for i in range(3):
+                f = lambda y: y + i
+                total += f(10)
+            return total
+
+        v = Vec(1, 2).add(Vec.unit()).add(Vec.zero())
+        print(v)
+        print(kw(1), kw(1, 5, 6, 7, c=9, z=1), kw(a=4, b=5))
+        print(fib(15))
+        print(make_adder(3)(4))
+        print(list(gen(5)))
+        print(outer())
+        l = []
+        l.append(1); l.extend([2, 3]); l.sort(reverse=True)
+        print(l, 'a,b'.split(','), ' x '.strip())
+        g = gen(2)
+        print(next(g), next(g))
+        try:
+            next(g)
+        except StopIteration as e:
+            print('stop', e.value)
+
+        def tryit(x):
+            try:
+                if x == 0:
+                    raise KeyError(x)
+                elif x == 1:
+                    return 'one'
+                return 1 / (x - 2)
+            except KeyError:
+                return 'key'
+            except ZeroDivisionError as e:
+                return 'zero'
+            finally:
+                print('finally', x)
+
+        for i in range(4):
+            print(tryit(i))
+
+        def loops():
+            out = []
+            for i in range(10):
+                if i == 2:
+                    continue
+                if i == 7:
+                    break
+                try:
+                    if i == 4:
+                        continue
+                    out.append(i)
+                finally:
+                    out.append(-i)
+            else:
+                out.append('else')
+            while True:
+                out.append('w')
+                break
+            return out
+        print(loops())
+
+        class Ctx:
+            def __enter__(self):
+                print('enter')
+                return self
+            def __exit__(self, *a):
+                print('exit', a[0])
+                return True
+        with Ctx() as c:
+            raise ValueError
+        print('after with')
+
+        import asyncio
+        async def co(n):
+            await asyncio.sleep(0)
+            return n * 2
+        async def main():
+            r = []
+            for i in range(3):
+                r.append(await co(i))
+            return r
+        loop = asyncio.new_event_loop()
+        print(loop.run_until_complete(main()))
+        loop.close()
+
+        def agen_test():
+            async def agen():
+                for i in range(3):
+                    yield i
+            async def run():
+                return [x async for x in agen()]
+            l = asyncio.new_event_loop()
+            try:
+                return l.run_until_complete(run())
+            finally:
+                l.close()
+        print(agen_test())
+        print({k: v for k, v in zip('abc', range(3))}, {x % 3 for x in range(10)}, sum(x for x in range(10)))
+        a, *b, c = range(6)
+        print(a, b, c)
+        print(isinstance(v, Vec), len([1, 2]), getattr(v, 'x'), getattr(v, 'q', 'dflt'), hasattr(v, 'y'), abs(-3), min(2, 5), max(2, 5), type(v).__name__)
+        print(not v, not 0, 3 is 3, v is not None, None == v)
+
+        def site():
+            fs = []
+            for i in range(3):
+                def f(x=i):
+                    return x
+                fs.append(f)
+            g = lambda: 0
+            return fs, g
+        fs, g = site()
+        fs2, g2 = site()
+        print([f() for f in fs], fs[0] is fs[1], fs[0].__code__ is fs[1].__code__,
+              fs[0].__code__ is fs2[0].__code__, g.__code__ is fs[0].__code__)
+        ''')
@@ -0,0 +1,81 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from helpers import CodegenTestCase
+
+
+class ComprehensionTests(CodegenTestCase):
+    def test_codegen(self):
+        code = self.generate('''
+            def f(xs, k):
+                return [x * 2 for x in xs], {x: x + k for x in xs if x > 1}
+        ''')
+        self.assertRegex(code, r'inline_\d+_end:')
+        # Only f's code object is created
+        self.assertEqual(code.count('static PyCodeObject* sitecode'), 1)
+
+    def test_output(self):
+        self.assertSameOutput('''
+        def f(xs, k):
+            a = [x * 2 for x in xs]
+            b = {x % 3 for x in xs}
+            c = {x: x + k for x in xs if x > 1}
+            d = [[y + x for y in range(x)] for x in xs]
+            e = [x for x in xs for z in range(2) if z]
+            g = sum(x for x in xs)
+            h = [(lambda q: q + 1)(x) for x in xs]
+            return a, sorted(b), c, d, e, g, h
+        print(f([1, 2, 3, 4], 10))
+        def err(xs):
+            try:
+                return [1 / x for x in xs]
+            except ZeroDivisionError as e:
+                return 'zde'
+        print(err([1, 2, 0, 3]))
+        def nested_err(xs):
+            out = []
+            for i in range(3):
+                try:
+                    out.append([int(x) for x in xs[i:]])
+                except ValueError:
+                    out.append('bad')
+            return out
+        print(nested_err(['1', 'x', '3']))
+        def closure(n):
+            m = n * 2
+            return [x + m + n for x in range(3)]
+        print(closure(5))
+        class C:
+            v = 3
+            lst = [i * 2 for i in range(4)]
+        print(C.lst)
+        mod = [i for i in range(5) if i % 2]
+        print(mod, [i for i in 'abc'], {i: j for i, j in [(1, 2), (3, 4)]})
+        def cellcomp(xs):
+            return [lambda: x for x in xs]
+        print([g() for g in cellcomp([1, 2])])
+        def method_in(xs):
+            return [s.upper() for s in xs]
+        print(method_in(['a', 'b']))
+        def big(n):
+            return sum([i * i for i in range(n)])
+        print(big(1000))
+        try:
+            [1 for x in 5]
+        except TypeError as e:
+            print(e)
+        ''')
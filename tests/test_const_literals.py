@@ -0,0 +1,115 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from helpers import CodegenTestCase
+
+
+class ConstLiteralTests(CodegenTestCase):
+    def test_codegen(self):
+        code = self.generate('''
+            def f():
+                return [1, 2, 3], {'a': 1, 'b': 2}, {'a': [1, 2], 'b': {'c': 3}}
+        ''')
+        self.assertIn('PyList_GetSlice(', code)
+        self.assertIn('PyDict_Copy(', code)
+        self.assertIn('__pypperoni_IMPL_copy_const(', code)
+
+    def test_output(self):
+        self.assertSameOutput('''
+        def mk():
+            return [1, 2, 3]
+
+        a = mk(); b = mk()
+        a.append(4)
+        print(a, b, a is b)
+
+        TABLE = {
+            'sword': {'id': 1, 'dmg': [3, 5], 'tags': {'melee', 'metal'}},
+            'bow': {'id': 2, 'dmg': [1, 8], 'tags': {'ranged'}},
+            'staff': {'id': 3, 'dmg': [2, 2], 'tags': set(), 'extra': None},
+        }
+        print(sorted(TABLE))
+        print(list(TABLE), list(TABLE['sword']))
+        print(TABLE['sword']['dmg'], sorted(TABLE['sword']['tags']))
+
+        def table():
+            return {'a': [1, 2], 'b': {'c': [3]}}
+
+        t1 = table(); t2 = table()
+        t1['a'].append(9); t1['b']['c'].append(7); t1['b']['d'] = 1
+        print(t1, t2)
+
+        def consts():
+            s = {1, 2, 3, 1.0, True}
+            d = {1: 'a', 1.0: 'b', True: 'c', 2: 'd'}
+            m = {'x': 1, 'y': 2, 'z': 3}
+            t = ((1, 2), [3])
+            n = [[1, 2], [3, 4], (5, 6)]
+            return s, d, m, t, n
+
+        r1 = consts(); r2 = consts()
+        print(r1)
+        r1[0].add(10); r1[2]['w'] = 0; r1[3][1].append(4); r1[4][0].append(0)
+        print(r2)
+        print(list(r1[2]), list(r2[2]))
+
+        def keyorder(v):
+            return {'first': v, 'second': v + 1, 'third': v + 2}
+
+        print(list(keyorder(1).items()))
+
+        def mixed(v):
+            return [1, 2, v, [3, 4], {'k': [5]}]
+
+        print(mixed(0), mixed(1))
+
+        def unhashable():
+            try:
+                return {[1]: 2}
+            except TypeError as e:
+                return str(e)
+
+        print(unhashable())
+
+        def settest():
+            try:
+                return {1, [2]}
+            except TypeError as e:
+                return str(e)
+
+        print(settest())
+
+        def loop():
+            out = []
+            for i in range(3):
+                x = [i, [1, 2], {'a': 1}]
+                x[1].append(i)
+                x[2][i] = i
+                out.append(x)
+            return out
+
+        print(loop())
+
+        def cond(f):
+            return [1, 2] if f else {'a': (1, 2), 'b': frozenset([1])}
+
+        print(cond(1), cond(0))
+        big = [{'id': i, 'name': 'n', 'vals': [1, 2, 3]} for i in range(2)]
+        print(big)
+        print([1, 2, 3] == [1, 2, 3], {'a': 1} == {'a': 1})
+        print(type([(1, 2)][0]), [('a', 'b'), ('c',)])
+        ''')
@@ -0,0 +1,44 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from helpers import CodegenTestCase
+
+
+class DictDisplayTests(CodegenTestCase):
+    def test_codegen(self):
+        code = self.generate('''
+            def f(x, y):
+                return {'a': x, 'b': y}
+        ''')
+        self.assertIn('v = PyTuple_GET_ITEM(x, 0);', code)
+        self.assertIn('w = PEEK(2);', code)
+
+    def test_output(self):
+        self.assertSameOutput('''
+        def f(x, y, z):
+            return {'a': x, 'b': y, 'c': z}
+
+        def g(x, y):
+            return {'a': x, 'b': y, 'a': 3}
+
+        def h(x, y, z):
+            return {1: x, True: y, 1.0: z}
+
+        for i in range(3):
+            print(f(i, [i], str(i)), g(i, None), h('x', 'y', i))
+        print(list(f(1, 2, 3)), list(g(1, 2).items()))
+        ''')
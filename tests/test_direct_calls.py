@@ -0,0 +1,80 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from helpers import CodegenTestCase
+
+
+class DirectCallTests(CodegenTestCase):
+    def test_codegen(self):
+        code = self.generate('''
+            def add(a, b):
+                return a + b
+
+            def f(x):
+                return add(x, 1)
+        ''')
+        self.assertIn('__pypperoni_IMPL_enter_frame(&stack_pointer, 2)', code)
+        self.assertIn('__pypperoni_IMPL_leave_frame(', code)
+
+    def test_output(self):
+        self.assertSameOutput('''
+        def add(a, b):
+            return a + b
+
+        def fib(n):
+            if n < 2:
+                return n
+            return fib(n - 1) + fib(n - 2)
+
+        def outer(k):
+            def rec(n):
+                if n == 0:
+                    return k
+                return rec(n - 1) + 1
+            def cell(x):
+                def g():
+                    return x * 2
+                return g()
+            inner = lambda y: y + k
+            return rec(5), cell(3), inner(4)
+
+        def fails(x):
+            raise ValueError(x)
+
+        print(add(1, 2), fib(15), outer(10))
+        try:
+            fails(3)
+        except ValueError as e:
+            print('caught', e)
+
+        def rebound():
+            return 1
+        saved = rebound
+        def rebound(x=5):
+            return x
+        print(rebound(), saved())
+
+        def deep(n):
+            return deep(n + 1)
+        try:
+            deep(0)
+        except RecursionError:
+            print('recursion')
+
+        add = lambda a, b: a * b
+        print(add(3, 4))
+        ''')
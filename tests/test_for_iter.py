@@ -0,0 +1,70 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from helpers import CodegenTestCase
+
+
+class ForIterTests(CodegenTestCase):
+    def test_codegen(self):
+        code = self.generate('''
+            def f(l):
+                for x in l:
+                    print(x)
+        ''')
+        self.assertIn('x = __pypperoni_IMPL_for_iter(u);', code)
+
+    def test_output(self):
+        self.assertSameOutput(r'''
+        l = [1, 2, 3]
+        for x in l:
+            print(x)
+            if x == 1:
+                l.append(4)
+        for x in l:
+            if x == 2:
+                del l[2:]
+            print('d', x)
+        for x in (5, 6):
+            print(x)
+        for c in 'h\xe9llo\u20ac':
+            print(c, end=',')
+        print()
+        d = {}; d['a'] = 1; d['b'] = 2
+        for k in d: print(k)
+        for v in d.values(): print(v)
+        for k, v in d.items(): print(k, v)
+        items = list(d.items())
+        print(items)
+        try:
+            for k in d:
+                d['z'] = 1
+        except RuntimeError as e:
+            print('RT', e)
+        class A: pass
+        a = A(); a.x = 1; a.y = 2
+        for k, v in a.__dict__.items(): print(k, v)
+        def g():
+            yield 1; yield 2
+        for x in g(): print(x)
+        it = iter([1, 2])
+        for x in it: pass
+        print(list(it))
+        for x in range(3): print(x)
+        s = 0
+        for x in list(range(100000)): s += x
+        print(s)
+        ''')
@@ -0,0 +1,89 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from helpers import CodegenTestCase
+
+
+class FrameCacheTests(CodegenTestCase):
+    def test_codegen(self):
+        code = self.generate('''
+            import sys
+
+            def fib(n):
+                if n < 2:
+                    return n
+                return fib(n - 1) + fib(n - 2)
+
+            def escape():
+                return sys._getframe()
+        ''')
+        self.assertIn('__pypperoni_IMPL_leave_frame(callee);', code)
+
+    def test_output(self):
+        self.assertSameOutput('''
+        def fib(n):
+            if n < 2:
+                return n
+            return fib(n - 1) + fib(n - 2)
+
+        def add(a, b):
+            return a + b
+
+        import traceback, sys
+        def tb1(): return tb2()
+        def tb2(): return sys._getframe(1).f_code.co_name
+        print(tb1())
+
+        def escape():
+            return sys._getframe()
+        fr = [escape() for _ in range(3)]
+        print(len(set(map(id, fr))), fr[0].f_code.co_name)
+
+        def boom(n):
+            if n == 0:
+                raise KeyError(n)
+            return boom(n - 1)
+        tbs = []
+        for _ in range(3):
+            try:
+                boom(4)
+            except KeyError as e:
+                tbs.append(e.__traceback__)
+        def depth(tb):
+            n = 0
+            while tb:
+                n += 1
+                tb = tb.tb_next
+            return n
+        print([depth(t) > 4 for t in tbs])
+
+        class D:
+            def __del__(self):
+                print('del', fib(5))
+        def holder():
+            d = D()
+            return fib(3)
+        print(holder(), holder())
+        def lv():
+            a = 1
+            return locals()
+        print(lv(), lv())
+        def gen(n):
+            for i in range(n):
+                yield add(i, i)
+        print(list(gen(3)), list(gen(2)))
+        ''')
@@ -0,0 +1,63 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from helpers import CodegenTestCase
+
+
+class FStringTests(CodegenTestCase):
+    def test_codegen(self):
+        code = self.generate('''
+            def f(a, b, name):
+                return f'{name}: {a:05d} {b:.2f} {name!r}'
+        ''')
+        self.assertIn('__pypperoni_IMPL_build_string(', code)
+        self.assertIn('__pypperoni_IMPL_format_number(', code)
+        self.assertIn('__pypperoni_IMPL_format_value(', code)
+
+    def test_output(self):
+        self.assertSameOutput(r'''
+        import decimal
+        class S(str):
+            def __format__(self, spec): return 'S<%s>' % spec
+        class I(int):
+            def __format__(self, spec): return 'I<%s>' % spec
+        def run(a, b, c, name):
+            print(f'{a}-{b}-{c}-{name}')
+            print(f'{a:05d}|{a:d}|{-a:05d}|{a:3d}|{a:08.3f}|{b:.2f}|{b:8.1f}|{-b:010.4f}|{b:f}')
+            print(f'{name!r} {name!s} {name!a} {a!r:>6} {b!s:<8}|')
+            print(f'{True:d} {I(3):05d} {S("x"):5} {S("y")} {decimal.Decimal("1.5"):.2f}')
+            print(f'{float("inf"):08.2f} {float("-inf"):08.2f} {float("nan"):.1f} {-0.0:.2f}')
+            w, p = 10, 3
+            print(f'{b:{w}.{p}f}|{a:{w}}|{name:>{w}}|')
+            print(f'{10**30:d} {10**30:040d} {2.5:.0f} {1e300:.1f}'[:60])
+            print(f'\xe9{name}\u4e2d{a}\U0001F600')
+            print(f'{a:x} {a:,d} {b:e} {b:%}')
+            try:
+                f'{name:d}'
+            except ValueError as e:
+                print('VE', e)
+            try:
+                f'{a:.2d}'
+            except ValueError as e:
+                print('VE', e)
+            s = ''
+            for i in range(3):
+                s = f'{s}[{i}]'
+            return s
+        print(run(42, 3.14159, [1, 2], 'bob'))
+        print(f'{1}' f'' f'{2:3}', f'{"x"}')
+        ''')
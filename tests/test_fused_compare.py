@@ -0,0 +1,104 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from helpers import CodegenTestCase
+
+
+class FusedCompareTests(CodegenTestCase):
+    def test_codegen(self):
+        code = self.generate('''
+            def f(a, b):
+                if a < b:
+                    return 1
+                while a != b:
+                    a += 1
+                return 0
+        ''')
+        self.assertIn('__pypperoni_IMPL_compare_bool(', code)
+        self.assertIn('if (!result)', code)
+
+    def test_codegen_stack(self):
+        code = self.generate('''
+            def f(a, b):
+                if a < b:
+                    return 1
+                while a != b:
+                    a += 1
+                return 0
+        ''', REGISTER_CODEGEN=False)
+        self.assertIn('__pypperoni_IMPL_compare_bool(', code)
+
+    def test_output(self):
+        self.assertSameOutput('''
+        class Weird:
+            def __eq__(self, o): return []
+            def __lt__(self, o): return 'yes'
+            def __bool__(self): return False
+        class BadBool:
+            def __bool__(self): raise RuntimeError('bad bool')
+        class C:
+            def __eq__(self, o): raise KeyError('eq')
+        def run(xs):
+            out = []
+            for x in xs:
+                r = []
+                if x is None: r.append('none')
+                if x is not None: r.append('notnone')
+                if x == 0: r.append('zero')
+                if x != 1: r.append('ne1')
+                if x == None: r.append('eqnone')
+                if x: r.append('truthy')
+                if not x: r.append('falsy')
+                if x in (1, 2, 'a'): r.append('in')
+                if x not in [0]: r.append('notin')
+                if isinstance(x, (int, float)) and x < 3: r.append('lt3')
+                out.append(r)
+            print(out)
+            n = float('nan')
+            if n == n: print('nan eq')
+            else: print('nan ne')
+            w = Weird()
+            if w == 1: print('w eq')
+            else: print('w not eq')
+            if w < 1: print('w lt')
+            if w: print('w true')
+            i = 0
+            while i < 5 and not i == 3:
+                i += 1
+            print(i)
+            try:
+                if BadBool(): pass
+            except RuntimeError as e:
+                print('RE', e)
+            try:
+                if C() == 1: pass
+            except KeyError as e:
+                print('KE', e)
+            try:
+                if 1 < 'a': pass
+            except TypeError as e:
+                print('TE', e)
+            big = 10 ** 30
+            if big > 10 ** 29: print('big')
+            if -big < 0: print('neg')
+            print([v for v in range(10) if v % 3 == 0 if not v == 6])
+            a = b = 3
+            if not (a is b): print('not is')
+            else: print('is')
+            return 1 if a == b else 0
+        print(run([None, 0, 1, 2, 'a', '', [], [0], {}, {1: 2}, (), 0.0, 2.5, -1, True, False]))
+        ''')
@@ -0,0 +1,116 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from helpers import CodegenTestCase
+
+
+class GeneratorChunkTests(CodegenTestCase):
+    def test_codegen(self):
+        code = self.generate('''
+            def g(a, b):
+                x = yield a + b
+                y = yield x * a - b
+                z = yield (x, y, a, b)
+                return [x, y, z]
+        ''', SPLIT_INTERVAL=12)
+        self.assertIn('static const int resume_chunks[] = {', code)
+
+    def test_codegen_unsplit(self):
+        code = self.generate('''
+            def g(a, b):
+                x = yield a + b
+                y = yield x * a - b
+                z = yield (x, y, a, b)
+                return [x, y, z]
+        ''')
+        self.assertNotIn('resume_chunks', code)
+
+    def test_output(self):
+        self.assertSameOutput('''
+        class Ctx:
+            def __init__(self, name):
+                self.name = name
+            def __enter__(self):
+                print('enter', self.name)
+                return self
+            def __exit__(self, *exc):
+                print('exit', self.name, exc[0])
+
+        def long_gen(n):
+            total = 0
+            a = [1, 2, 3]
+            for i in range(n):
+                total += i * 2 + a[i % 3]
+                try:
+                    x = yield total
+                    if x == 'boom':
+                        raise ValueError(i)
+                    total -= len(a)
+                except ValueError as e:
+                    yield ('caught', e.args)
+                finally:
+                    a.append(i)
+                with Ctx(i):
+                    y = yield ('in with', i)
+                    if y is not None:
+                        yield ('sent', y)
+            b = {k: v for k, v in zip('abc', a)}
+            yield sorted(b.items())
+            r = yield from sub(total)
+            yield ('sub returned', r)
+            return 'done'
+
+        def sub(t):
+            s = yield t
+            yield s
+            return t * 2
+
+        print(list(long_gen(3)))
+        g = long_gen(4)
+        print(next(g), next(g), g.send('x'), next(g), g.send('boom'))
+        print(next(g), next(g), next(g))
+        g.close()
+        g = long_gen(1)
+        out = []
+        try:
+            while True:
+                out.append(g.send(None))
+        except StopIteration as e:
+            print(out, e.value)
+
+        async def co(n):
+            total = 0
+            for i in range(n):
+                total += await co2(i)
+            total += await Aw()
+            return total
+
+        async def co2(i):
+            return i + 1
+
+        class Aw:
+            def __await__(self):
+                v = yield 'suspended'
+                return v
+
+        c = co(5)
+        print(c.send(None))
+        try:
+            c.send(100)
+        except StopIteration as e:
+            print('co', e.value)
+        ''')
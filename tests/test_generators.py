@@ -0,0 +1,99 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from helpers import CodegenTestCase
+
+
+class GeneratorTests(CodegenTestCase):
+    def test_codegen(self):
+        code = self.generate('''
+            def g(n):
+                for i in range(n):
+                    x = yield i
+                    if x:
+                        yield x
+        ''')
+        self.assertIn('static void* const resume_table[] = {', code)
+        self.assertIn('goto *resume_table[', code)
+
+    def test_output(self):
+        self.assertSameOutput('''
+        import inspect
+
+        def g1(n):
+            for i in range(n):
+                x = yield i
+                if x:
+                    yield 'got %s' % x
+
+        def g2():
+            yield 1
+            r = yield from g1(3)
+            yield ('r', r)
+            try:
+                yield 'in try'
+            except KeyError as e:
+                yield 'caught %r' % e
+            finally:
+                print('finally g2')
+
+        def g3():
+            try:
+                while True:
+                    yield 'loop'
+            except GeneratorExit:
+                print('closing g3')
+                raise
+
+        async def sub(x):
+            return x * 2
+
+        async def co(n):
+            total = 0
+            for i in range(n):
+                total += await sub(i)
+            return total
+
+        print(list(g1(4)))
+        g = g1(5)
+        print(inspect.getgeneratorstate(g))
+        print(next(g), g.send('a'), next(g), next(g))
+        print(inspect.getgeneratorstate(g))
+        print(list(g2()))
+        g = g2()
+        print(next(g), next(g), next(g), next(g), next(g), next(g))
+        print(g.throw(KeyError('k')))
+        g.close()
+        g = g3()
+        print(next(g), next(g))
+        g.close()
+        print(inspect.getgeneratorstate(g))
+        c = co(4)
+        try:
+            c.send(None)
+        except StopIteration as e:
+            print('result', e.value)
+        try:
+            g1(1).send(5)
+        except TypeError as e:
+            print('TypeError', e)
+        def many():
+            for k in range(3):
+                yield k; yield k + 10; yield k + 20; yield k + 30
+        print(list(many()))
+        print(sum(x * x for x in range(10)))
+        ''')
@@ -0,0 +1,72 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from helpers import CodegenTestCase
+
+
+class IdentityCompareTests(CodegenTestCase):
+    def test_codegen(self):
+        code = self.generate('''
+            def f(x, y):
+                try:
+                    return x is y, x is not None, x == None, x != True
+                except KeyError:
+                    return None
+        ''')
+        self.assertIn('__pypperoni_IMPL_compare_is(', code)
+        self.assertIn('__pypperoni_IMPL_compare_singleton(', code)
+        self.assertIn('__pypperoni_IMPL_exc_match', code)
+
+    def test_output(self):
+        self.assertSameOutput('''
+        class Eq:
+            def __eq__(self, o): return 'eq!'
+            def __ne__(self, o): return 'ne!'
+        class MyErr(KeyError): pass
+        def run(xs):
+            out = []
+            for x in xs:
+                out.append((x is None, x is not None, x == None, x != None, x == True, x != False, x == False))
+            print(out)
+            e = Eq()
+            print(e == None, e != None, e == True, e is e, e is not None)
+            print(1 == True, 1.0 == True, 0 == False, 0.0 != False, [] == None, {} != None, '' == False)
+            for exc in (KeyError('a'), MyErr('b'), ValueError('c'), IndexError('d')):
+                try:
+                    raise exc
+                except MyErr:
+                    print('MyErr')
+                except KeyError as k:
+                    print('KeyError', k)
+                except (ValueError, TypeError):
+                    print('VT')
+                except LookupError:
+                    print('Lookup')
+            try:
+                try:
+                    raise ValueError
+                except 5:
+                    pass
+            except TypeError as t:
+                print('TE', t)
+            s = ''.join(['a', 'b'])
+            for c in (True, False):
+                print(s == ('ab' if c else None), s != ('ab' if c else None))
+            n = float('nan')
+            print(n == n, n is n, n != None)
+        run([None, True, False, 0, 1, 1.0, 0.0, '', 'a', (), [], {}, 2])
+        ''')
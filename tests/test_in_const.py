@@ -0,0 +1,63 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from helpers import CodegenTestCase
+
+
+class InConstTests(CodegenTestCase):
+    def test_codegen(self):
+        code = self.generate('''
+            def f(x):
+                return x in ('a', 'b', 3), x not in {'c', 'd'}
+        ''')
+        self.assertIn('__pypperoni_IMPL_in_const(', code)
+
+    def test_codegen_unhashable(self):
+        code = self.generate('''
+            def f(x):
+                return x in ([1], 2)
+        ''')
+        self.assertNotIn('__pypperoni_IMPL_in_const(', code)
+
+    def test_output(self):
+        self.assertSameOutput('''
+        class K:
+            def __eq__(self, o): return o == 'b'
+            def __hash__(self): return 0
+
+        def f(x):
+            return x in ('a', 'b', 3, 4.0, None, True), x not in ('a', 'b', 3), x in frozenset({'a', 2})
+
+        def g(x):
+            if x in ('move', 'attack', 7):
+                return 'yes'
+            if x not in ('a', 'b'):
+                return 'not'
+            return 'no'
+
+        for x in ['a', 'z', 3, 4, 4.0, 1, None, K(), b'a', 2, 'b']:
+            print(repr(x) if not isinstance(x, K) else 'K', f(x), g(x))
+
+        for c in (True, False):
+            print('a' in (('a', 'b') if c else ('x', 'y')), 'x' not in (('a', 'b') if c else ('x', 'y')))
+
+        print([1] in ('a', 'b'))
+        try:
+            print([1] in frozenset({'a'}))
+        except TypeError as e:
+            print('TypeError', e)
+        ''')
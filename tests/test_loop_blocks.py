@@ -0,0 +1,186 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from helpers import CodegenTestCase
+
+
+# A SETUP_LOOP (120) block
+LOOP_BLOCK = 'PyFrame_BlockSetup(f, 120, '
+
+
+class LoopBlockTests(CodegenTestCase):
+    def test_codegen(self):
+        code = self.generate('''
+            def f(xs):
+                out = []
+                for x in xs:
+                    if x == 2:
+                        continue
+                    if x == 5:
+                        break
+                    out.append(x)
+                return out
+        ''')
+        self.assertNotIn(LOOP_BLOCK, code)
+
+    def test_codegen_try(self):
+        code = self.generate('''
+            def f(xs):
+                for x in xs:
+                    try:
+                        if x == 5:
+                            break
+                    finally:
+                        print(x)
+        ''')
+        self.assertIn(LOOP_BLOCK, code)
+
+    def test_codegen_continue(self):
+        code = self.generate('''
+            def f(xs):
+                for x in xs:
+                    try:
+                        if x == 2:
+                            continue
+                    finally:
+                        print(x)
+        ''')
+        self.assertIn('*why = WHY_CONTINUE;', code)
+        self.assertNotIn('PyLong_FromSsize_t', code)
+
+    def test_output(self):
+        self.assertSameOutput('''
+        def f1(n):
+            out = []
+            for i in range(n):
+                if i == 3:
+                    break
+                out.append(i)
+            else:
+                out.append('else')
+            return out
+
+        def f2(xs):
+            out = []
+            for x in xs:
+                try:
+                    if x == 2:
+                        continue
+                    if x == 5:
+                        break
+                    out.append(x)
+                except ValueError:
+                    pass
+            return out
+
+        def f3():
+            res = []
+            for i in range(3):
+                for j in range(4):
+                    if j == 2:
+                        break
+                    res.append((i, j))
+                else:
+                    res.append('never')
+            return res
+
+        class Ctx:
+            def __enter__(self):
+                return self
+            def __exit__(self, *exc):
+                print('exit', exc[0])
+
+        def f4(items):
+            total = 0
+            for k in items:
+                with Ctx() as fh:
+                    if k > 3:
+                        break
+                    total += k
+            return total
+
+        def g(n):
+            for i in range(n):
+                if i == 4:
+                    break
+                yield i
+
+        def f5(d):
+            for k in d:
+                if k == 'x':
+                    return k
+            return None
+
+        def f6(n):
+            i = 0
+            while True:
+                i += 1
+                if i > n:
+                    break
+            while i > 0:
+                i -= 2
+            else:
+                i += 100
+            return i
+
+        def f7(xs):
+            out = []
+            for x in xs:
+                try:
+                    y = 10 // x
+                except ZeroDivisionError:
+                    out.append('z')
+                    continue
+                finally:
+                    out.append('f')
+                out.append(y)
+            return out
+
+        def f8(xs):
+            out = []
+            for a in xs:
+                for b in [a, a + 1]:
+                    out.append([c for c in range(b)])
+                    if len(out) > 5:
+                        break
+                if len(out) > 5:
+                    break
+            return out
+
+        def f9():
+            out = []
+            for x in iter([1, 2, 3]):
+                try:
+                    for y in (x, x):
+                        if y == 2:
+                            raise KeyError(y)
+                        out.append(y)
+                except KeyError as e:
+                    out.append('k%s' % e)
+            return out
+
+        print(f1(10), f1(2))
+        print(f2([1, 2, 3, 4, 5, 6]))
+        print(f3())
+        print(f4([1, 2, 5, 1]))
+        print(list(g(10)), list(g(2)))
+        print(f5({'a': 1, 'x': 2}), f5({}))
+        print(f6(5))
+        print(f7([1, 0, 2]))
+        print(f8([1, 2, 3]))
+        print(f9())
+        ''')
@@ -0,0 +1,90 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from helpers import CodegenTestCase
+
+
+class MethodCallTests(CodegenTestCase):
+    def test_codegen(self):
+        code = self.generate('''
+            def f(obj, x):
+                return obj.method(x, key=1)
+        ''')
+        self.assertIn('__pypperoni_IMPL_load_method', code)
+
+    def test_output(self):
+        self.assertSameOutput('''
+        class A:
+            __slots__ = ('v',)
+            def __init__(self, v): self.v = v
+            def get(self, k=0, *, m=1): return (self.v + k) * m
+
+        class B:
+            def f(self, *a, **k): return ('B.f', a, sorted(k.items()))
+            @property
+            def p(self): return lambda x: x * 10
+            @staticmethod
+            def s(x): return ('static', x)
+            @classmethod
+            def c(cls, x): return (cls.__name__, x)
+
+        class G:
+            def __getattr__(self, n): return lambda *a: (n, a)
+
+        class D(B):
+            def f(self, *a, **k): return ('D', super().f(*a, **k))
+
+        def run():
+            a = A(3)
+            print(a.get(), a.get(2), a.get(1, m=3), a.get(k=1, m=2))
+            b = B()
+            print(b.f(1, 2, x=3), b.p(4), b.s(5), b.c(6), B.s(7), B.c(8))
+            b.f = lambda *a: ('shadow', a)
+            print(b.f(9))
+            print(G().anything(1, 2))
+            print(D().f(1, y=2))
+            l = []
+            l.append(a.get(l.__len__()))
+            l.extend(x.upper() for x in 'ab')
+            print(l, ' '.join(['x', 'y']).split(' '), 'abc'.replace('b', str(a.get(1))))
+            try:
+                a.missing(1)
+            except AttributeError as e:
+                print('AE', e)
+            try:
+                a.get(1, 2, 3)
+            except TypeError as e:
+                print('TE', e)
+            try:
+                a.get(int('x'))
+            except ValueError as e:
+                print('VE')
+            d = {'k': 1}
+            print(d.get('k'), d.get('z', 5), sorted(d.keys()), 'x'.join(str(i) for i in d.values()))
+            import asyncio
+            class C:
+                async def m(self, x): return x + 1
+            async def co():
+                c = C()
+                return c.m.__name__, await c.m(await c.m(1))
+            loop = asyncio.new_event_loop()
+            print(loop.run_until_complete(co()))
+            loop.close()
+            return [a.get(i) for i in range(3)]
+        print(run())
+        print(A(1).get(A(2).get(A(3).get())))
+        ''')
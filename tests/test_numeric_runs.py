@@ -0,0 +1,114 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from helpers import CodegenTestCase
+
+
+class NumericRunTests(CodegenTestCase):
+    def test_codegen(self):
+        code = self.generate('''
+            def f(n, dt):
+                x = 0.0
+                s = 0
+                for i in range(n):
+                    s = s + i * i - (i // 3) % 7
+                    x = x + dt * 0.5
+                return s, x
+        ''')
+        self.assertIn('/* numeric run */', code)
+        self.assertIn('__pypperoni_IMPL_unbox_long(', code)
+        self.assertIn('__pypperoni_IMPL_unbox_double(', code)
+
+    def test_codegen_untyped(self):
+        code = self.generate('''
+            def f(a, b):
+                return a.x + b
+        ''')
+        self.assertNotIn('/* numeric run */', code)
+
+    def test_output(self):
+        self.assertSameOutput('''
+        def integrate(n, dt):
+            x = 0.0
+            v = 1.0
+            for i in range(n):
+                a = -x * 0.5
+                v += a * dt
+                x = x + v * dt
+            return x, v
+
+        def sums(n):
+            s = 0
+            sq = 0
+            for i in range(n):
+                s += i
+                sq = sq + i * i - (i // 3) % 7
+            return s, sq, s / 7, -s
+
+        def overflow():
+            x = 3
+            for i in range(8):
+                x = x * x + 1
+            return x % 1000003
+
+        def mixed(a, b):
+            c = a * 2 + b
+            d = c / 3
+            e = c // 2 - d % 1.5
+            return c, d, e
+
+        def aliasing():
+            big = 10 ** 20
+            y = 1.5
+            z = y
+            w = big
+            q = w * 1
+            return z is y, w is big, q == big
+
+        def unbound():
+            try:
+                r = k + 1
+            except UnboundLocalError as e:
+                r = 'UBE'
+            k = 2
+            return r
+
+        def divzero(a, b):
+            try:
+                return a // b
+            except ZeroDivisionError:
+                return 'ZDE'
+
+        def negs():
+            m = -9223372036854775807 - 1
+            n = -m
+            o = m - 1
+            p = m * -1
+            return n, o, p, m // -1, 7 % -3, -7 // 2, -7.5 // 2, -7.5 % 2, 5 / 2, 2**53 + 1
+
+        print(integrate(1000, 0.01))
+        print(integrate(10, 1))
+        print(sums(1000))
+        print(overflow())
+        print(mixed(3, 4), mixed(3.0, 4), mixed(True, 2), mixed('a', 'b') if False else None)
+        print(aliasing())
+        print(unbound())
+        print(divzero(1, 0), divzero(7, 2), divzero(7.0, 0.0), divzero(7.0, -2))
+        print(negs())
+        class N(int): pass
+        print(mixed(N(3), 4))
+        ''')
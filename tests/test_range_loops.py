@@ -0,0 +1,111 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from helpers import CodegenTestCase
+
+
+class RangeLoopTests(CodegenTestCase):
+    def test_codegen(self):
+        code = self.generate('''
+            def f(n):
+                s = 0
+                for i in range(2, n, 3):
+                    s += i
+                return s
+        ''')
+        self.assertIn('__pypperoni_IMPL_range_args(', code)
+        self.assertIn('_fast = (x == (PyObject*)&PyRange_Type', code)
+
+    def test_output(self):
+        self.assertSameOutput('''
+        def f(n):
+            s = 0
+            for i in range(n):
+                s += i
+            for i in range(2, n, 3):
+                s += i * 2
+            for i in range(n, -5, -2):
+                s -= i
+            for _ in range(4):
+                s += 1
+            for i in range(0):
+                print('never')
+            for i in range(10):
+                if i == 3:
+                    continue
+                if i == 7:
+                    break
+                s += i
+            return s, i
+        print(f(20))
+        print(f(0) if False else 'x')
+        def g():
+            r = []
+            for i in range(3, 0, -1):
+                for j in range(i):
+                    r.append((i, j))
+            return r
+        print(g())
+        def h(x):
+            out = []
+            for i in range(x):
+                out.append(i)
+            return out
+        print(h(5), h(2.0) if False else '')
+        try:
+            h(2.0)
+        except TypeError as e:
+            print('TE', e)
+        try:
+            h(None)
+        except TypeError as e:
+            print('TE', e)
+        try:
+            for i in range(1, 5, 0): pass
+        except ValueError as e:
+            print('VE', e)
+        import builtins
+        real = builtins.range
+        def fake(*a):
+            return ['fake']
+        builtins.range = fake
+        print(h(3))
+        builtins.range = real
+        print(h(3))
+        print(h(2**70) if False else '', [i for i in range(3)])
+        def big():
+            c = 0
+            for i in range(2**62, 2**62 + 3):
+                c += i
+            for i in range(2**63 - 2, 2**63 + 1):
+                c += i
+            for i in range(9223372036854775805, 9223372036854775807):
+                c += i
+            return c
+        print(big())
+        def vv():
+            for i in range(3):
+                pass
+            return locals()
+        print(vv())
+        def gen():
+            for i in range(3):
+                yield i
+        print(list(gen()))
+        for i in range(3):
+            print('mod', i)
+        ''')
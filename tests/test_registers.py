@@ -0,0 +1,89 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from helpers import CodegenTestCase
+
+
+class RegisterTests(CodegenTestCase):
+    def test_codegen(self):
+        code = self.generate('''
+            def f(o, k):
+                return o.a + k, o.b[k]
+        ''')
+        self.assertIn('PyObject* r0 = NULL;', code)
+        self.assertIn('r0 = fastlocals[0];', code)
+
+    def test_codegen_stack(self):
+        code = self.generate('''
+            def f(o, k):
+                return o.a + k, o.b[k]
+        ''', REGISTER_CODEGEN=False)
+        self.assertNotIn('PyObject* r0 = NULL;', code)
+
+    def test_output(self):
+        self.assertSameOutput('''
+        import sys
+        class O:
+            def __init__(self): self.a = 1; self.b = [1, 2]
+            def __add__(self, o): return self
+        def f(o, n):
+            out = []
+            for i in range(n):
+                try:
+                    t = (o, i, o.a + i, [o, o.b[0]], 1 / (i - 2))
+                except ZeroDivisionError:
+                    t = (o, 'zde')
+                except Exception as e:
+                    t = repr(e)
+                out.append(t)
+                try:
+                    x = (o, o, o.missing)
+                except AttributeError:
+                    pass
+                try:
+                    y = [o, [o, (o, undefined_global)]]
+                except NameError:
+                    pass
+                o.b[1] = o.a * 2
+                o.c = i - o.a
+                q = o + o + o
+                k = -o.a if i else ~o.a
+                w = not i
+                if o.a < i and (i > 2 or i == 1):
+                    out.append(('cmp', w, k))
+            return out
+
+        o = O()
+        before = sys.getrefcount(o)
+        r = f(o, 5)
+        print([type(t).__name__ for t in r], len(r))
+        del r
+        print(sys.getrefcount(o) - before, o.b, o.c)
+        def g(a, b):
+            a, b = b, a
+            a, b, c = b, a, a
+            return a + b, c
+        print(g(1, 2), g('x', 'y'))
+        def h(seq):
+            return [s * 2 for s in seq if s], {s: s for s in seq}, tuple(seq), seq[-1], seq[1:]
+        print(h([0, 1, 2]))
+        def gen():
+            x = yield 1
+            y = (yield x + 1), (yield x + 2)
+            yield y
+        g2 = gen(); print(next(g2), g2.send(10), g2.send(20), g2.send(30))
+        ''')
@@ -0,0 +1,89 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from helpers import CodegenTestCase
+
+
+class StringConcatTests(CodegenTestCase):
+    def test_codegen(self):
+        code = self.generate('''
+            def f(parts):
+                s = ''
+                for p in parts:
+                    s += p
+                return s
+
+            x = ''
+            x += 'y'
+        ''')
+        self.assertIn('__pypperoni_IMPL_add_to_slot(', code)
+        self.assertIn('__pypperoni_IMPL_add_to_name(', code)
+
+    def test_output(self):
+        self.assertSameOutput('''
+        def build(n):
+            s = ''
+            for i in range(n):
+                s += 'x'
+            return s
+
+        def build2(parts):
+            s = 'start'
+            for p in parts:
+                s = s + p
+            return s
+
+        def aliased():
+            s = 'ab'
+            s += 'c'
+            t = s
+            s += 'd'
+            return s, t
+
+        def cell():
+            s = ''
+            def inner():
+                return s
+            for i in range(5):
+                s += str(i)
+            return s, inner()
+
+        def mixed(a, b):
+            a += b
+            return a
+
+        x = ''
+        for i in range(5):
+            x += str(i)
+        print(x)
+        y = x
+        x += 'end'
+        print(x, y)
+
+        r = build(20000)
+        print(len(r))
+        print(build2(['a', 'b', 'c']), aliased(), cell())
+        print(mixed(1, 2), mixed([1], [2]), mixed((1,), (2,)), mixed('a', 'b'))
+        try:
+            mixed('a', 1)
+        except TypeError as e:
+            print('TypeError', e)
+        class C:
+            s = 'a'
+            s += 'b'
+            print(s)
+        ''')
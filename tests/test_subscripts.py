@@ -0,0 +1,98 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from helpers import CodegenTestCase
+
+
+class SubscriptTests(CodegenTestCase):
+    def test_codegen(self):
+        code = self.generate('''
+            def f(l, i, d):
+                d[i] = l[1:i]
+                return l[0], l[-1], l[i]
+        ''')
+        self.assertIn('__pypperoni_IMPL_subscr_const(', code)
+        self.assertIn('__pypperoni_IMPL_get_slice(', code)
+        self.assertIn('__pypperoni_IMPL_store_subscr(', code)
+
+    def test_output(self):
+        self.assertSameOutput(r'''
+        class L(list):
+            def __getitem__(self, i):
+                return ('L', list.__getitem__(self, i))
+
+        class D(dict):
+            def __missing__(self, k):
+                return 'missing'
+
+        def f(seq, i, d, k, c):
+            out = [seq[0], seq[-1], seq[i], seq[-i - 1]]
+            out.append(seq[1:])
+            out.append(seq[:-1])
+            out.append(seq[i:i + 2])
+            out.append(seq[-100:100])
+            out.append(seq[5:2])
+            out.append(seq[::2])
+            out.append(d[k])
+            out.append(d['a'])
+            out.append(seq[None:None])
+            out.append(seq[c if c else 0])
+            return out
+
+        print(f([1, 2, 3, 4], 1, {'a': 1, 'b': 2}, 'b', 0))
+        print(f((1, 2, 3, 4), 2, {'a': 1, 'b': 2}, 'a', 1))
+        print(f('abcd', 3, D(a=5), 'zz', 2))
+        print(f(L([1, 2, 3, 4]), 0, {'a': 0, 3: 4}, 3, 0))
+        print(f(range(10), 1, {'a': 0}, 'a', True))
+
+        def errs(seq, i):
+            try:
+                return seq[i]
+            except Exception as e:
+                return type(e).__name__, str(e)
+
+        for args in [([1], 5), ([1], -2), ((1,), 2 ** 40), ({}, 'k'), ({}, []), ([1], 'x'), ((), 0), ([1, 2], True)]:
+            print(errs(*args))
+
+        def slerrs(seq, a, b):
+            try:
+                return seq[a:b]
+            except Exception as e:
+                return type(e).__name__, str(e)
+
+        for args in [([1, 2, 3], 'a', None), ([1, 2, 3], 2 ** 70, -2 ** 70), ((1, 2, 3), -2 ** 70, 2 ** 70), ('hello', -3, -1), ('h\xe9llo', 1, None), (b'bytes', 1, 3), ([1, 2], 1.5, 2)]:
+            print(slerrs(*args))
+
+        def stores(v, k, x):
+            v[k] = x
+            return v
+
+        print(stores([1, 2, 3], 0, 'a'), stores([1, 2, 3], -1, 'b'), stores({}, 'k', 1), stores({'k': 0}, 'k', 2))
+        for args in [([1], 3, 0), ([1], 'a', 0), ({}, [], 0)]:
+            try:
+                stores(*args)
+            except Exception as e:
+                print(type(e).__name__, e)
+
+        def cmpjoin(x, c, a):
+            return x == (a if c else None), x in (a if c else ('q', 'r', 's'))
+
+        print(cmpjoin('a', 1, 'a'), cmpjoin('q', 0, 'a'))
+        def fj(x, c):
+            return f'{x:{"3d" if c else ">5"}}'
+        print(fj(3, 1), fj(3, 0))
+        ''')
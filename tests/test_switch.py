@@ -0,0 +1,125 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from helpers import CodegenTestCase
+
+
+class SwitchTests(CodegenTestCase):
+    def test_codegen(self):
+        code = self.generate('''
+            def f(op):
+                if op == 'move':
+                    return 1
+                elif op == 'attack':
+                    return 2
+                elif op == 'heal':
+                    return 3
+                return 0
+        ''')
+        self.assertIn('switch (__pypperoni_IMPL_switch_index(', code)
+
+    def test_codegen_short(self):
+        code = self.generate('''
+            def f(op):
+                if op == 'move':
+                    return 1
+                return 0
+        ''')
+        self.assertNotIn('__pypperoni_IMPL_switch_index(', code)
+
+    def test_output(self):
+        self.assertSameOutput('''
+        class S(str):
+            pass
+
+        def handle(op, n):
+            if op == 'move':
+                r = 'm%d' % n
+            elif op == 'attack':
+                r = 'a'
+            elif op == 'heal':
+                return 'h'
+            elif op == 'move':
+                r = 'dup'
+            elif op == 7:
+                r = 'seven'
+            elif op == 2.0:
+                r = 'two'
+            else:
+                r = 'other'
+            return r
+
+        def nums(x):
+            total = 0
+            for i in range(3):
+                if x == 1:
+                    total += 1
+                elif x == 2:
+                    total += 2
+                elif x == 3:
+                    total += 3
+                elif x == True:
+                    total += 100
+            return total
+
+        def unbound(flag):
+            if flag:
+                z = 'a'
+            if z == 'a':
+                return 1
+            elif z == 'b':
+                return 2
+            elif z == 'c':
+                return 3
+
+        def seq(x):
+            out = []
+            if x == 'a':
+                out.append(1)
+            if x == 'b':
+                out.append(2)
+            if x == 'c':
+                out.append(3)
+            return out
+
+        def merged(x, c):
+            if (x == 'a' if c else x == 'b'):
+                return 1
+            elif x == 'c':
+                return 2
+            elif x == 'd':
+                return 3
+            elif x == 'e':
+                return 4
+            return 0
+
+        for op in ['move', 'attack', 'heal', 7, 2, 2.0, 'x', S('move'), None, 7.0, True, 10**30]:
+            print(repr(op), handle(op, 3))
+        for x in [1, 2, 3, True, 1.0, 5]:
+            print(x, nums(x))
+        print(unbound(True))
+        try:
+            unbound(False)
+        except UnboundLocalError as e:
+            print('UnboundLocalError', e)
+        for x in 'abcd':
+            print(seq(x))
+        for c in (True, False):
+            print([merged(x, c) for x in 'abcdez'])
+        print([(lambda k: [1 for q in [0] if k == 'a' or k == 'b'])(v) for v in 'ab'])
+        print([('A' if c == 'a' else 'B' if c == 'b' else 'C' if c == 'c' else '?') for c in 'abcz'])
+        ''')
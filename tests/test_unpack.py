@@ -0,0 +1,101 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from helpers import CodegenTestCase
+
+
+class UnpackTests(CodegenTestCase):
+    def test_codegen(self):
+        code = self.generate('''
+            def f(pos):
+                x, y = pos
+                return x + y
+        ''')
+        self.assertIn('PyTuple_CheckExact(', code)
+        self.assertIn('PyTuple_GET_SIZE(', code)
+
+    def test_codegen_empty(self):
+        code = self.generate('''
+            def f(v):
+                [] = v
+                () = v
+        ''')
+        self.assertIn('__pypperoni_IMPL_unpack_sequence(', code)
+
+    def test_output(self):
+        self.assertSameOutput('''
+        import sys
+
+        class Seq:
+            def __iter__(self):
+                return iter([10, 20])
+
+        def f(pos, d):
+            x, y = pos
+            out = [x + 1, y]
+            for k, v in d.items():
+                out.append((k, v))
+            a, b, c = [1, 2, 3]
+            out.append(a + b * c)
+            p, q = 'pq'
+            out.append(p + q)
+            n = [x for x, _ in zip(range(3), 'abc')]
+            return out, n
+
+        print(f((1, 2), dict([('a', 1), ('b', 2)])))
+        print(f([3, 4], {}))
+        print(f(Seq(), {}))
+
+        def bad(v):
+            try:
+                a, b = v
+                return a, b
+            except (ValueError, TypeError) as e:
+                return str(e)
+
+        keep = [1, 2, 3]
+        before = sys.getrefcount(keep)
+        for _ in range(50):
+            bad(keep)
+        print(sys.getrefcount(keep) == before)
+        print(bad((1,)), bad(5), bad(iter([1, 2, 3])), bad(dict.fromkeys([1, 2])))
+
+        def nested(t):
+            (a, b), c = t
+            i, *rest = t
+            return a, b, c, i, rest
+
+        print(nested(((1, 2), 3)))
+        print(nested([[4, 5], 6]))
+
+        def big(t):
+            a, b, c, d, e, f, g, h, i = t
+            return a + i
+        print(big(tuple(range(9))))
+
+        def empty(v):
+            try:
+                [] = v
+                () = v
+                return 'empty'
+            except (ValueError, TypeError) as e:
+                return type(e).__name__, str(e)
+
+        print(empty([]), empty(()), empty(''), empty([1]), empty((1, 2)), empty(iter([])), empty(3))
+        [] = []
+        () = ()
+        ''')
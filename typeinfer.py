@@ -0,0 +1,344 @@
+# Copyright (c) Pypperoni
+#
+# Pypperoni is licensed under the MIT License; you may
+# not use it except in compliance with the License.
+#
+# You should have received a copy of the License with
+# this source code under the name "LICENSE.txt". However,
+# you may obtain a copy of the License on our GitHub here:
+# https://github.com/Pypperoni/pypperoni
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the
+# License.
+
+from .codeobj import find_call, get_jump_targets
+from .util import *
+
+from opcode import opmap
+import math
+
+INT = 'int'
+FLOAT = 'float'
+
+# Lattice bottom: no store seen yet (used while iterating to a fixpoint)
+_UNDEF = object()
+
+# Ints larger than this are never treated as C constants
+_INT_LIMIT = 1 << 62
+
+IDX_LABEL = 0
+IDX_OP = 1
+IDX_OPARG = 2
+
+LOAD_FAST = opmap['LOAD_FAST']
+LOAD_CONST = opmap['LOAD_CONST']
+LOAD_GLOBAL = opmap['LOAD_GLOBAL']
+STORE_FAST = opmap['STORE_FAST']
+CALL_FUNCTION = opmap['CALL_FUNCTION']
+GET_ITER = opmap['GET_ITER']
+FOR_ITER = opmap['FOR_ITER']
+UNARY_NEGATIVE = opmap['UNARY_NEGATIVE']
+UNARY_POSITIVE = opmap['UNARY_POSITIVE']
+
+ARITH_OPS = {
+    opmap['BINARY_ADD']: 'add',
+    opmap['INPLACE_ADD']: 'add',
+    opmap['BINARY_SUBTRACT']: 'sub',
+    opmap['INPLACE_SUBTRACT']: 'sub',
+    opmap['BINARY_MULTIPLY']: 'mul',
+    opmap['INPLACE_MULTIPLY']: 'mul',
+    opmap['BINARY_FLOOR_DIVIDE']: 'floordiv',
+    opmap['INPLACE_FLOOR_DIVIDE']: 'floordiv',
+    opmap['BINARY_MODULO']: 'mod',
+    opmap['INPLACE_MODULO']: 'mod',
+    opmap['BINARY_TRUE_DIVIDE']: 'truediv',
+    opmap['INPLACE_TRUE_DIVIDE']: 'truediv',
+}
+
+
+def const_type(value):
+    '''
+    Returns the numeric type of a constant, or None.
+    '''
+    if type(value) is int and -_INT_LIMIT < value < _INT_LIMIT:
+        return INT
+
+    if type(value) is float and math.isfinite(value):
+        return FLOAT
+
+    return None
+
+
+def arith_type(kind, a, b):
+    '''
+    Returns the result type of a binary operation on a and b.
+    '''
+    if a is None or b is None:
+        return None
+
+    if a is _UNDEF or b is _UNDEF:
+        return _UNDEF
+
+    if kind == 'truediv' or FLOAT in (a, b):
+        return FLOAT
+
+    return INT
+
+
+def _join(a, b):
+    if a is _UNDEF:
+        return b
+
+    if b is _UNDEF or a == b:
+        return a
+
+    return None
+
+
+def _get_range_targets(codeobj, buf):
+    '''
+    Returns the locals bound by "for x in range(...)" loops.
+    '''
+    targets = set()
+    for i, (_, op, oparg, _) in enumerate(buf):
+        if op != LOAD_GLOBAL or codeobj.co_names[oparg] != 'range':
+            continue
+
+        j = find_call(buf, i)
+        if j is None or buf[j][IDX_OP] != CALL_FUNCTION or j + 3 >= len(buf):
+            continue
+
+        if buf[j + 1][IDX_OP] == GET_ITER and buf[j + 2][IDX_OP] == FOR_ITER and \
+           buf[j + 3][IDX_OP] == STORE_FAST:
+            targets.add(buf[j + 3][IDX_OPARG])
+
+    return targets
+
+
+def infer_local_types(codeobj, buf):
+    '''
+    Infers the type of each fast local from the values stored to it.
+    Returns a dict mapping local index to INT or FLOAT. Locals that are
+    arguments or hold anything else are left out.
+
+    The result is only a hint; generated code still checks the real type
+    of every value it unboxes.
+    '''
+    nargs = codeobj.co_argcount + codeobj.co_kwonlyargcount
+    if codeobj.co_flags & CO_VARARGS:
+        nargs += 1
+
+    if codeobj.co_flags & CO_VARKEYWORDS:
+        nargs += 1
+
+    targets = get_jump_targets(buf)
+    range_targets = _get_range_targets(codeobj, buf)
+    types = dict.fromkeys(range(codeobj.co_nlocals), _UNDEF)
+    for k in range(nargs):
+        types[k] = None
+
+    changed = True
+    while changed:
+        stores = {}
+        stack = []
+        for label, op, oparg, _ in buf:
+            if label in targets:
+                stack = []
+
+            if op == LOAD_FAST:
+                stack.append(types[oparg])
+
+            elif op == LOAD_CONST:
+                stack.append(const_type(codeobj.co_consts[oparg]))
+
+            elif op in ARITH_OPS:
+                b = stack.pop() if stack else None
+                a = stack.pop() if stack else None
+                stack.append(arith_type(ARITH_OPS[op], a, b))
+
+            elif op in (UNARY_NEGATIVE, UNARY_POSITIVE):
+                if stack:
+                    stack.append(stack.pop())
+
+            elif op == STORE_FAST:
+                if oparg in range_targets and not stack:
+                    t = INT
+
+                else:
+                    t = stack.pop() if stack else None
+
+                stores[oparg] = _join(stores.get(oparg, _UNDEF), t)
+
+            else:
+                stack = []
+
+        changed = False
+        for k, t in stores.items():
+            t = _join(types[k], t)
+            if t != types[k]:
+                types[k] = t
+                changed = True
+
+    return {k: t for k, t in types.items() if t in (INT, FLOAT)}
+
+
+class NumericValue:
+    '''
+    A value computed by a numeric run. cname is the C variable (or
+    literal) holding it unboxed; local or const is set if the value can
+    be boxed by reusing an existing object.
+    '''
+    def __init__(self, type, cname, local=None, const=None):
+        self.type = type
+        self.cname = cname
+        self.local = local
+        self.const = const
+
+
+class NumericRun:
+    '''
+    A straight-line sequence of instructions that only loads numeric
+    locals and constants, does arithmetic and stores locals.
+    '''
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+        self.entries = []   # (local, NumericValue) checked and unboxed on entry
+        self.temps = []     # NumericValue
+        self.steps = []     # (kind, dst, a, b)
+        self.stores = {}    # local -> NumericValue
+        self.stack = []     # NumericValue, bottom to top
+
+    def get_exit_label(self, buf):
+        return buf[self.end][IDX_LABEL]
+
+
+def _scan_run(codeobj, buf, start, local_types, default):
+    run = NumericRun(start, start)
+    env = {}
+    stack = []
+    narith = 0
+    last = None
+
+    def new_temp(type):
+        prefix = '_n' if type == INT else '_d'
+        value = NumericValue(type, '%s%d' % (prefix, len(run.temps)))
+        run.temps.append(value)
+        return value
+
+    for i in range(start, len(buf) - 1):
+        _, op, oparg, _ = buf[i]
+        if op == LOAD_FAST:
+            if oparg not in env:
+                value = new_temp(local_types.get(oparg, default))
+                value.local = oparg
+                run.entries.append((oparg, value))
+                env[oparg] = value
+
+            stack.append(env[oparg])
+
+        elif op == LOAD_CONST:
+            value = codeobj.co_consts[oparg]
+            type = const_type(value)
+            if type is None:
+                break
+
+            cname = ('%dLL' % value) if type == INT else repr(value)
+            stack.append(NumericValue(type, cname, const=value))
+
+        elif op in ARITH_OPS:
+            if len(stack) < 2:
+                break
+
+            b = stack.pop()
+            a = stack.pop()
+            kind = ARITH_OPS[op]
+            dst = new_temp(arith_type(kind, a.type, b.type))
+            run.steps.append((kind, dst, a, b))
+            stack.append(dst)
+            narith += 1
+
+        elif op == UNARY_NEGATIVE:
+            if not stack:
+                break
+
+            a = stack.pop()
+            dst = new_temp(a.type)
+            run.steps.append(('neg', dst, a, None))
+            stack.append(dst)
+            narith += 1
+
+        elif op == UNARY_POSITIVE:
+            if not stack:
+                break
+
+        elif op == STORE_FAST:
+            if not stack:
+                break
+
+            env[oparg] = stack.pop()
+            run.stores[oparg] = env[oparg]
+
+        else:
+            break
+
+        if op not in (LOAD_FAST, LOAD_CONST):
+            last = (i + 1, narith, len(run.steps), dict(run.stores), list(stack))
+
+    if last is None or last[1] == 0:
+        return None
+
+    run.end, _, nsteps, run.stores, run.stack = last
+    run.steps = run.steps[:nsteps]
+
+    # Drop values computed by the trailing loads we gave up on
+    used = {id(v) for _, dst, a, b in run.steps for v in (dst, a, b)}
+    used.update(id(v) for v in run.stores.values())
+    used.update(id(v) for v in run.stack)
+    run.entries = [e for e in run.entries if id(e[1]) in used]
+    run.temps = [t for t in run.temps if id(t) in used]
+
+    return run
+
+
+def find_numeric_runs(codeobj, buf, local_types):
+    '''
+    Finds the numeric runs in buf. Returns a dict mapping the label of
+    the first instruction of each run to a NumericRun object.
+    Unknown locals are assumed to be floats if the surrounding
+    expression involves floats, ints otherwise.
+    '''
+    runs = {}
+    i = 0
+    while i < len(buf):
+        # Pick the default type from the operands of this expression
+        default = INT
+        for j in range(i, len(buf)):
+            _, op, oparg, _ = buf[j]
+            if op == LOAD_FAST:
+                if local_types.get(oparg) == FLOAT:
+                    default = FLOAT
+
+            elif op == LOAD_CONST:
+                if const_type(codeobj.co_consts[oparg]) == FLOAT:
+                    default = FLOAT
+
+            elif ARITH_OPS.get(op) == 'truediv':
+                default = FLOAT
+
+            elif op not in ARITH_OPS and op not in (UNARY_NEGATIVE, UNARY_POSITIVE, STORE_FAST):
+                break
+
+        run = _scan_run(codeobj, buf, i, local_types, default)
+        if run is None:
+            i += 1
+
+        else:
+            runs[buf[i][IDX_LABEL]] = run
+            i = run.end
+
+    return runs